@@ -45,26 +45,40 @@ import utilities.gdal_workaround
 # structure that Fiona needs rom a Shpely geometry object. They are, therefore opposites -> convert a to b and b to a.
 from shapely.geometry import shape, mapping
 
-# This is the shapely operation that actually does the merge computation
-from shapely.ops import unary_union
+# This does the merge computation: shapely's unary_union, spread across all of the processor's cores when there are
+# enough polygons to make that worthwhile, with the slivers between not-quite-matching boundaries cleaned up.
+from utilities.merge_engine import merge
 
 # So that we can read and write shapefiles...
 import fiona
 from fiona.crs import to_string
 
+# Reads only the features that match a search, using an index file kept next to the source
+from utilities.attribute_index import select_features
+
 # This is like a dictionary but the order of entry of the keys is preserved. This is useful as Fiona's schema needs
 # attributes in a predictable order
 from collections import OrderedDict
 
 # This is a utility program to geocode an address or reverse geocode a coordinate pair using OSM's Nominatim geocoder.
 import utilities.geopy_nominatim as geocode
+from utilities.geocode_cache import GeocodeCache
+
+# For building file paths that work on any operating system
+import os
+
+# Utilities to get the counties from Geoserver. Downloads are cached so we only go to the Net when the data changes.
+from utilities.get_any_file_from_net import get_file_from_server as get_zip
+from utilities.get_or_create_temporary_directory import get_temporary_directory as get_temp
 
 def create_merged_shapefile(**inputs):
     """
     takes a dictionary of inputs (search string, search property, source and destination) and based on this creates a
     new merged geometry. It writes this to a new shapefile
 
-    :param inputs: a dictionary of inputs (search string, search property, source and destination)
+    :param inputs: a dictionary of inputs (search string, search property, source and destination). You can also supply
+    a GeocodeCache as GEOCODE_CACHE, a geopy-style GEOCODER to use instead of Nominatim, MERGE_MODE ("snap" or
+    "buffer") and SNAP_GRID_SIZE.
     :return: Nothing
     """
 
@@ -72,23 +86,22 @@ def create_merged_shapefile(**inputs):
     geometries_to_merge = []
 
     with fiona.open(inputs["SOURCE"]) as source:
-        # Open the source file
-        for feature in source:
-            # read each 'feature' or spatial 'thing' (record) in the file and...
-            if inputs["SEARCH_STRING"] in feature["properties"][inputs["SEARCH_PROPERTY"]]:
-                # ... match the search string (data) in the search property (attribute), the property attribute is a
-                # name like 'countyname' or 'nuts3name' or whatever
-                search_feature = feature
-                # Get the geom type - we do this by turning the GeoJSON structure from Fiona into a Shapely geometry
-                # using 'shape' and then extracting its 'type'
-                search_feature_type = type(shape(search_feature["geometry"]))
-                # We then make an instance of this 'type'.
-                search_poly = search_feature_type(shape(search_feature["geometry"]))
-                # Add this (Multi)Polygon to our properties to merge list
-                geometries_to_merge.append(search_poly)
-
-        # We now have a list of polys to be merged, so we merge them...
-        merged_polys = unary_union(geometries_to_merge)
+        # Open the source file. Rather than reading every 'feature' or spatial 'thing' (record) in the file, we use an
+        # attribute index to read only the features whose search property (attribute) contains the search string
+        # (data). The property attribute is a name like 'countyname' or 'nuts3name' or whatever.
+        for search_feature in select_features(source, inputs["SEARCH_PROPERTY"], inputs["SEARCH_STRING"],
+                                              match="contains"):
+            # Turn the GeoJSON structure from Fiona into a Shapely (Multi)Polygon using 'shape' and add it to our list
+            # of geometries to merge
+            geometries_to_merge.append(shape(search_feature["geometry"]))
+
+        # We now have a list of polys to be merged, so we merge them. Where adjacent boundaries aren't exactly the same
+        # a plain merge leaves ghost internal boundaries. In "snap" mode (the default) every vertex is snapped to a
+        # grid of SNAP_GRID_SIZE metres as part of the merge so near-misses line up. "buffer" mode buffers the result
+        # by 10m instead, which is how this used to be done: it's much slower on detailed polygons and it moves the
+        # outline.
+        merged_polys = merge(geometries_to_merge, mode=inputs.get("MERGE_MODE", "snap"),
+                             grid_size=inputs.get("SNAP_GRID_SIZE", 1.0))
         # ... and compute the centroid. We could do any other shapely operation that we wanted here as well.
         # Note that centroid is just one of many attributes of a shapely (multi)polygon. There are lots of others such
         # as area, boundary, bounding box, convex hull etc.
@@ -96,14 +109,11 @@ def create_merged_shapefile(**inputs):
 
         # Reverse geocode the centroid
         source_epsg = int(to_string(source.crs).split(":")[1])
-        geocode_result = geocode.geocode_location(location=f"{merged_centroid.x},{merged_centroid.y}", epsg=source_epsg)
+        # If we've been given a geocode cache, we only ask Nominatim if we haven't looked up this centroid before
+        geocode_result = geocode.geocode_location(location=f"{merged_centroid.x},{merged_centroid.y}", epsg=source_epsg,
+                                                  geocoder=inputs.get("GEOCODER"), cache=inputs.get("GEOCODE_CACHE"))
         centroid_address = geocode_result["body"]["result"]["display_name"]
 
-        # A small buffer can clean up geometries where the adjacent boundaries aren't exactly the same. If you take this
-        # out and display the resulting shapefile in ArcGIS or QGIS, you'll see some ghost internal boundaries where
-        # the different adjacent poly boundaries didn't exactly match.
-        merged_polys = merged_polys.buffer(10)
-
         # Convert the shapely poly to GeoJSON-like structure for Fiona using 'mapping'
         merged_polys_mapping = mapping(merged_polys)
         centroid_mapping = mapping(merged_centroid)
@@ -165,14 +175,29 @@ if __name__ == "__main__":
     # This is an example of 'knowing your data'. nuts3name is a property that describes a higher admin unit than county.
     inputs["SEARCH_PROPERTY"] = "nuts3name"
 
-    inputs["SOURCE"] = "counties/counties.shp"
+    inputs["SOURCE_URL"] = "https://markfoley.info/geoserver/census2011/ows?service=WFS&version=1.0.0&" \
+                           "request=GetFeature&typeName=census2011:counties&outputFormat=SHAPE-ZIP"
+
+    # Download the counties (or take them from the cache if they haven't changed since last time) into a 'counties'
+    # directory next to this program, and read them from there
+    counties_dir = get_temp(__file__, "counties")
+    get_zip(inputs["SOURCE_URL"], counties_dir, cache_dir=get_temp(__file__, ".http_cache"))
+    inputs["SOURCE"] = os.path.join(counties_dir, "counties.shp")
 
     # We're going to write these files. As they're 'sacrificial' - it can be easily recreated - I'm putting it into a
     # directory that I can afford to lose.
     inputs["MERGED_DESTINATION"] = ".cache/merged_polys.shp"
     inputs["CENTROID_DESTINATION"] = ".cache/merged_polys_centroid.shp"
 
+    # How to clean up slivers between the merged polys: "snap" to a 1m grid or the old (slower) "buffer"
+    inputs["MERGE_MODE"] = "snap"
+    inputs["SNAP_GRID_SIZE"] = 1.0
+
+    # Remember geocoder answers between runs
+    inputs["GEOCODE_CACHE"] = GeocodeCache(os.path.join(get_temp(__file__), "geocode_cache.sqlite"))
+
     # The important bit...
     create_merged_shapefile(**inputs)
 
+    print(f"Geocode cache: {inputs['GEOCODE_CACHE'].stats()}")
     print("Done.")
\ No newline at end of file
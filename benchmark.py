@@ -0,0 +1,381 @@
+"""
+Time the main workflows in this repository against synthetic data, so that we can see whether a change makes things
+faster or slower.
+
+Synthetic county-like polygons and points (see utilities/synthetic_layers.py) are written as shapefiles, GeoPackages
+and GeoJSON in a working directory, then each workflow is run a few times
+* CA1_2021.create_merged_shapefile - with a stand-in geocoder so the Net isn't part of the timing
+* fiona_shapely_example1.process_shp - one region, then every region
+* the adjacency scan from adjacent_geoms.py - neighbours of one feature, then of every feature
+* spatial_data_file_converter.convert - between each pair of formats
+* reading the WKT file kerry_turtle draws (see utilities/wkt_loader.py), kerry_turtle.calc_ratios and turning its
+  rings into screen coordinates, point by point and all at once (see utilities/screen_transform.py)
+* drawing the same map into a PNG, and a picture of each polygon in one process and in a pool (see
+  utilities/raster_render.py)
+* building the level-of-detail pyramid, loading it back, and drawing a small map with and without it (see
+  utilities/lod_pyramid.py)
+* utilities/write_spatial_file.write_spatial - writing the points in each format
+* the snap and buffer merge modes (see utilities/merge_engine.py)
+* the download utilities, against a local stand-in for Geoserver (see utilities/local_wfs_server.py) with a delay
+  added to every response. This compares one big request, paging, and tiles fetched one at a time or in parallel.
+
+The results, along with the library versions and the git commit, are written to a JSON file. Keep the files from
+different versions and compare them to spot regressions, e.g.
+
+    python benchmark.py --cols 40 --rows 40 --output benchmark_results/my_change.json
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import argparse
+    import contextlib
+    import copy
+    import csv
+    import datetime
+    import io
+    import json
+    import os
+    import platform
+    import shutil
+    import statistics
+    import subprocess
+    import tempfile
+    import time
+    from types import SimpleNamespace
+    import fiona
+    import numpy as np
+    import shapely
+    from shapely.geometry import shape
+    from utilities.synthetic_layers import make_layers, random_points, driver_for, POINT_SCHEMA
+    from utilities.write_spatial_file import write_spatial
+    from utilities.adjacency import AdjacencyIndex
+    from utilities.merge_engine import compare_merge_modes
+    from utilities.local_wfs_server import start_server
+    import utilities.download_from_geoserver as geoserver
+    import utilities.http_session as http
+    from utilities.get_any_file_from_net import get_file_from_server
+    from utilities.get_zipfile_from_net_and_process import get_zip_from_server
+    from utilities.read_from_file_and_net import get_file_from_net
+    from CA1_2021 import create_merged_shapefile
+    from fiona_shapely_example1 import process_shp
+    from spatial_data_file_converter import convert
+    import kerry_turtle
+    from utilities.wkt_loader import load_wkt_csv, clear_cache as clear_wkt_cache
+    from utilities.screen_transform import ScreenTransform
+    from utilities.raster_render import render_layer, render_thumbnails
+    from utilities.lod_pyramid import pyramid_for
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+DEFAULTS = {
+    "COLS": 20,
+    "ROWS": 20,
+    "POINTS": 5000,
+    "EDGE_VERTICES": 20,
+    "REPEAT": 3,
+    "FORMATS": ("shp", "gpkg", "json"),
+    "OUTPUT": "benchmark_results.json",
+    # Seconds the local WFS waits before each response, and the most bytes per second it sends (None for no limit)
+    "WFS_LATENCY": 0.02,
+    "WFS_BANDWIDTH": None,
+    "WFS_TILES": (4, 4),
+    "WFS_MAX_WORKERS": 8,
+}
+
+
+class _StubGeocoder:
+    """
+    Stands in for Nominatim. Answers straight away, so the benchmark doesn't depend on (or hammer) the Net.
+    """
+
+    def reverse(self, query):
+        return SimpleNamespace(raw={"display_name": f"Somewhere near {query}"})
+
+
+def _time(function, repeat, setup=None):
+    """
+    Run 'function' 'repeat' times.
+
+    :param setup: optional function run before each run, not timed
+    :return: dict of the fastest and median times in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        # Anything the workflows print would only get in the way
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        times.append(time.perf_counter() - start)
+
+    return {"min": min(times), "median": statistics.median(times), "runs": repeat}
+
+
+def _remove(path):
+    def remove():
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    return remove
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """
+    :return: dict describing where the benchmark ran
+    """
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fiona": fiona.__version__,
+        "gdal": fiona.__gdal_version__,
+        "shapely": shapely.__version__,
+        "geos": shapely.geos_version_string,
+        "numpy": np.__version__,
+    }
+
+
+def run(directory, cols, rows, points, edge_vertices, repeat, formats, wfs_latency=DEFAULTS["WFS_LATENCY"],
+        wfs_bandwidth=DEFAULTS["WFS_BANDWIDTH"], wfs=True):
+    """
+    Make the synthetic data in 'directory' and time every workflow.
+
+    :param wfs: also time the download utilities against a local WFS (see 'run_wfs')
+    :return: dict of results, ready to be written as JSON
+    """
+    layers = make_layers(directory, cols, rows, points, formats=formats, edge_vertices=edge_vertices)
+    output_dir = os.path.join(directory, "output")
+    os.makedirs(output_dir, exist_ok=True)
+    shp = layers[formats[0]]["polygons"]
+    results = {}
+
+    # CA1_2021
+    ca1_inputs = {
+        "SEARCH_STRING": "Dublin",
+        "SEARCH_PROPERTY": "nuts3name",
+        "SOURCE": shp,
+        "MERGED_DESTINATION": os.path.join(output_dir, "merged_polys.shp"),
+        "CENTROID_DESTINATION": os.path.join(output_dir, "merged_polys_centroid.shp"),
+        "GEOCODER": _StubGeocoder(),
+    }
+    for mode in ("snap", "buffer"):
+        results[f"create_merged_shapefile_{mode}"] = _time(
+            lambda: create_merged_shapefile(MERGE_MODE=mode, **ca1_inputs), repeat)
+
+    # fiona_shapely_example1
+    results["process_shp_one_region"] = _time(lambda: process_shp(shp, output_dir, "nuts3name", "Dublin"), repeat)
+    results["process_shp_all_regions"] = _time(lambda: process_shp(shp, output_dir, "nuts3name"), repeat)
+
+    # adjacent_geoms.py, reading each format
+    for extension in formats:
+        source = layers[extension]["polygons"]
+        results[f"adjacency_neighbours_{extension}"] = _time(
+            lambda: AdjacencyIndex.from_file(source, key_property="countyname").neighbours("County 00000"), repeat)
+        results[f"adjacency_graph_{extension}"] = _time(
+            lambda: AdjacencyIndex.from_file(source, key_property="countyname").graph(), repeat)
+
+    # spatial_data_file_converter.py, from each format to the next
+    converted_dir = os.path.join(directory, "converted")
+    for source_extension, sink_extension in zip(formats, formats[1:] + formats[:1]):
+        for layer in ("polygons", "points"):
+            source = layers[source_extension][layer]
+            sink = os.path.join(converted_dir, f"{layer}.{sink_extension}")
+            results[f"convert_{layer}_{source_extension}_to_{sink_extension}"] = _time(
+                lambda: convert(source, sink), repeat,
+                setup=lambda: (_remove(converted_dir)(), os.makedirs(converted_dir)))
+
+    # write_spatial, from a generator as a big export would
+    written_dir = os.path.join(directory, "written")
+    point_features = random_points(points)
+    for extension in formats:
+        results[f"write_spatial_{extension}"] = _time(
+            lambda: write_spatial("places", written_dir, (feature for feature in point_features),
+                                  driver=driver_for(f"places.{extension}"), crs=29903,
+                                  schema=copy.deepcopy(POINT_SCHEMA)),
+            repeat, setup=lambda: (_remove(written_dir)(), os.makedirs(written_dir)))
+
+    # kerry_turtle.py
+    csv.field_size_limit(1000000)
+    with open(layers["wkt"], "r", newline="") as fh:
+        rows_of_wkt = list(csv.DictReader(fh, delimiter="|"))
+    results["kerry_turtle_calc_ratios"] = _time(lambda: kerry_turtle.calc_ratios(800, 600, rows_of_wkt), repeat)
+    results["load_wkt_csv"] = _time(lambda: load_wkt_csv(layers["wkt"]), repeat, setup=clear_wkt_cache)
+    results["load_wkt_csv_cached"] = _time(lambda: load_wkt_csv(layers["wkt"]), repeat)
+    wkt_layer = load_wkt_csv(layers["wkt"])
+    ratios = kerry_turtle.calc_ratios(800, 600, wkt_layer)
+    results["kerry_turtle_convert_point"] = _time(
+        lambda: [[kerry_turtle.convert_point(800, 600, ratios, point) for point in polygon.exterior.coords]
+                 for geometry in wkt_layer.geometries for polygon in geometry.geoms], repeat)
+    transform = ScreenTransform.from_ratios(800, 600, ratios)
+    results["screen_transform_rings"] = _time(lambda: transform.rings(wkt_layer.geometries, simplify=False), repeat)
+    results["screen_transform_rings_simplified"] = _time(lambda: transform.rings(wkt_layer.geometries), repeat)
+    results["raster_render_png"] = _time(
+        lambda: render_layer(wkt_layer, os.path.join(directory, "map.png"), 800, 600, ratios=ratios), repeat)
+    thumbnails_dir = os.path.join(directory, "thumbnails")
+    for processes in (1, None):
+        results[f"raster_thumbnails_{processes or 'pool'}"] = _time(
+            lambda: render_thumbnails(wkt_layer, thumbnails_dir, 200, 200, processes=processes), repeat,
+            setup=_remove(thumbnails_dir))
+    pyramid_path = os.path.join(directory, "polygons.lod.npz")
+    results["lod_pyramid_build"] = _time(
+        lambda: pyramid_for(layers["wkt"], wkt_layer.geometries, cache_path=pyramid_path), repeat,
+        setup=_remove(pyramid_path))
+    results["lod_pyramid_load"] = _time(lambda: pyramid_for(layers["wkt"], cache_path=pyramid_path).level(3), repeat)
+    pyramid = pyramid_for(layers["wkt"], cache_path=pyramid_path)
+    for name, chosen in (("full", None), ("pyramid", pyramid)):
+        results[f"raster_render_200px_{name}"] = _time(
+            lambda: render_layer(wkt_layer, os.path.join(directory, "small.png"), 200, 150, pyramid=chosen), repeat)
+
+    # Merge modes, on the polygons CA1_2021 merges
+    with fiona.open(shp) as source:
+        dublin = [shape(feature["geometry"]) for feature in source if "Dublin" in feature["properties"]["nuts3name"]]
+
+    return {
+        "environment": environment(),
+        "parameters": {
+            "cols": cols, "rows": rows, "polygons": cols * rows, "points": points, "edge_vertices": edge_vertices,
+            "repeat": repeat, "formats": list(formats),
+        },
+        "results": results,
+        "merge_modes": compare_merge_modes(dublin, repeat=repeat),
+        "wfs": run_wfs(directory, layers, repeat, wfs_latency, wfs_bandwidth) if wfs else None,
+    }
+
+
+def run_wfs(directory, layers, repeat, latency, bandwidth, tiles=DEFAULTS["WFS_TILES"],
+            max_workers=DEFAULTS["WFS_MAX_WORKERS"]):
+    """
+    Serve the synthetic layers from a local WFS and time the download utilities against it.
+
+    :param directory: working directory, as for 'run'
+    :param layers: what 'make_layers' gave back
+    :param latency: seconds the server waits before each response
+    :param bandwidth: most bytes per second the server sends, or None for no limit
+    :return: dict of results
+    """
+    polygons = layers["shp"]["polygons"] if "shp" in layers else layers[next(iter(layers))]["polygons"]
+    points = layers["shp"]["points"] if "shp" in layers else layers[next(iter(layers))]["points"]
+    with open(os.path.join(directory, "hello.txt"), "w") as fh:
+        fh.write("Four score and seven years ago\n" * 100)
+
+    server = start_server({"census2011:counties": polygons, "TUDublin:geonames_ie": points}, latency=latency,
+                          bandwidth=bandwidth, files_dir=directory)
+    host = server.url
+    download_dir = os.path.join(directory, "downloads")
+    cache_dir = os.path.join(directory, "http_cache")
+    counties_zip_url = f"{host}/census2011/ows?service=WFS&version=1.0.0&request=GetFeature" \
+                       f"&typeName=census2011:counties&outputFormat=SHAPE-ZIP"
+
+    def fresh_download_dir():
+        # Each run starts as a new program would, without remembered capabilities or schemas
+        geoserver.clear_schema_cache()
+        _remove(download_dir)()
+        os.makedirs(download_dir)
+
+    def fresh_cache_dir():
+        fresh_download_dir()
+        _remove(cache_dir)()
+        os.makedirs(cache_dir)
+
+    results = {}
+    http.reset_stats()
+    try:
+        for output_format in ("application/json", "text/csv", "SHAPE-ZIP"):
+            results[f"download_wfs_data_{output_format.split('/')[-1].lower().replace('-', '_')}"] = _time(
+                lambda: geoserver.download_wfs_data(host, "TUDublin", "geonames_ie", output_format=output_format,
+                                                    return_directory=download_dir), repeat, setup=fresh_download_dir)
+
+        # Sequential: one page after another. Concurrent: tiles at the same time.
+        results["stream_wfs_features"] = _time(
+            lambda: sum(1 for _ in geoserver.stream_wfs_features(host, "TUDublin", "geonames_ie", page_size=500)),
+            repeat, setup=fresh_download_dir)
+        for workers in (1, max_workers):
+            results[f"download_wfs_tiles_{workers}_workers"] = _time(
+                lambda: geoserver.download_wfs_tiles(host, "TUDublin", "geonames_ie", tiles=tiles,
+                                                     max_workers=workers), repeat, setup=fresh_download_dir)
+
+        results["get_file_from_server_shape_zip"] = _time(
+            lambda: get_file_from_server(counties_zip_url, download_dir), repeat, setup=fresh_download_dir)
+        results["get_zip_from_server_cold_cache"] = _time(
+            lambda: get_zip_from_server(counties_zip_url, download_dir, cache_dir=cache_dir), repeat,
+            setup=fresh_cache_dir)
+        results["get_zip_from_server_warm_cache"] = _time(
+            lambda: get_zip_from_server(counties_zip_url, download_dir, cache_dir=cache_dir), repeat,
+            setup=fresh_download_dir)
+        results["get_file_from_net"] = _time(
+            lambda: get_file_from_net(f"{host}/files/hello.txt"), repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "settings": {"latency": latency, "bandwidth": bandwidth, "tiles": list(tiles), "max_workers": max_workers},
+        "results": results,
+        "server": dict(server.stats),
+        "client": http.get_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the main workflows against synthetic data and write JSON.")
+    parser.add_argument("--cols", type=int, default=DEFAULTS["COLS"], help="polygons across")
+    parser.add_argument("--rows", type=int, default=DEFAULTS["ROWS"], help="polygons up")
+    parser.add_argument("--points", type=int, default=DEFAULTS["POINTS"], help="number of points")
+    parser.add_argument("--edge-vertices", type=int, default=DEFAULTS["EDGE_VERTICES"],
+                        help="extra vertices along each polygon edge")
+    parser.add_argument("--repeat", type=int, default=DEFAULTS["REPEAT"], help="times to run each workflow")
+    parser.add_argument("--formats", nargs="+", default=list(DEFAULTS["FORMATS"]),
+                        help="file extensions to write the data as. The first is used by the single-format tests.")
+    parser.add_argument("--wfs-latency", type=float, default=DEFAULTS["WFS_LATENCY"],
+                        help="seconds the local WFS waits before each response")
+    parser.add_argument("--wfs-bandwidth", type=float, default=DEFAULTS["WFS_BANDWIDTH"],
+                        help="most bytes per second the local WFS sends (default: no limit)")
+    parser.add_argument("--no-wfs", action="store_true", help="don't time the download utilities")
+    parser.add_argument("--workdir", help="where to write the synthetic data (default: a temporary directory)")
+    parser.add_argument("--output", default=DEFAULTS["OUTPUT"], help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    try:
+        options = (args.cols, args.rows, args.points, args.edge_vertices, args.repeat, tuple(args.formats),
+                   args.wfs_latency, args.wfs_bandwidth, not args.no_wfs)
+        if args.workdir:
+            results = run(args.workdir, *options)
+        else:
+            with tempfile.TemporaryDirectory() as workdir:
+                results = run(workdir, *options)
+
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+        for name, timing in results["results"].items():
+            print(f"{name:<45} {timing['min']:>10.4f}s")
+        for mode, result in results["merge_modes"].items():
+            print(f"{'merge_mode_' + mode:<45} {result['seconds']:>10.4f}s  holes: {result['holes']}")
+        if results["wfs"]:
+            for name, timing in results["wfs"]["results"].items():
+                print(f"{'wfs_' + name:<45} {timing['min']:>10.4f}s")
+        print(f"Results written to {args.output}")
+    except Exception as e:
+        print(f"{e}")
+        quit(1)
+
+
+if __name__ == "__main__":
+    main()
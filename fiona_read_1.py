@@ -8,6 +8,7 @@ import utilities.gdal_workaround
 import fiona
 from fiona.crs import from_string, from_epsg, to_string
 import pyproj
+from utilities.reproject_point import reproject_coords
 
 # file = "data/landuse2.gpkg"
 DEFAULT_FILE = ".temp_data/counties.shp"
@@ -19,16 +20,16 @@ if not file:
 with fiona.open(file, 'r') as source:
     source_crs = pyproj.CRS.from_dict(source.crs)
     target_crs = pyproj.CRS.from_epsg(4326)
-    crs_transformer = pyproj.Transformer.from_crs(source_crs, target_crs, always_xy=True)
 
     print(f"\n{'=' * 20}\n")
     print(f"There are {len(source)} features in source.")
     print(f"The SRID of source is {to_string(source.crs)}")
     print(f"The bounding box of source is \n{source.bounds}")
 
-    in_pair_sw = source.bounds[0], source.bounds[1]
-    in_pair_ne = source.bounds[2], source.bounds[3]
+    # Both corners (SW, NE) in one call
+    xs, ys = reproject_coords([source.bounds[0], source.bounds[2]], [source.bounds[1], source.bounds[3]],
+                              source_crs, target_crs)
 
     print(f"The bounding box is converted from {to_string(source.crs)} to {target_crs}.\n")
-    print(f"SW: {crs_transformer.transform(*in_pair_sw)}")
-    print(f"NE: {crs_transformer.transform(*in_pair_ne)}")
+    print(f"SW: {(float(xs[0]), float(ys[0]))}")
+    print(f"NE: {(float(xs[1]), float(ys[1]))}")
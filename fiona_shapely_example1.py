@@ -8,11 +8,11 @@ March 2021
 
 # import utilities.gdal_workaround
 import fiona
-from shapely.geometry import shape, mapping
-from shapely.ops import unary_union
 import os
 from utilities.get_or_create_temporary_directory import get_temporary_directory as get_temp
 from utilities.get_any_file_from_net import get_file_from_server as get_zip
+from utilities.attribute_index import select_features
+from utilities.dissolve import dissolve, dissolve_schema
 
 DEFAULT_SHAPE_ZIP = {
     "geoserver": "https://markfoley.info/geoserver",
@@ -22,53 +22,40 @@ DEFAULT_SHAPE_ZIP = {
     "dataset2": "geonames_ie",
 }
 
+# What to work out for each region: output property: (reducer, input property)
+DEFAULT_AGGREGATES = {
+    "total2011": ("sum", "total2011"),
+}
+
 
-def process_shp(shp, output_dir, region_key, region_value):
-    region_features = []
+def process_shp(shp, output_dir, region_key, region_value=None, aggregates=None):
+    """
+    Dissolve the layer by 'region_key', i.e. merge the features that share a value of it into one and total their
+    populations. The layer is read once and only running totals are kept, not the features (see utilities/dissolve.py).
 
-    output_schema = {
-        "geometry": "",
-        "properties": {
-            "nuts3name": "str",
-            "total2011": "float"
-        }
-    }
+    :param shp: path to the layer
+    :param output_dir: where to write the result
+    :param region_key: property to group by, e.g. "nuts3name"
+    :param region_value: only dissolve this one region, or None for every region (one feature each)
+    :param aggregates: dict of output property: (reducer, input property). Defaults to DEFAULT_AGGREGATES.
+    :return: None
+    """
+    aggregates = aggregates or DEFAULT_AGGREGATES
 
     with fiona.open(shp, "r") as source:
-        output_crs = source.crs
-        output_driver = source.driver
-        output_schema["geometry"] = source.schema["geometry"]
-        for feature in source:
-            if feature["properties"][region_key] == region_value:
-                region_features.append(feature)
-
-    region_geoms = []
-    total_population = 0
-    for feature in region_features:
-        total_population += feature["properties"]["total2011"]
-        region_geoms.append(shape(feature["geometry"]))
-
-    merged_geoms = unary_union(region_geoms)
-
-    new_feature = {
-        "type": "Feature",
-        "id": 0,
-        "properties": {
-            "nuts3name": region_value,
-            "total2011": total_population
-        },
-        "geometry": mapping(merged_geoms)
-    }
-
-    with fiona.open(
-            os.path.join(output_dir, f"{region_key}_{region_value}.shp"),
-            "w",
-            schema=output_schema,
-            driver=output_driver,
-            crs=output_crs,
-            encoding="utf-8"
-    ) as out_file:
-        out_file.write(new_feature)
+        output_schema = dissolve_schema(source.schema, region_key, aggregates)
+        # Only read the features in the region, found through an attribute index
+        features = select_features(source, region_key, region_value) if region_value else source
+
+        with fiona.open(
+                os.path.join(output_dir, f"{region_key}_{region_value or 'all'}.shp"),
+                "w",
+                schema=output_schema,
+                driver=source.driver,
+                crs=source.crs,
+                encoding="utf-8"
+        ) as out_file:
+            out_file.writerecords(dissolve(features, region_key, aggregates))
 
 
 def main():
@@ -87,9 +74,12 @@ def main():
                    f"request=GetFeature&typeName={geoserver_target['workspace1']}:{geoserver_target['dataset1']}&" \
                    f"outputFormat=SHAPE-ZIP"
 
-    get_zip(counties_url, my_temp_directory)
+    # Downloads are cached so re-runs don't fetch the counties again unless they've changed on Geoserver. We don't
+    # extract the zip file, fiona reads the shapefile straight out of it using a '/vsizip/' path.
+    zip_directory, _ = get_zip(counties_url, my_temp_directory, cache_dir=get_temp(__file__, ".http_cache"),
+                               extract=False)
 
-    polys_file = f"{os.path.join(my_temp_directory, geoserver_target['dataset1'])}.shp"
+    polys_file = f"{os.path.join(zip_directory, geoserver_target['dataset1'])}.shp"
 
     region_key = "nuts3name"
     region_value = "Dublin"
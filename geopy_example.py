@@ -1,10 +1,19 @@
+import os
 from geopy.geocoders import Nominatim
+from geopy.location import Location
 from shapely.geometry import Point
 from shapely import wkt
+from utilities.geocode_cache import GeocodeCache
+from utilities.get_or_create_temporary_directory import get_temporary_directory
 GEOCODER = Nominatim(user_agent="myapplication")
 
 
-def geocode(point=None, address=None, reverse=False):
+def _location_from_raw(raw):
+    # Rebuild a geopy Location from the raw answer that we stored in the cache
+    return Location(raw["display_name"], (float(raw["lat"]), float(raw["lon"])), raw)
+
+
+def geocode(point=None, address=None, reverse=False, cache=None):
     if point and isinstance(point, Point):
         pass
     elif point and (isinstance(point, list) or isinstance(point, tuple)):
@@ -18,9 +27,21 @@ def geocode(point=None, address=None, reverse=False):
         pass
 
     if point and reverse:
-        return GEOCODER.reverse(f"{point.y}, {point.x}")
+        raw = cache.get_location(point.x, point.y) if cache else None
+        if raw:
+            return _location_from_raw(raw)
+        answer = GEOCODER.reverse(f"{point.y}, {point.x}")
+        if answer and cache:
+            cache.put_location(point.x, point.y, answer.raw)
+        return answer
     elif address:
-        return GEOCODER.geocode(f"{address}")
+        raw = cache.get_address(address) if cache else None
+        if raw:
+            return _location_from_raw(raw)
+        answer = GEOCODER.geocode(f"{address}")
+        if answer and cache:
+            cache.put_address(address, answer.raw)
+        return answer
     else:
         print(f"Call to Geocoder incorrectly formatted")
         return None
@@ -29,10 +50,13 @@ def geocode(point=None, address=None, reverse=False):
 def main():
     point = Point(-8.5, 53.5)
     address = "Mullingar, Westmeath, Ireland"
-    answer = geocode(point=point, reverse=True)
+    # Kept in the .cache directory next to this program, not wherever it happens to be run from
+    cache = GeocodeCache(os.path.join(get_temporary_directory(__file__), "geocode_cache.sqlite"))
+    answer = geocode(point=point, reverse=True, cache=cache)
     print(f"The address of {point} is {answer}")
-    answer = geocode(address=address, reverse=False)
+    answer = geocode(address=address, reverse=False, cache=cache)
     print(f"The location of {address} is {Point(answer.longitude, answer.latitude)}")
+    print(f"Cache: {cache.stats()}")
 
 
 if __name__ == "__main__":
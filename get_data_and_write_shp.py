@@ -7,11 +7,12 @@ import os
 import fiona
 from fiona.crs import from_epsg
 
-from shapely.ops import cascaded_union
 from shapely.geometry import shape, mapping
 
 from utilities.download_from_geoserver import download_wfs_data as get_geoserver
+from utilities.download_from_geoserver import download_wfs_tiles as get_geoserver_tiles
 from utilities.get_or_create_temporary_directory import get_temporary_directory as get_temp
+from utilities.merge_engine import parallel_union
 
 DEFAULTS = {
     "HOST": "https://markfoley.info/geoserver",
@@ -20,20 +21,32 @@ DEFAULTS = {
     "DATASET_POLYS": "counties",
     "POLYS_CQL_FILTER": "nuts3name = 'Dublin'",
     "POLYS_PROPERTY_FILTER": ["nuts3name", "countyname", "total2011"],
-    "SRS_CODE": 29903
+    "SRS_CODE": 29903,
+    # Set this to e.g. (4, 4) to download the polys as a grid of tiles in parallel. None does a single download.
+    "TILES": None
 }
 
 
 def do_analysis(**defaults):
     try:
         # Get data from Geoserver
-        local_polys = get_geoserver(
-            host=defaults["HOST"],
-            workspace=defaults["WORKSPACE_POLYS"],
-            dataset=defaults["DATASET_POLYS"],
-            filter_expression=defaults["POLYS_CQL_FILTER"],
-            property_list=defaults["POLYS_PROPERTY_FILTER"],
-            srs=defaults["SRS_CODE"])
+        if defaults.get("TILES"):
+            local_polys = get_geoserver_tiles(
+                host=defaults["HOST"],
+                workspace=defaults["WORKSPACE_POLYS"],
+                dataset=defaults["DATASET_POLYS"],
+                filter_expression=defaults["POLYS_CQL_FILTER"],
+                property_list=defaults["POLYS_PROPERTY_FILTER"],
+                srs=defaults["SRS_CODE"],
+                tiles=defaults["TILES"])
+        else:
+            local_polys = get_geoserver(
+                host=defaults["HOST"],
+                workspace=defaults["WORKSPACE_POLYS"],
+                dataset=defaults["DATASET_POLYS"],
+                filter_expression=defaults["POLYS_CQL_FILTER"],
+                property_list=defaults["POLYS_PROPERTY_FILTER"],
+                srs=defaults["SRS_CODE"])
 
         # For each county, convert its geometry to shapely-friendly format/
         feature_polys = []
@@ -42,8 +55,8 @@ def do_analysis(**defaults):
             feature_polys.append(shape(feature["geometry"]))
             population += feature["properties"]["total2011"]
 
-        # Merge the polys
-        merged_polys = cascaded_union(feature_polys)
+        # Merge the polys. cascaded_union is gone from shapely 2, parallel_union does the same job on all cores.
+        merged_polys = parallel_union(feature_polys)
 
         # Make outgoing schema for the new shapefile
         outgoing_schema = {
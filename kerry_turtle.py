@@ -1,6 +1,11 @@
+import sys
 import turtle as t
-from shapely.wkt import loads
-import csv
+import shapely
+import numpy as np
+from utilities.wkt_loader import load_wkt_csv
+from utilities.screen_transform import ScreenTransform, collection_bbox
+from utilities.raster_render import render_layer
+from utilities.lod_pyramid import pyramid_for
 
 
 def calc_ratios(screen_width,screen_height,data):
@@ -13,17 +18,11 @@ def calc_ratios(screen_width,screen_height,data):
     x_ratio = screen width / dist_x
     y_ratio = screen height / dist_y
 
-    :param data: List of rows representing query result set.
+    :param data: WKTLayer from 'load_wkt_csv', or a list of rows representing query result set.
     :return: x and y screen ratios, bounding box for collection (result set)
     """
-    bbox = [9999999, 9999999, 0, 0]
-
-    for row in data:
-        coords = loads(row['geom_str'])
-        bbox[0] = min(coords.bounds[0], bbox[0])
-        bbox[1] = min(coords.bounds[1], bbox[1])
-        bbox[2] = max(coords.bounds[2], bbox[2])
-        bbox[3] = max(coords.bounds[3], bbox[3])
+    # Worked out for the whole collection in one go (rows are all parsed in one go too)
+    bbox = collection_bbox(data)
 
     dist_x = bbox[2] - bbox[0]
     dist_y = bbox[3] - bbox[1]
@@ -50,61 +49,81 @@ def convert_point(screen_width, screen_height,ratios, point):
     return x, y
 
 
-def draw_data(screen_Width, screen_height, data, ratios):
+def draw_data(screen_Width, screen_height, data, ratios, pyramid=None):
     """
     Draw map based on coordinates from query result set. 'World' coordinates must be converted to screen (pixel)
     coordinates.
 
-    :param data: List of rows representing query result set.
+    All of the coordinates are converted at once (see utilities/screen_transform.py), after simplifying each ring so it
+    has no more detail than a pixel can show. Turtle animation is turned off while drawing and the screen is updated
+    once at the end.
+
+    :param data: WKTLayer from 'load_wkt_csv'. Its geometries have already been parsed from the WKT.
+    :param pyramid: GeometryPyramid of the same geometries (see utilities/lod_pyramid.py). If given, we draw from the
+    level of detail that suits the screen rather than from the full detail geometries.
     :return: None. Function draws map in window.
     """
 
     # ratios = calc_ratios(screen_Width,screen_height,data)
+    transform = ScreenTransform.from_ratios(screen_Width, screen_height, ratios)
+    geometries = data.geometries if pyramid is None else pyramid.geometries(transform.pixel_size)
+    rings = transform.rings(geometries)
+    centroids = transform.points(shapely.centroid(geometries))
 
-    for row in data:
+    t.tracer(0, 0)
+    t.hideturtle()
+    for row, centroid, geometry_rings in zip(data.records, centroids, rings):
         t.up()
-
-        # Convert WKT representation to geometry object.
-        coords = loads(row['geom_str'])
-
-        centroid = (coords.centroid.bounds[0], coords.centroid.bounds[1])
-
-        # Make 'World' point into screen coordinate pair.
-        t.goto(convert_point(screen_Width,screen_height,ratios, centroid))
+        # A row without a geometry has no centroid (NaN), and nothing to draw
+        if np.isnan(centroid).any():
+            continue
+        t.goto(centroid[0], centroid[1])
 
         # Write row name and population at geometry centroid (approximates to the 'middle' of the row multipolygon..
         legend = "{} (pop: {})".format(row['countyname'], row['total2011'])
         t.write(legend, align="center", font=("Arial", 10))
 
-        # For each polygon in Multpolygon geometry, get each point in polygon, convert it to screen point and draw it.
-        for geom in coords.geoms:
-            for point in list(geom.exterior.coords):
-                t.goto(convert_point(screen_Width,screen_height,ratios, point))
-                t.down()
+        # For each polygon in Multpolygon geometry, draw its (already converted) screen points.
+        for ring in geometry_rings:
+            t.goto(ring[0][0], ring[0][1])
+            t.down()
+            for x, y in ring[1:].tolist():
+                t.goto(x, y)
             t.up()
 
-    t.hideturtle()
+    t.update()
     t.exitonclick()
 
 
-def main():
+def main(output_image=None):
+    """
+    Draw the map on screen with turtle graphics or, given an image file name, into that file without needing a display
+    (see utilities/raster_render.py), e.g.
+
+        python kerry_turtle.py kerry.png
+
+    :param output_image: .png or .ppm file to draw into instead of the screen
+    :return: None
+    """
     SCREEN_WIDTH = 800
     SCREEN_HEIGHT = 600
     INPUT_FILE = "Data/data-ky-wkt2.csv"
 
-    csv.field_size_limit(1000000)
-    with open(INPUT_FILE, "r", newline='') as fh:
-        my_data = csv.DictReader(fh, delimiter='|',)
-        if my_data:
-            ratios = calc_ratios(SCREEN_WIDTH, SCREEN_HEIGHT, my_data)
+    # Read and parse the file once. Both the bounding box and the drawing use the same parsed geometries.
+    my_data = load_wkt_csv(INPUT_FILE, geometry_field="geom_str", delimiter="|")
+    if len(my_data):
+        ratios = calc_ratios(SCREEN_WIDTH, SCREEN_HEIGHT, my_data)
 
-    with open(INPUT_FILE, "r", newline='') as fh:
-        my_data = csv.DictReader(fh, delimiter='|', )
-        if my_data:
-            draw_data(SCREEN_WIDTH, SCREEN_HEIGHT, my_data, ratios)
+        # Simplified copies of the geometries, saved next to the input file the first time
+        pyramid = pyramid_for(INPUT_FILE, my_data.geometries)
+        if output_image:
+            written = render_layer(my_data, output_image, SCREEN_WIDTH, SCREEN_HEIGHT, ratios=ratios, pyramid=pyramid)
+            print(f"Wrote {written}")
         else:
-            print("Nothing to draw.")
+            draw_data(SCREEN_WIDTH, SCREEN_HEIGHT, my_data, ratios, pyramid)
+    else:
+        print("Nothing to draw.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -89,7 +89,8 @@ def main():
           f"request=GetFeature&typeName={geoserver_target['workspace']}:{geoserver_target['dataset']}&" \
           f"outputFormat=SHAPE-ZIP"
 
-    my_zipfiles = get_zip(url, my_temp_directory)
+    # Downloads are cached so re-runs don't fetch the dataset again unless it has changed on Geoserver
+    my_zipfiles = get_zip(url, my_temp_directory, cache_dir=get_temp(__file__, ".http_cache"))
     for file in my_zipfiles[1]:
         if file[-4:] == ".shp":
             get_shp_details(os.path.join(my_temp_directory, file))
@@ -13,7 +13,7 @@ import shapely
 # 'shape' turns a GeoJSON-like structure from Fiona into a shapely geometry object. An object needs to be in this format
 # to allow shapely to do geometric computations
 from shapely.geometry import mapping, shape
-import pyproj
+from utilities.reproject_point import reproject_coords
 
 if __name__ == "__main__":
     # try/except is ther to catch any errors that occur
@@ -34,7 +34,17 @@ if __name__ == "__main__":
                 print(f"  {k}: {v}")
             print("+-" * 40)
 
-            for feature in source:
+            # Work out every feature's centroid and convert them all from x,y to lon,lat in a single call, rather than
+            # one at a time in the loop below.
+            # Here we make the shapely geometries from the Fiona GeoJSON-like structure
+            features = list(source)
+            geometries = [shape(feature['geometry']) if feature['geometry'] else None for feature in features]
+            centroids = shapely.centroid(geometries)
+            centroid_coords, centroid_index = shapely.get_coordinates(centroids, return_index=True)
+            lons, lats = reproject_coords(centroid_coords[:, 0], centroid_coords[:, 1], source.crs_wkt, 4326)
+            lon_lat = dict(zip(centroid_index.tolist(), zip(lons.tolist(), lats.tolist())))
+
+            for position, feature in enumerate(features):
                 # Now we want to do stuff with the actual data. Each 'feature' represents a spatial 'thing' that we're
                 # interested in, such as a county.
                 # Suggestions:
@@ -43,23 +53,18 @@ if __name__ == "__main__":
                 #    -> this needs to 'map' fiona's internal structure (GeoJSON) to shapely's internal structure
                 #    (Geometry object).
                 print(f"Id: {feature['id']}")
-                print(f"GEOM Type: {feature['geometry']['type']}")
+                print(f"GEOM Type: {feature['geometry']['type'] if feature['geometry'] else None}")
                 print(f"Properties")
                 for k,v in feature['properties'].items():
                     print(f"... {k}: {v}")
 
-                # Here we make the shapely geometry from the Fiona GeoJSON-like structure
-                feature_geom = shape(feature['geometry'])
-
-                # Get the x,y of the centroid, make an appropriate 'transformer' object and use this to convert x,y to
-                # lon,lat
-                easting, northing = feature_geom.centroid.x, feature_geom.centroid.y
-                transformer = pyproj.Transformer.from_crs(source.crs["init"], 4326, always_xy=True)
-                lon, lat = transformer.transform(easting, northing)
-                # Print the centroid
-                print(f"Centroid of Id: {feature['id']} is {feature_geom.centroid}")
-                if (lon != feature_geom.centroid.x) or (lat != feature_geom.centroid.y):
-                    print(f"(Lon/Lat: {lon}, {lat})")
+                # Print the centroid, and its lon,lat worked out above
+                centroid = centroids[position]
+                if position in lon_lat:
+                    lon, lat = lon_lat[position]
+                    print(f"Centroid of Id: {feature['id']} is {centroid}")
+                    if (lon != centroid.x) or (lat != centroid.y):
+                        print(f"(Lon/Lat: {lon}, {lat})")
                 print("="*80)
 
     except Exception as e:
@@ -13,6 +13,7 @@ try:
     import os
     from utilities.get_or_create_temporary_directory import get_temporary_directory as get_temp
     from utilities.get_any_file_from_net import get_file_from_server as get_zip
+    from utilities.attribute_index import select_features
 except ImportError as e:
     print("{}".format(e))
     quit(1)
@@ -119,13 +120,15 @@ def read_shp(shapefile, filter1, filter2):
         print("f{e}")
         quit(1)
 
-    features = []
+    # Use an attribute index to read only the features that match the filters
+    features, seen = [], set()
     with fiona.Env():
         with fiona.open(shapefile, "r") as fh:
-            for feature in fh:
-                if filter1[1] in feature["properties"]["countyname"] or \
-                        filter2[1] in feature["properties"]["countyname"]:
-                    features.append(feature)
+            for this_filter in (filter1, filter2):
+                for feature in select_features(fh, this_filter[0], this_filter[1], match="contains"):
+                    if feature["id"] not in seen:
+                        seen.add(feature["id"])
+                        features.append(feature)
 
     print(f"Feature properties\n{'-' * 20}")
     for feature in features:
@@ -179,7 +182,7 @@ if __name__ == "__main__":
           f"outputFormat=SHAPE-ZIP"
 
     # Get the zip file from Geoserver, extract its contents and store in temp directory.
-    get_zip(url, my_temp_directory)
+    get_zip(url, my_temp_directory, cache_dir=get_temp(__file__, ".http_cache"))
 
     # Read shapefile, apply filters and analyse
     read_shp(f'{os.path.join(my_temp_directory, geoserver_target["dataset"])}.shp', filter1=geoserver_target["filter1"],
@@ -5,21 +5,36 @@ Examples of formats supported by OGR are ESRI Shapefile, GeoJSON and Geopackage.
 The full list is available on fiona.supported_drivers, a summary of which is printed for
 info.
 
+Run it with no arguments and it asks you what to convert. Give it files or directories and it converts them all without
+asking, e.g.
+
+    python spatial_data_file_converter.py data/*.gpkg --to shp --output-dir converted --processes 4
+
+Each file (or, when the output format holds one layer per file, each layer) is converted in its own process, so a
+directory of files is converted on all of the processor's cores at once. Features are streamed from the source to the
+output in batches (see utilities/write_spatial_file.py) rather than one at a time.
+
+In some instances (shapefile) a layer says its geometries are LineString or Polygon when it really has a mix of those
+and MultiLineString or MultiPolygon. We write every geometry of such a layer as the Multi type. That only needs the
+coordinates wrapped in one more list, so the GeoJSON-like geometry is changed directly rather than being made into a
+shapely geometry and back.
+
 
 Mark Foley
 Feb. 2019
 """
 try:
-    from shapely.geometry import mapping, shape, Polygon, MultiPolygon, LineString, MultiLineString
-    from shapely import wkt
-
     # Fixes inconsistencies in finding osgeo when run in MS Windows
     # import gdal_workaround
 
     # We import a dictionary of valid file extensions matched with OGR-supported drivers.
     # We will use this to ensure that the file opened is in a valid format.
     import utilities.fiona_supported_drivers as fsd
+    from utilities.write_spatial_file import write_records, SQLITE_WRITE_OPTIONS, DEFAULT_BATCH_SIZE
 
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    import time
     import fiona
     # from fiona.crs import from_string, from_epsg, to_string
     import os
@@ -28,111 +43,267 @@ try:
     from collections import OrderedDict
 
     valid_file_extensions = OrderedDict({k: v for k, v in fsd.file_extensions.items() if v})
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Geometry types that are written as their Multi equivalent
+PROMOTIONS = {"Polygon": "MultiPolygon", "LineString": "MultiLineString"}
+
+# Drivers that can hold more than one layer in a file. Anything else gets a file per layer.
+MULTI_LAYER_DRIVERS = ("GPKG",)
+
+
+def driver_for_extension(extension):
+    """
+    :param extension: file extension without the dot, e.g. 'gpkg'
+    :return: OGR driver name, e.g. 'GPKG'
+    """
+    for k, v in valid_file_extensions.items():
+        if v == extension:
+            return k
+    raise TypeError("{} is not a valid file extension.".format(extension))
+
+
+def promote_geometry(geometry):
+    """
+    Make a Polygon a MultiPolygon, or a LineString a MultiLineString, by wrapping its coordinates in one more list.
+    Anything else is handed back as it is.
+
+    :param geometry: GeoJSON-like geometry
+    :return: GeoJSON-like geometry
+    """
+    if geometry is None or geometry["type"] not in PROMOTIONS:
+        return geometry
+    return {"type": PROMOTIONS[geometry["type"]], "coordinates": [geometry["coordinates"]]}
+
+
+def _promoted_features(source):
+    for feature in source:
+        yield {
+            "id": feature["id"],
+            "properties": dict(feature["properties"]),
+            "geometry": promote_geometry(feature["geometry"]),
+        }
+
+
+def convert_layer(input_file, layer, output_file, sink_driver, batch_size=DEFAULT_BATCH_SIZE, verbose=False):
+    """
+    Convert one layer.
+
+    :param input_file: file to read
+    :param layer: layer to read
+    :param output_file: file to write
+    :param sink_driver: OGR driver to write with
+    :param batch_size: number of features written at a time
+    :param verbose: print information about the layer
+    :return: dict of what was converted, the number of features and the seconds taken
+    """
+    start = time.perf_counter()
+    with fiona.open(input_file, 'r', layer=layer) as source:
+        if verbose:
+            # Print layer info
+            print("\n{}\n".format("=" * 20))
+            print("There are {} features in source.".format(len(source)))
+            print("CRS: {}\n{}".format(source.crs, source.crs_wkt))
+            print("The Geometry type of source is {}".format(source.schema["geometry"]))
+            print("The bounding box of source is \n{}".format(source.bounds))
+
+        sink_schema = source.schema
+        sink_schema["geometry"] = PROMOTIONS.get(sink_schema["geometry"], sink_schema["geometry"])
+
+        params = {'crs': source.crs,
+                  'crs_wkt': source.crs_wkt,
+                  'driver': sink_driver,
+                  'schema': sink_schema}
+        # We only allow layers with GPKG for the moment
+        if sink_driver in MULTI_LAYER_DRIVERS:
+            params["layer"] = layer
+
+        if verbose:
+            print("\nOpening {} with {}.".format(output_file, params))
+        with fiona.Env(**SQLITE_WRITE_OPTIONS), fiona.open(output_file, 'w', **params) as sink:
+            count = write_records(sink, _promoted_features(source), batch_size)
+
+    return {
+        "input": input_file,
+        "layer": layer,
+        "output": output_file,
+        "features": count,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _convert_layers(jobs, batch_size=DEFAULT_BATCH_SIZE, verbose=False):
+    # Layers that go into the same output file are written one after the other, by the same process
+    return [convert_layer(*job, batch_size=batch_size, verbose=verbose) for job in jobs]
+
+
+def plan(input_files, sink_type, output_dir=None, output_file=None):
+    """
+    Work out which layers go where.
+
+    :param input_files: list of files to convert
+    :param sink_type: output format suffix e.g 'shp', 'gpkg' or 'json'
+    :param output_dir: where to write the output. Defaults to next to each input file.
+    :param output_file: output filename, only if there's a single input file
+    :return: list of jobs. Each job is a list of (input file, layer, output file, driver) to be done in order.
+    """
+    sink_driver = driver_for_extension(sink_type)
+    if output_file and len(input_files) > 1:
+        raise ValueError("Can only name the output file when there's one input file.")
+
+    # Files with the same name but different extensions, e.g. counties.shp and counties.json, would be written to the
+    # same place, so their output gets the input's extension too, e.g. counties_shp.gpkg and counties_json.gpkg
+    stems = [os.path.join(output_dir or os.path.dirname(input_file), os.path.splitext(os.path.basename(input_file))[0])
+             for input_file in input_files]
+    clashes = {stem for stem in stems if stems.count(stem) > 1}
+
+    jobs = []
+    for input_file, stem in zip(input_files, stems):
+        if not os.path.isfile(input_file):
+            raise IOError("{} is an invalid filename".format(input_file))
+        source_file_ext = os.path.splitext(input_file)[1]
+        driver_for_extension(source_file_ext.lstrip("."))
+
+        if stem in clashes:
+            stem = "{}_{}".format(stem, source_file_ext.lstrip("."))
+        layers = fiona.listlayers(input_file)
+        if sink_driver in MULTI_LAYER_DRIVERS:
+            target = output_file or "{}.{}".format(stem, sink_type)
+            jobs.append([(input_file, layer, target, sink_driver) for layer in layers])
+        elif len(layers) == 1:
+            jobs.append([(input_file, layers[0], output_file or "{}.{}".format(stem, sink_type), sink_driver)])
+        else:
+            # One file per layer, so each can be done at the same time
+            base = os.path.splitext(output_file)[0] if output_file else stem
+            jobs.extend([[(input_file, layer, "{}_{}.{}".format(base, layer, sink_type), sink_driver)]
+                         for layer in layers])
+
+    targets = {}
+    for number, job in enumerate(jobs):
+        if any(os.path.abspath(input_file) == os.path.abspath(target) for input_file, _, target, _ in job):
+            raise ValueError("{} would be overwritten by its own conversion.".format(job[0][0]))
+        # Jobs run at the same time, so two of them mustn't write the same file
+        for target in {os.path.abspath(target) for _, _, target, _ in job}:
+            if targets.setdefault(target, number) != number:
+                raise ValueError("{} and {} would both be written to {}.".format(
+                    jobs[targets[target]][0][0], job[0][0], target))
+
+    return jobs
+
+
+def convert_files(input_files, sink_type, output_dir=None, output_file=None, processes=None,
+                  batch_size=DEFAULT_BATCH_SIZE, verbose=False):
+    """
+    Convert any number of files, using a pool of processes.
+
+    :param input_files: list of files to convert
+    :param sink_type: output format suffix e.g 'shp', 'gpkg' or 'json'
+    :param output_dir: where to write the output. Defaults to next to each input file.
+    :param output_file: output filename, only if there's a single input file
+    :param processes: number of processes. Defaults to the number of cores. 1 does everything in this process.
+    :param batch_size: number of features written at a time
+    :param verbose: print information about each layer
+    :return: list of dicts, one per layer converted (see 'convert_layer')
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    jobs = plan(input_files, sink_type, output_dir, output_file)
+
+    if processes == 1 or len(jobs) == 1:
+        return [result for job in jobs for result in _convert_layers(job, batch_size, verbose)]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_convert_layers, job, batch_size, verbose) for job in jobs]
+        return [result for future in futures for result in future.result()]
+
+
+def find_files(paths):
+    """
+    Expand directories into the files in them that we can convert.
+
+    :param paths: list of files and directories
+    :return: list of files
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lstrip(".") in valid_file_extensions.values():
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def convert(input_file, output_file=None, sink_type=None):
+    """
+    Convert every layer of a spatial data file to another format.
+
+    :param input_file: any filename as a string. Use "path/to/file.xxx" format.
+    :param output_file: output filename as a string. Leave out to write next to the input file with the extension
+    'sink_type'.
+    :param sink_type: output format suffix e.g 'shp', 'gpkg' or 'json'. Only used if there's no output_file.
+    :return: output filename (the first, if there's one per layer)
+    """
+    if output_file:
+        sink_type = os.path.splitext(output_file)[1].lstrip(".")
+    results = convert_files([input_file], sink_type, output_file=output_file, processes=1, verbose=True)
+    return results[0]["output"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert spatial data files between formats. With no arguments, asks what to convert.")
+    parser.add_argument("inputs", nargs="*", help="files, or directories of files, to convert")
+    parser.add_argument("--to", dest="sink_type", help="output format suffix e.g 'shp', 'gpkg' or 'json'")
+    parser.add_argument("--output", help="output file name (one input file only)")
+    parser.add_argument("--output-dir", help="where to write the output (default: next to each input)")
+    parser.add_argument("--processes", type=int, help="number of processes (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="features written at a time")
+    parser.add_argument("--verbose", action="store_true", help="print information about each layer")
+    args = parser.parse_args()
+
+    if not args.inputs:
+        return ask()
+
+    sink_type = args.sink_type or (os.path.splitext(args.output)[1].lstrip(".") if args.output else None)
+    if not sink_type:
+        parser.error("Say what to convert to with --to or --output.")
+
+    start = time.perf_counter()
+    results = convert_files(find_files(args.inputs), sink_type, args.output_dir, args.output, args.processes,
+                            args.batch_size, args.verbose)
+    for result in results:
+        print("{input} ({layer}) -> {output}: {features} features in {seconds:.2f}s".format(**result))
+    print("Converted {} layers in {:.2f}s".format(len(results), time.perf_counter() - start))
+
+
+def ask():
     print("=" * 80, "\nSupported formats")
     for k, v in valid_file_extensions.items():
         print("  {} - {}".format(k, v))
     print("=" * 80)
 
-    # input_file is any filename as a string. Use "path/to/file.xxx" format. If the file doesn't exist, we raise an
-    # error.
+    # input_file is any filename as a string. Use "path/to/file.xxx" format.
     input_file = input("Enter path/to/filename.xxx ")
-    if not os.path.isfile(input_file):
-        raise IOError("{} is an invalid filename".format(input_file))
-
-    # Check that we have a valid file type
-    source_dir = os.path.dirname(input_file)
-    source_file = os.path.basename(input_file)
-    source_file_ext = source_file.split(".")
-    if source_file_ext[-1] not in valid_file_extensions.values():
-        raise TypeError("{} is not a valid file extension.".format(source_file_ext[-1]))
 
-    # output is any filename as a string. Use "path/to/file.xxx" format. If the file doesn't exist, we raise an error.
+    # output is any filename as a string. Use "path/to/file.xxx" format.
     output_file = input("OUTPUT: Enter path/to/filename.xxx. Leaveblank for default. ")
-    if output_file:
-        # Check that we have a valid file type
-        sink_dir = os.path.dirname(output_file)
-        sink_file = os.path.basename(output_file)
-        sink_file_ext = sink_file.split(".")
-        if sink_file_ext[-1] not in valid_file_extensions.values():
-            raise TypeError("OUTPUT {} is not a valid file extension.".format(sink_file_ext[-1]))
-        sink_type = sink_file_ext[-1]
-    else:
+    sink_type = None
+    if not output_file:
         sink_type = input("INPUT Enter output format suffix e.g 'shp', 'gpkg' or 'json' ")
-        # Check that we have a valid output file type
-        if sink_type not in valid_file_extensions.values():
-            raise TypeError("INPUT {} is not a valid file extension.".format(sink_type))
-        sink_dir = source_dir
-        sink_file = source_file_ext[0] + ".{}".format(sink_type)
-        output_file = os.path.join(sink_dir, sink_file)
-
-    sink_driver = None
-    for k, v in valid_file_extensions.items():
-        if v == sink_type:
-            sink_driver = k
-            break
-    if not sink_driver:
-        raise TypeError("Could not determine output driver")
-
-    # 'fiona.Env()' probes the GDAL environment to check that config options are set.
-    # The discovered options are reinstated when the Fiona environment exits.
-    with fiona.Env():
-        for lyr in fiona.listlayers(input_file):
-            # Open each layer
-            with fiona.open(input_file, 'r', layer=lyr) as source:
-                # Print layer info
-                print("\n{}\n".format("=" * 20))
-                print("There are {} features in source.".format(len(source)))
-                print("CRS: {}\n{}".format(source.crs, source.crs_wkt))
-                print("The Geometry type of source is {}".format(source.schema["geometry"]))
-                print("The bounding box of source is \n{}".format(source.bounds))
-
-                sink_schema = source.schema
-                if source.schema["geometry"] == "Polygon":
-                    sink_schema["geometry"] = "MultiPolygon"
-                elif source.schema["geometry"] == "LineString":
-                    sink_schema["geometry"] = "MultiLineString"
-                else:
-                    pass
-
-                params = {'crs': source.crs,
-                          'crs_wkt': source.crs_wkt,
-                          'driver': sink_driver,
-                          'schema': sink_schema}
-                # We only allow layers with GPKG for the moment
-                if sink_driver == "GPKG":
-                    params["layer"] = lyr
-
-                print("\nOpening {} with {}.".format(output_file, params))
-                with fiona.open(
-                        output_file, 'w',
-                        **params,
-                ) as sink:
-                    for feature in source:
-                        # Write out incoming feature to output file
-
-                        # Turn the GeoJSON-formatted geometry into its geometric object
-                        # equivalent using Shapely 'shape'.
-                        geom = shape(feature['geometry'])
-
-                        # In some instances (shapefile) the input geometry is reported as
-                        # LinsSting or Polygon when it should really be MultiLineString or
-                        # MultiPolygon. We fix this here.
-                        if isinstance(geom, Polygon):
-                            geom = wkt.loads(geom.wkt)
-                            geom = MultiPolygon([geom])
-                        elif isinstance(geom, LineString):
-                            geom = wkt.loads(geom.wkt)
-                            geom = MultiLineString([geom])
-
-                        # Turn the geometric object back into its GeoJSON-formatted
-                        # equivalent using Shapely 'mapping'.
-                        feature['geometry'] = mapping(geom)
-                        sink.write(feature)
 
+    convert(input_file, output_file, sink_type)
 
-except Exception as e:
-    # Handle any errors and end gracefully
-    print("=" * 80)
-    print("ERROR: {}".format(e))
-    print("=" * 80)
-    quit(1)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        # Handle any errors and end gracefully
+        print("=" * 80)
+        print("ERROR: {}".format(e))
+        print("=" * 80)
+        quit(1)
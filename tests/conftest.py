@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The utilities are imported as 'utilities.x', as the scripts in the repository root do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
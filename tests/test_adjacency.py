@@ -0,0 +1,58 @@
+import pytest
+
+from utilities.adjacency import AdjacencyIndex
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+
+@pytest.fixture
+def layer(tmp_path):
+    # 3 x 3 grid, so the middle cell (County 00004) touches all of the others
+    path = str(tmp_path / "counties.gpkg")
+    write_layer(county_polygons(3, 3), path, POLYGON_SCHEMA)
+    return path
+
+
+def county(*numbers):
+    return [f"County {n:05d}" for n in numbers]
+
+
+def test_neighbours(layer):
+    index = AdjacencyIndex.from_file(layer, key_property="countyname")
+    assert sorted(index.neighbours("County 00004")) == county(0, 1, 2, 3, 5, 6, 7, 8)
+    assert sorted(index.neighbours("County 00000")) == county(1, 3, 4)
+    assert sorted(index.neighbours_of_geometry(index.geometries[index.positions["County 00000"][0]])) == county(1, 3, 4)
+    with pytest.raises(KeyError):
+        index.neighbours("Nowhere")
+
+
+def test_graph_matches_neighbours(layer):
+    index = AdjacencyIndex.from_file(layer, key_property="countyname")
+    graph = index.graph()
+    assert {key: sorted(keys) for key, keys in graph.items()} == {key: sorted(index.neighbours(key))
+                                                                 for key in index.keys}
+    left, right = index.pairs()
+    assert len(left) == len(right) == sum(len(keys) for keys in graph.values())
+
+
+def test_keys_that_are_not_unique(layer):
+    # Every cell of the 3 x 3 grid is in the same region, so a region has no neighbours but itself
+    index = AdjacencyIndex.from_file(layer, key_property="nuts3name")
+    assert index.neighbours(index.keys[0]) == []
+    assert index.graph() == {index.keys[0]: []}
+
+
+def test_one_key_per_geometry():
+    with pytest.raises(ValueError):
+        AdjacencyIndex(["a", "b"], [None])
+
+
+def test_null_geometry(tmp_path):
+    features = list(county_polygons(2, 1))
+    features.append({"type": "Feature", "id": "2", "geometry": None,
+                     "properties": {"countyname": "Nowhere", "nuts3name": "Dublin", "total2011": 0}})
+    path = str(tmp_path / "counties.json")
+    write_layer(features, path, POLYGON_SCHEMA)
+
+    index = AdjacencyIndex.from_file(path, key_property="countyname")
+    assert index.neighbours("Nowhere") == []
+    assert index.graph() == {"County 00000": ["County 00001"], "County 00001": ["County 00000"], "Nowhere": []}
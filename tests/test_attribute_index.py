@@ -0,0 +1,76 @@
+import os
+
+import fiona
+import pytest
+
+import utilities.attribute_index as ai
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+
+@pytest.fixture
+def layer(tmp_path):
+    path = str(tmp_path / "counties.gpkg")
+    write_layer(county_polygons(3, 3), path, POLYGON_SCHEMA)
+    return path
+
+
+def names(features):
+    return sorted(f["properties"]["countyname"] for f in features)
+
+
+def test_select_equals_and_contains(layer):
+    assert names(ai.select_features(layer, "countyname", "County 00004")) == ["County 00004"]
+    assert names(ai.select_features(layer, "countyname", "0000", match="contains")) == [
+        f"County {n:05d}" for n in range(9)]
+    assert list(ai.select_features(layer, "countyname", "Nowhere")) == []
+    with pytest.raises(ValueError):
+        list(ai.select_features(layer, "countyname", "County", match="like"))
+
+
+def test_unknown_property(layer):
+    with pytest.raises(KeyError):
+        ai.get_index(layer, "colour")
+
+
+def test_stored_index_is_reused(layer, monkeypatch):
+    ai.get_index(layer, "countyname")
+    assert os.path.exists(ai.index_path(layer, "countyname"))
+    monkeypatch.setattr(ai.AttributeIndex, "build", lambda *args, **kwargs: pytest.fail("index built again"))
+    assert len(ai.get_index(layer, "countyname").values) == 9
+
+
+def test_changed_layer_is_indexed_again(layer):
+    ai.get_index(layer, "countyname")
+    features = [f for f in county_polygons(3, 3) if f["properties"]["countyname"] != "County 00004"]
+    os.remove(layer)
+    write_layer(features, layer, POLYGON_SCHEMA)
+    os.utime(layer, (1, 1))
+    assert list(ai.select_features(layer, "countyname", "County 00004")) == []
+
+
+def test_null_geometry_and_value(tmp_path):
+    features = list(county_polygons(2, 1))
+    features.append({"type": "Feature", "id": "2", "geometry": None,
+                     "properties": {"countyname": "Nowhere", "nuts3name": None, "total2011": 0}})
+    path = str(tmp_path / "counties.json")
+    write_layer(features, path, POLYGON_SCHEMA)
+
+    selected = list(ai.select_features(path, "countyname", "Nowhere"))
+    assert len(selected) == 1 and selected[0]["geometry"] is None
+    # Features without a value are in the index, but never match 'contains'
+    assert ai.get_index(path, "nuts3name").fids(None) == [2]
+    assert names(ai.select_features(path, "nuts3name", "", match="contains")) == ["County 00000", "County 00001"]
+    # and the index still loads after a None key has been through JSON
+    assert len(ai.get_index(path, "nuts3name").values) == 2
+
+
+def test_open_collection_uses_its_own_layer(layer):
+    features = list(county_polygons(3, 3))
+    with fiona.open(layer, "w", driver="GPKG", layer="renamed", schema=POLYGON_SCHEMA, crs="EPSG:29903") as fh:
+        fh.writerecords({**f, "properties": {**f["properties"], "countyname": "X" + f["properties"]["countyname"]}}
+                        for f in features[:2])
+
+    with fiona.open(layer, layer="renamed") as fh:
+        assert names(ai.select_features(fh, "countyname", "X", match="contains")) == ["XCounty 00000", "XCounty 00001"]
+    assert names(ai.select_features(layer, "countyname", "X", match="contains", layer="renamed")) == [
+        "XCounty 00000", "XCounty 00001"]
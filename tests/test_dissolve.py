@@ -0,0 +1,67 @@
+import pytest
+import shapely
+from shapely.geometry import shape, mapping
+
+import utilities.dissolve as dissolve
+from utilities.synthetic_layers import county_polygons, POLYGON_SCHEMA
+
+
+def feature(name, region, total, geometry=None):
+    return {"type": "Feature", "geometry": geometry,
+            "properties": {"countyname": name, "nuts3name": region, "total2011": total}}
+
+
+@pytest.fixture
+def features():
+    return [
+        feature("a", "East", 10, mapping(shapely.box(0, 0, 1, 1))),
+        feature("b", "West", 5, mapping(shapely.box(5, 0, 6, 1))),
+        feature("c", "East", None, mapping(shapely.box(1, 0, 2, 1))),
+        feature("d", "East", 30, None),
+        feature("e", "Nowhere", None, None),
+    ]
+
+
+AGGREGATES = {
+    "total": ("sum", "total2011"), "mean": ("mean", "total2011"), "least": ("min", "total2011"),
+    "most": ("max", "total2011"), "first": ("first", "countyname"), "counties": ("count", None),
+}
+
+
+def test_reducers(features):
+    groups = {f["properties"]["nuts3name"]: f for f in dissolve.dissolve(features, "nuts3name", AGGREGATES)}
+    assert list(groups) == ["East", "West", "Nowhere"]
+    # None values are skipped by everything but count
+    assert groups["East"]["properties"] == {"nuts3name": "East", "total": 40, "mean": 20, "least": 10, "most": 30,
+                                            "first": "a", "counties": 3}
+    assert groups["West"]["properties"]["total"] == 5 and groups["West"]["properties"]["counties"] == 1
+    assert groups["Nowhere"]["properties"] == {"nuts3name": "Nowhere", "total": None, "mean": None, "least": None,
+                                               "most": None, "first": "e", "counties": 1}
+
+
+def test_features_without_a_geometry(features):
+    groups = {f["properties"]["nuts3name"]: f for f in dissolve.dissolve(features, "nuts3name", AGGREGATES)}
+    assert shape(groups["East"]["geometry"]).equals(shapely.box(0, 0, 2, 1))
+    assert groups["Nowhere"]["geometry"] is None
+
+
+def test_partial_unions_give_the_same_result(monkeypatch):
+    features = list(county_polygons(6, 6))
+    at_once = list(dissolve.dissolve(features, "nuts3name", {"total": ("sum", "total2011")}))
+    monkeypatch.setattr(dissolve, "PARTIAL_UNION_EVERY", 2)
+    in_steps = list(dissolve.dissolve(iter(features), "nuts3name", {"total": ("sum", "total2011")}))
+    assert [f["properties"] for f in in_steps] == [f["properties"] for f in at_once]
+    for a, b in zip(at_once, in_steps):
+        assert shape(a["geometry"]).symmetric_difference(shape(b["geometry"])).area < 1e-6
+
+
+@pytest.mark.parametrize("aggregates", [{"total": ("median", "total2011")}, {"total": ("sum", None)}])
+def test_bad_aggregates(features, aggregates):
+    with pytest.raises(ValueError):
+        list(dissolve.dissolve(features, "nuts3name", aggregates))
+
+
+def test_schema():
+    schema = dissolve.dissolve_schema(POLYGON_SCHEMA, "nuts3name", AGGREGATES)
+    assert schema["properties"] == {"nuts3name": "str:80", "total": "int", "mean": "float", "least": "int",
+                                    "most": "int", "first": "str", "counties": "int"}
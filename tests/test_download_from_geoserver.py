@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+import utilities.download_from_geoserver as geoserver
+from utilities.local_wfs_server import start_server
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+FEATURES = [
+    {"type": "Feature", "id": "counties.1", "geometry": {"type": "Point", "coordinates": [-8.5, 53.5]},
+     "properties": {"countyname": "Dún Laoghaire–Rathdown", "note": "braces } { and \"quotes\" \\ in a string"}},
+    {"type": "Feature", "id": "counties.2", "geometry": None, "properties": {"countyname": "Corcaigh ☘", "note": ""}},
+]
+
+
+def document(**members):
+    return json.dumps({"type": "FeatureCollection", "features": FEATURES, **members}, ensure_ascii=False,
+                      indent=1).encode("utf-8")
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 16])
+def test_parser_any_chunk_size(size):
+    collection = {}
+    assert list(geoserver._iter_geojson_features(chunked(document(totalFeatures=2), size), collection)) == FEATURES
+    assert collection == {"type": "FeatureCollection", "totalFeatures": 2}
+
+
+def test_parser_multibyte_characters_split_across_chunks():
+    data = document()
+    split = data.index("☘".encode("utf-8")) + 1
+    assert list(geoserver._iter_geojson_features([data[:split], data[split:]])) == FEATURES
+
+
+def test_parser_empty_collection():
+    assert list(geoserver._iter_geojson_features([b'{"type": "FeatureCollection", "features": []}'])) == []
+
+
+@pytest.mark.parametrize("cut", ["mid-feature", "mid-trailer", "before-features"])
+def test_parser_stream_cut_off(cut):
+    data = document(numberMatched=2)
+    end = {"mid-feature": data.index(b"counties.2"), "mid-trailer": len(data) - 3, "before-features": 20}[cut]
+    parsed = []
+    with pytest.raises(ValueError):
+        for feature in geoserver._iter_geojson_features(chunked(data[:end], 5)):
+            parsed.append(feature)
+    assert parsed == FEATURES[:1 if cut == "mid-feature" else 2 if cut == "mid-trailer" else 0]
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "counties.gpkg")
+    write_layer(county_polygons(4, 3), path, POLYGON_SCHEMA)
+    # Like a Geoserver that never sends more than 5 features at a time
+    server = start_server({"census2011:counties": path}, max_features=5)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("page_size", [1, 4, 5, 12, 100])
+def test_paging_gets_every_feature(server, page_size):
+    features = list(geoserver.stream_wfs_features(server.url, "census2011", "counties", page_size=page_size,
+                                                  sort_by="countyname", chunk_size=100))
+    assert [f["properties"]["countyname"] for f in features] == [f"County {n:05d}" for n in range(12)]
+
+
+def test_paging_with_a_filter(server):
+    features = list(geoserver.stream_wfs_features(server.url, "census2011", "counties", page_size=10,
+                                                  filter_expression="countyname > 'County 00004'"))
+    assert len(features) == 7
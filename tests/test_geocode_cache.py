@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+from utilities.geocode_cache import GeocodeCache, METRES_PER_DEGREE
+
+
+def cell_centre(cache, lon, lat):
+    # Middle of the grid cell that (lon, lat) snaps to, so that points a few metres either side stay in the cell
+    _, row, column = (int(part) for part in cache.location_key(lon, lat).split(":"))
+    cell_height = cache.precision / METRES_PER_DEGREE
+    row_lat = (row + 0.5) * cell_height
+    cell_width = cache.precision / (METRES_PER_DEGREE * math.cos(math.radians(row_lat)))
+    return (column + 0.5) * cell_width, row_lat
+
+
+def test_points_in_one_cell_share_a_row(tmp_path):
+    with GeocodeCache(str(tmp_path / "geocodes.sqlite"), precision=25) as cache:
+        lon, lat = cell_centre(cache, -7.3499, 53.5259)
+        # 5 m east and 5 m north of the centre is still inside a 25 m cell
+        nearby_lon = lon + 5 / (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+        nearby_lat = lat + 5 / METRES_PER_DEGREE
+        assert cache.location_key(lon, lat) == cache.location_key(nearby_lon, nearby_lat)
+
+        cache.put_location(lon, lat, {"display_name": "Mullingar"})
+        cache.put_location(nearby_lon, nearby_lat, {"display_name": "Mullingar, Westmeath"})
+        assert cache.get_location(lon, lat) == {"display_name": "Mullingar, Westmeath"}
+        assert cache.stats()["stored"] == 1
+
+        # A point two cells away is a different question
+        far_lat = lat + 2 * cache.precision / METRES_PER_DEGREE
+        assert cache.get_location(lon, far_lat) is None
+        assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5, "stored": 1}
+
+
+def test_addresses_are_normalised(tmp_path):
+    with GeocodeCache(str(tmp_path / "geocodes.sqlite")) as cache:
+        cache.put_address("Mullingar,  Westmeath", {"lat": "53.5259"})
+        assert cache.get_address("mullingar, westmeath") == {"lat": "53.5259"}
+        assert cache.stats()["stored"] == 1
+
+
+def test_reopened_cache_returns_stored_answer(tmp_path):
+    path = str(tmp_path / "geocodes.sqlite")
+    with GeocodeCache(path) as cache:
+        cache.put_address("Mullingar, Westmeath", {"lat": "53.5259", "lon": "-7.3499"})
+        cache.put_location(-7.3499, 53.5259, {"display_name": "Mullingar"})
+
+    with GeocodeCache(path) as cache:
+        assert cache.get_address("Mullingar, Westmeath") == {"lat": "53.5259", "lon": "-7.3499"}
+        assert cache.get_location(-7.3499, 53.5259) == {"display_name": "Mullingar"}
+        assert cache.stats()["hits"] == 2
+
+
+def test_stale_answers_are_ignored_and_evicted(tmp_path):
+    with GeocodeCache(str(tmp_path / "geocodes.sqlite"), ttl=-1) as cache:
+        cache.put_address("Mullingar", {"lat": "53.5259"})
+        assert cache.get_address("Mullingar") is None
+        assert cache.evict_expired() == 1
+        assert cache.stats()["stored"] == 0
+
+
+def test_precision_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        GeocodeCache(str(tmp_path / "geocodes.sqlite"), precision=0)
@@ -0,0 +1,86 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import utilities.geopy_nominatim as geocode
+
+
+class StubGeocoder:
+    """
+    Stands in for Nominatim. Some answers take longer than others, so they finish out of order.
+    """
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def _answer(self, query):
+        time.sleep(self.delays.get(query, 0))
+        if query == "Nowhere at all":
+            raise ValueError("Geocoder fell over")
+        with self.lock:
+            self.finished.append(query)
+        return SimpleNamespace(raw={"display_name": f"Answer for {query}"})
+
+    def geocode(self, address, addressdetails=True):
+        return self._answer(address)
+
+    def reverse(self, query):
+        return self._answer(query)
+
+
+def answers(responses):
+    return [response["body"].get("result", {}).get("display_name") for response in responses]
+
+
+def test_results_are_in_input_order():
+    items = ["Mullingar", "Tralee", "Cork", "Sligo"]
+    stub = StubGeocoder({"Mullingar": 0.3, "Tralee": 0.1})
+    responses = geocode.geocode_batch(items, geocoder=stub, requests_per_second=1000, max_workers=4)
+    assert stub.finished != items
+    assert answers(responses) == [f"Answer for {item}" for item in items]
+
+
+def test_reverse_results_are_in_input_order():
+    items = ["-6.3, 53.3", "-8.5, 53.5", "-9.7, 52.3"]
+    stub = StubGeocoder({"53.3, -6.3": 0.2})
+    responses = geocode.geocode_batch(items, reverse=True, geocoder=stub, requests_per_second=1000)
+    assert answers(responses) == ["Answer for 53.3, -6.3", "Answer for 53.5, -8.5", "Answer for 52.3, -9.7"]
+
+
+def test_a_failure_only_affects_its_own_item():
+    responses = geocode.geocode_batch(["Mullingar", "Nowhere at all", "Cork"], geocoder=StubGeocoder(),
+                                      requests_per_second=1000)
+    assert answers(responses) == ["Answer for Mullingar", None, "Answer for Cork"]
+    assert "Geocoder fell over" in responses[1]["body"]["error"]
+    assert "error" not in responses[0]["body"] and "error" not in responses[2]["body"]
+
+
+@pytest.mark.parametrize("calls, requests_per_second", [(5, 20), (8, 50)])
+def test_rate_limiter(calls, requests_per_second):
+    limiter = geocode._RateLimiter(requests_per_second)
+    times = []
+    lock = threading.Lock()
+
+    def call():
+        limiter.wait()
+        with lock:
+            times.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=call) for _ in range(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The first call goes straight away and each of the others waits for its own slot
+    assert max(times) - start >= (calls - 1) / requests_per_second
+
+
+def test_batch_is_rate_limited():
+    start = time.monotonic()
+    geocode.geocode_batch(["a", "b", "c", "d"], geocoder=StubGeocoder(), requests_per_second=20, max_workers=4)
+    assert time.monotonic() - start >= 3 / 20
@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+import utilities.http_cache as http_cache
+from utilities.local_wfs_server import start_server
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "counties.gpkg")
+    write_layer(county_polygons(3, 3), path, POLYGON_SCHEMA)
+    files = tmp_path / "files"
+    files.mkdir()
+    for name in "abc":
+        (files / f"{name}.txt").write_text(name * 1000)
+    server = start_server({"census2011:counties": path}, files_dir=str(files))
+    server.files = files
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    path = tmp_path / "cache"
+    path.mkdir()
+    return str(path)
+
+
+def counties_url(server):
+    return f"{server.url}/ows?service=WFS&version=1.0.0&request=GetFeature&typeName=census2011:counties&" \
+           f"outputFormat=application/json"
+
+
+def stored(cache_dir, url):
+    with open(http_cache._paths(cache_dir, http_cache.cache_key(url))[0]) as fh:
+        return json.load(fh)["stored"]
+
+
+def test_fresh_copy_is_used_without_asking(server, cache_dir):
+    first = http_cache.get(counties_url(server), cache_dir=cache_dir)
+    assert not first.from_cache and len(first.json()["features"]) == 9
+    # With the server gone, and the same request written differently
+    server.shutdown()
+    again = http_cache.get(counties_url(server).replace("GetFeature", "getfeature").replace("typeName", "TYPENAME"),
+                           cache_dir=cache_dir)
+    assert again.from_cache and again.content == first.content
+
+
+def test_stale_copy_is_revalidated(server, cache_dir, monkeypatch):
+    first = http_cache.cached_get(counties_url(server), cache_dir)
+    assert first.headers["ETag"]
+    before = stored(cache_dir, counties_url(server))
+    # The server is asked, says '304 Not Modified', and our copy is used and good for another TTL
+    sent = []
+    get = http_cache.http.get
+    monkeypatch.setattr(http_cache.http, "get", lambda url, **kwargs: sent.append(kwargs) or get(url, **kwargs))
+    again = http_cache.cached_get(counties_url(server), cache_dir, ttl=0)
+    assert sent[0]["headers"]["If-None-Match"] == first.headers["ETag"]
+    assert again.from_cache and again.content == first.content
+    assert stored(cache_dir, counties_url(server)) > before
+
+
+def test_changed_resource_is_downloaded_again(server, cache_dir):
+    url = f"{server.url}/files/a.txt"
+    assert http_cache.cached_get(url, cache_dir).text == "a" * 1000
+    (server.files / "a.txt").write_text("changed")
+    os.utime(server.files / "a.txt", (1, 1))
+    changed = http_cache.cached_get(url, cache_dir, ttl=0)
+    assert not changed.from_cache and changed.text == "changed"
+    assert http_cache.cached_get(url, cache_dir).text == "changed"
+
+
+def test_least_recently_used_are_evicted(server, cache_dir):
+    urls = {name: f"{server.url}/files/{name}.txt" for name in "abc"}
+
+    def cached(name):
+        return all(os.path.exists(path) for path in http_cache._paths(cache_dir, http_cache.cache_key(urls[name])))
+
+    http_cache.cached_get(urls["a"], cache_dir, max_bytes=2500)
+    http_cache.cached_get(urls["b"], cache_dir, max_bytes=2500)
+    # Using 'a' again makes 'b' the least recently used
+    assert http_cache.cached_get(urls["a"], cache_dir, max_bytes=2500).from_cache
+    http_cache.cached_get(urls["c"], cache_dir, max_bytes=2500)
+    assert cached("a") and not cached("b") and cached("c")
+
+    # Even one response bigger than the cache is kept until the next one comes along
+    http_cache.cached_get(urls["b"], cache_dir, max_bytes=500)
+    assert cached("b") and not cached("a") and not cached("c")
+
+
+def test_errors_are_not_cached(server, cache_dir):
+    response = http_cache.cached_get(f"{server.url}/files/missing.txt", cache_dir)
+    response.close()
+    assert response.status_code == 404
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".json")]
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+import utilities.http_session as http
+from utilities.local_wfs_server import Layer, WFSError, cql_mask, select_features, start_server
+from utilities.synthetic_layers import county_polygons, write_layer, ORIGIN, POLYGON_SCHEMA
+from utilities.transformer_registry import get_transformer
+
+
+@pytest.fixture
+def path(tmp_path):
+    # 3 x 2 grid of 5km cells, and a feature with no geometry and no region
+    features = list(county_polygons(3, 2, region_size=2))
+    features.append({"type": "Feature", "id": "6", "geometry": None,
+                     "properties": {"countyname": "Nowhere", "nuts3name": None, "total2011": 0}})
+    path = str(tmp_path / "counties.json")
+    write_layer(features, path, POLYGON_SCHEMA)
+    return path
+
+
+@pytest.fixture
+def layer(path):
+    return Layer("census2011:counties", path)
+
+
+def selected(layer, expression):
+    return [layer.properties[n]["countyname"] for n in np.flatnonzero(cql_mask(layer, expression))]
+
+
+def test_comparisons(layer):
+    totals = layer.values("total2011")
+    assert len(selected(layer, "countyname = 'County 00002'")) == 1
+    assert len(selected(layer, "countyname <> 'County 00002'")) == 6
+    assert len(selected(layer, f"total2011 >= {sorted(totals)[3]}")) == 4
+    assert selected(layer, "countyname LIKE '%0000_'") == [f"County {n:05d}" for n in range(6)]
+    assert selected(layer, "countyname IN ('County 00001', 'Nowhere', 'Atlantis')") == ["County 00001", "Nowhere"]
+
+
+def test_and_or_not(layer):
+    assert selected(layer, "countyname = 'County 00001' OR countyname = 'Nowhere'") == ["County 00001", "Nowhere"]
+    assert selected(layer, "NOT (countyname LIKE 'County%' OR total2011 > 0)") == ["Nowhere"]
+    assert selected(layer, "countyname LIKE 'County%' AND NOT countyname <> 'County 00003'") == ["County 00003"]
+
+
+def test_null_values_and_geometries(layer):
+    assert "Nowhere" not in selected(layer, "nuts3name LIKE '%'")
+    assert "Nowhere" not in selected(layer, "nuts3name <> 'Dublin'")
+    x, y = ORIGIN
+    assert selected(layer, f"BBOX(geom, {x + 1000}, {y + 1000}, {x + 2000}, {y + 2000})") == ["County 00000"]
+
+
+def test_bbox_in_another_crs(layer):
+    x, y = ORIGIN
+    corners = get_transformer(layer.epsg, 4326).transform_bounds(x + 1000, y + 1000, x + 2000, y + 2000)
+    expression = "BBOX(geom, {}, {}, {}, {}, 'EPSG:4326')".format(*corners)
+    assert selected(layer, expression) == ["County 00000"]
+
+
+@pytest.mark.parametrize("expression", ["colour = 'red'", "countyname = ", "countyname = 'a' 'b'",
+                                        "(countyname = 'a'", "countyname ~ 'a'", "total2011 > 'many'"])
+def test_bad_filters(layer, expression):
+    with pytest.raises(WFSError):
+        cql_mask(layer, expression)
+
+
+def test_select_features(layer):
+    positions, names, geometries, matched = select_features(layer, {
+        "cql_filter": "total2011 >= 0", "sortby": "nuts3name D", "startindex": "1", "maxfeatures": "5",
+        "propertyname": "countyname,nuts3name"})
+    assert matched == 7 and len(positions) == 5
+    assert names == ["countyname", "nuts3name"] and geometries is None
+    # Features without a value go last whichever way round the sort is
+    assert layer.properties[select_features(layer, {"sortby": "nuts3name"})[0][-1]]["countyname"] == "Nowhere"
+
+    positions, _, geometries, _ = select_features(layer, {"srsname": "EPSG:4326"})
+    assert geometries[-1] is None
+    assert -11 < geometries[0].centroid.x < -5 and 51 < geometries[0].centroid.y < 56
+
+
+def test_conditional_get(path):
+    server = start_server({"census2011:counties": path})
+    try:
+        url = f"{server.url}/ows?service=WFS&version=1.0.0&request=GetFeature&typeName=census2011:counties&" \
+              f"outputFormat=application/json"
+        response = http.get(url)
+        collection = response.json()
+        assert response.status_code == 200 and collection["numberMatched"] == 7
+        assert collection["features"][-1]["geometry"] is None
+
+        etag = response.headers["ETag"]
+        assert http.get(url, headers={"If-None-Match": etag}).status_code == 304
+        # A different request gets a different answer
+        assert http.get(url + "&maxFeatures=2", headers={"If-None-Match": etag}).status_code == 200
+        assert http.get(url.replace("counties&", "nothing&")).status_code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
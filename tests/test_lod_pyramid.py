@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import shape
+
+import utilities.lod_pyramid as lod
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+from utilities.wkt_loader import load_layer
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def geometries():
+    return np.array([shape(f["geometry"]) for f in county_polygons(4, 4)], dtype=object)
+
+
+@pytest.fixture
+def source(tmp_path):
+    # Only its modification time and size matter
+    path = tmp_path / "counties.csv"
+    path.write_text("geom_str|countyname|total2011\n")
+    return str(path)
+
+
+def test_levels_get_simpler(geometries):
+    pyramid = lod.GeometryPyramid.build(geometries)
+    counts = pyramid.vertex_counts()
+    assert counts == sorted(counts, reverse=True) and counts[-1] < counts[0]
+    assert pyramid.level_for(0) == 0
+    assert pyramid.level_for(1e12) == len(pyramid) - 1
+
+
+def test_small_features_do_not_disappear(geometries):
+    tiny = shapely.box(0, 0, 1, 1)
+    pyramid = lod.GeometryPyramid.build(np.append(geometries, tiny), levels=12)
+    assert not shapely.is_empty(pyramid.level(len(pyramid) - 1)).any()
+
+
+def test_null_geometries(tmp_path, geometries):
+    with_null = np.append(geometries, None)
+    pyramid = lod.GeometryPyramid.build(with_null)
+    loaded = lod.GeometryPyramid.load(pyramid.save(str(tmp_path / "p.lod.npz")))
+    assert loaded.feature_count == len(with_null)
+    assert loaded.level(3)[-1] is None
+    assert shapely.equals_exact(loaded.level(0)[:-1], geometries, 0).all()
+
+
+def test_cache_is_reused(source, geometries, monkeypatch):
+    lod.pyramid_for(source, geometries)
+    assert os.path.exists(lod.cache_path_for(source))
+    monkeypatch.setattr(lod.GeometryPyramid, "build", lambda *args, **kwargs: pytest.fail("built again"))
+    assert lod.pyramid_for(source, geometries).feature_count == len(geometries)
+    # Without the geometries there's nothing to check the count against, but the cache is still used
+    assert lod.pyramid_for(source).feature_count == len(geometries)
+
+
+def test_cache_is_rebuilt_when_source_changes(source, geometries):
+    lod.pyramid_for(source, geometries)
+    os.utime(source, (1, 1))
+    assert lod.pyramid_for(source, geometries[:3]).feature_count == 3
+
+
+def test_cache_is_rebuilt_for_other_settings(source, geometries):
+    default = lod.pyramid_for(source, geometries)
+    fewer = lod.pyramid_for(source, geometries, levels=2)
+    assert len(default) == lod.LEVELS + 1 and len(fewer) == 3
+    coarse = lod.pyramid_for(source, geometries, base_tolerance=500.0)
+    assert coarse.tolerances[1] == 500.0
+
+
+def test_cache_is_rebuilt_for_other_feature_count(source, geometries):
+    lod.pyramid_for(source, geometries)
+    assert lod.pyramid_for(source, geometries[:5]).feature_count == 5
+
+
+def test_cache_path_per_layer():
+    assert lod.cache_path_for("Data/counties.gpkg") == "Data/counties.lod.npz"
+    assert lod.cache_path_for("Data/counties.gpkg", "kerry") == "Data/counties_kerry.lod.npz"
+
+
+def test_raster_render_keeps_layers_apart(tmp_path):
+    path = str(tmp_path / "two.gpkg")
+    features = list(county_polygons(3, 3))
+    write_layer(features[:3], path, POLYGON_SCHEMA)
+    import fiona
+    with fiona.open(path, "w", driver="GPKG", layer="b", schema=POLYGON_SCHEMA, crs="EPSG:29903") as fh:
+        fh.writerecords(features[3:])
+    first = fiona.listlayers(path)[0]
+
+    for layer in (first, "b"):
+        subprocess.run([sys.executable, "-m", "utilities.raster_render", path, "--layer", layer,
+                        "--output", str(tmp_path / f"{layer}.png")], cwd=REPOSITORY, check=True)
+
+    assert lod.GeometryPyramid.load(lod.cache_path_for(path, first)).feature_count == 3
+    assert lod.GeometryPyramid.load(lod.cache_path_for(path, "b")).feature_count == 6
+    assert len(load_layer(path, "b")) == 6
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import shapely
+
+from utilities.map_viewer import MapView, ViewerLayer, screen_parts, polygon_fill_coords, POLYGON, LINESTRING, \
+    POINT, REDRAW_SCALE, TILE_PIXELS
+from utilities.screen_transform import ScreenTransform
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+
+def test_screen_parts_keep_holes_with_their_polygon():
+    transform = ScreenTransform((0, 0, 100, 100), 100, 100, origin="top-left")
+    square_with_hole = shapely.box(10, 10, 90, 90).difference(shapely.box(40, 40, 60, 60))
+    island = shapely.box(45, 45, 55, 55)
+    geometries = [square_with_hole, None, shapely.LineString([(0, 0), (50, 50)]), island, shapely.Point(5, 5)]
+
+    parts = screen_parts(np.array(geometries, dtype=object), transform)
+    assert [(int(i), int(kind)) for i, kind, _ in parts] == [(0, POLYGON), (2, LINESTRING), (3, POLYGON), (4, POINT)]
+    outside, hole = parts[0][2]
+    assert outside[:, 0].min() == 10 and outside[:, 0].max() == 90
+    assert hole[:, 0].min() == 40 and hole[:, 0].max() == 60 and hole[:, 1].min() == 40 and hole[:, 1].max() == 60
+    assert len(parts[2][2]) == 1
+
+
+def test_polygon_fill_coords_jump_back_after_each_hole():
+    outside = np.array([[0, 0], [10, 0], [10, 10], [0, 0]])
+    holes = [np.array([[2, 2], [3, 2], [3, 3], [2, 2]]), np.array([[5, 5], [6, 5], [6, 6], [5, 5]])]
+    joined = polygon_fill_coords([outside] + holes)
+    assert len(joined) == len(outside) + 2 * (len(holes[0]) + 1)
+    assert (joined[len(outside) + len(holes[0])] == outside[0]).all() and (joined[-1] == outside[0]).all()
+
+
+@pytest.fixture
+def view(tmp_path):
+    # 4 x 4 cells of 5km, shown on a screen 200 pixels across so a pixel is about 100m and a tile about 25km
+    path = str(tmp_path / "counties.gpkg")
+    write_layer(county_polygons(4, 4), path, POLYGON_SCHEMA)
+    view = MapView(200, 200)
+    view.add_layer(ViewerLayer(path))
+    view.zoom_to(view.full_extent(), margin=0)
+    return view
+
+
+def drawn(found):
+    return sorted(i for _, indices, _ in found for i in indices.tolist())
+
+
+def test_new_features_are_drawn_once(view):
+    assert drawn(view.new_features()) == list(range(16))
+    # Every tile on screen has been drawn, and a feature in more than one tile was only counted once
+    assert len(view.tiles) > 1 and view.new_features() == []
+
+
+def test_pan_only_draws_what_comes_into_view(view):
+    view.zoom(4, 0, 200)
+    view.reset()
+    first = drawn(view.new_features())
+    assert 0 < len(first) < 16
+    # Nothing that's already been drawn is drawn again
+    view.pan(-1, 0)
+    assert not set(drawn(view.new_features())) & set(first)
+    # Going right brings in new features, and coming back draws nothing
+    view.pan(-400, 0)
+    assert drawn(view.new_features())
+    view.pan(401, 0)
+    assert view.new_features() == []
+
+
+def test_zoom_keeps_the_point_under_the_mouse(view):
+    before = view.left + 50 * view.pixel_size, view.top - 80 * view.pixel_size
+    view.zoom(1.25, 50, 80)
+    assert (view.left + 50 * view.pixel_size, view.top - 80 * view.pixel_size) == pytest.approx(before)
+
+
+def test_zoom_redraws_when_the_scale_has_changed_enough(view):
+    view.new_features()
+    view.zoom(REDRAW_SCALE * 0.9, 100, 100)
+    assert view.needs_redraw() == (view.wanted_levels() != view.levels)
+    view.zoom(REDRAW_SCALE, 100, 100)
+    assert view.needs_redraw()
+    view.reset()
+    assert view.tile_size == pytest.approx(TILE_PIXELS * view.pixel_size)
+    assert drawn(view.new_features())
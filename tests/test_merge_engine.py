@@ -0,0 +1,59 @@
+import pytest
+import shapely
+from shapely.geometry import shape
+
+import utilities.merge_engine as me
+from utilities.synthetic_layers import county_polygons
+
+
+@pytest.fixture
+def features():
+    return list(county_polygons(4, 4, region_size=2))
+
+
+def test_snap_closes_slivers():
+    # Two squares with a gap of a tenth of a unit between them
+    left, right = shapely.box(0, 0, 10, 10), shapely.box(10.1, 0, 20, 10)
+    assert len(shapely.get_parts(me.merge([left, right], "snap", grid_size=0.5))) == 1
+    assert len(shapely.get_parts(me.parallel_union([left, right]))) == 2
+
+
+def test_buffer_grows_the_outline():
+    square = shapely.box(0, 0, 10, 10)
+    assert me.merge([square], "buffer", buffer_distance=1).area > square.area
+    with pytest.raises(ValueError):
+        me.merge([square], "glue")
+
+
+def test_partition_keeps_every_geometry(features):
+    geometries = [shape(f["geometry"]) for f in features]
+    groups = me.partition(geometries, 4)
+    assert len(groups) == 4 and sum(len(group) for group in groups) == len(geometries)
+
+
+def test_parallel_matches_serial(features, monkeypatch):
+    geometries = [shape(f["geometry"]) for f in features]
+    serial = me.parallel_union(geometries, processes=1)
+    monkeypatch.setattr(me, "PARALLEL_THRESHOLD", 2)
+    parallel = me.parallel_union(geometries, processes=2)
+    assert parallel.symmetric_difference(serial).area < 1e-6 * serial.area
+
+    by_region = me.dissolve_by(features, "nuts3name", processes=2)
+    assert len(by_region) == 4
+    assert sum(g.area for g in by_region.values()) == pytest.approx(serial.area)
+
+
+def test_dissolve_by(features):
+    by_region = me.dissolve_by(features, "nuts3name", processes=1)
+    assert len(by_region) == 4
+    assert all(len(shapely.get_parts(g)) == 1 for g in by_region.values())
+
+
+def test_null_geometry(features):
+    features.append({"type": "Feature", "id": "16", "geometry": None,
+                     "properties": {"countyname": "Nowhere", "nuts3name": "Nowhere", "total2011": 0}})
+    features.append({"type": "Feature", "id": "17", "geometry": None,
+                     "properties": {"countyname": "Nowhere else", "nuts3name": "Dublin", "total2011": 0}})
+    by_region = me.dissolve_by(features, "nuts3name", processes=1)
+    assert by_region["Nowhere"].is_empty
+    assert len(shapely.get_parts(by_region["Dublin"])) == 1
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import utilities.neighbour_graph as ng
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+
+@pytest.fixture
+def layer(tmp_path):
+    # 3 x 3 grid, so the middle cell (County 00004) touches all of the others
+    path = str(tmp_path / "counties.gpkg")
+    write_layer(county_polygons(3, 3), path, POLYGON_SCHEMA)
+    return path
+
+
+def test_neighbours(layer):
+    graph = ng.get_graph(layer, key_property="countyname")
+    assert sorted(graph.neighbours("County 00004")) == [f"County {n:05d}" for n in (0, 1, 2, 3, 5, 6, 7, 8)]
+    assert sorted(graph.neighbours("County 00004", "rook")) == [f"County {n:05d}" for n in (1, 3, 5, 7)]
+
+
+def test_stored_graph_is_reused(layer, monkeypatch):
+    ng.get_graph(layer)
+    monkeypatch.setattr(ng, "build_graph", lambda *args, **kwargs: pytest.fail("graph built again"))
+    assert len(ng.get_graph(layer).keys) == 9
+
+
+def test_key_property_gets_its_own_graph(layer):
+    by_id = ng.get_graph(layer)
+    by_name = ng.get_graph(layer, key_property="countyname")
+    assert by_id.key_property is None and by_name.key_property == "countyname"
+    assert "County 00004" in by_name.neighbours("County 00000")
+    assert ng.graph_path(layer) != ng.graph_path(layer, key_property="countyname")
+
+
+def test_stored_graph_with_other_key_is_not_used(layer):
+    # Even when it's stored where this graph should be
+    path = ng.graph_path(layer)
+    ng.get_graph(layer, path=path)
+    graph = ng.get_graph(layer, key_property="countyname", path=path)
+    assert graph.key_property == "countyname"
+    assert ng.NeighbourGraph.load(path).key_property == "countyname"
+
+
+def test_changed_layer_is_updated(layer):
+    ng.get_graph(layer, key_property="countyname")
+    # Take out the middle cell
+    features = [f for f in county_polygons(3, 3) if f["properties"]["countyname"] != "County 00004"]
+    os.remove(layer)
+    write_layer(features, layer, POLYGON_SCHEMA)
+    os.utime(layer, (1, 1))
+
+    graph = ng.get_graph(layer, key_property="countyname")
+    assert "County 00004" not in graph.keys
+    assert "County 00004" not in graph.neighbours("County 00000")
+
+
+def test_null_geometry(tmp_path):
+    features = list(county_polygons(2, 1))
+    features.append({"type": "Feature", "id": "2", "geometry": None,
+                     "properties": {"countyname": "Nowhere", "nuts3name": "Dublin", "total2011": 0}})
+    path = str(tmp_path / "counties.json")
+    write_layer(features, path, POLYGON_SCHEMA)
+
+    graph = ng.get_graph(path, key_property="countyname")
+    assert graph.neighbours("Nowhere") == []
+    assert graph.neighbours("County 00000") == ["County 00001"]
@@ -0,0 +1,15 @@
+import numpy as np
+import shapely
+
+import utilities.raster_render as rr
+
+
+def test_labels_stay_with_their_features(monkeypatch):
+    labels = []
+    monkeypatch.setattr(rr.Raster, "draw_text", lambda self, text, x, y, scale=1: labels.append((text, x, y)))
+    geometries = np.array([shapely.box(0, 0, 10, 10), None, shapely.box(90, 90, 100, 100), shapely.Polygon(),
+                           shapely.box(0, 90, 10, 100)], dtype=object)
+    records = [{"name": name} for name in ("south-west", "nowhere", "north-east", "empty", "north-west")]
+
+    rr.render(geometries, records, width=100, height=100, bbox=(0, 0, 100, 100), label="{name}")
+    assert labels == [("south-west", 5, 95), ("north-east", 95, 5), ("north-west", 5, 5)]
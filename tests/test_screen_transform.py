@@ -0,0 +1,14 @@
+import numpy as np
+import shapely
+
+from utilities.screen_transform import ScreenTransform
+
+
+def test_points_keep_their_rows():
+    transform = ScreenTransform((0, 0, 100, 100), 100, 100, origin="top-left")
+    points = np.array([shapely.Point(10, 20), None, shapely.Point(), shapely.Point(90, 80)], dtype=object)
+    screen = transform.points(points)
+    assert screen.shape == (4, 2)
+    assert screen[0].tolist() == [10, 80] and screen[3].tolist() == [90, 20]
+    assert np.isnan(screen[1:3]).all()
+    assert transform.points([]).shape == (0, 2)
@@ -0,0 +1,73 @@
+import os
+
+import fiona
+import pytest
+
+import spatial_data_file_converter as converter
+from utilities.synthetic_layers import county_polygons, write_layer, POLYGON_SCHEMA
+
+
+@pytest.fixture
+def two_layers(tmp_path):
+    path = str(tmp_path / "counties.gpkg")
+    features = list(county_polygons(2, 2))
+    for layer in ("north", "south"):
+        with fiona.open(path, "w", driver="GPKG", layer=layer, schema=POLYGON_SCHEMA, crs="EPSG:29903") as fh:
+            fh.writerecords(features)
+    return path
+
+
+def targets(jobs):
+    return [[(layer, os.path.basename(target), driver) for _, layer, target, driver in job] for job in jobs]
+
+
+def test_one_file_per_layer_for_single_layer_formats(two_layers, tmp_path):
+    jobs = converter.plan([two_layers], "shp", output_dir=str(tmp_path / "out"))
+    assert targets(jobs) == [[("north", "counties_north.shp", "ESRI Shapefile")],
+                             [("south", "counties_south.shp", "ESRI Shapefile")]]
+    jobs = converter.plan([two_layers], "shp", output_file=str(tmp_path / "named.shp"))
+    assert targets(jobs) == [[("north", "named_north.shp", "ESRI Shapefile")],
+                             [("south", "named_south.shp", "ESRI Shapefile")]]
+
+
+def test_every_layer_into_one_file_for_multi_layer_formats(two_layers, tmp_path):
+    shp = str(tmp_path / "counties.shp")
+    write_layer(county_polygons(2, 2), shp, POLYGON_SCHEMA)
+    jobs = converter.plan([two_layers, shp], "gpkg", output_dir=str(tmp_path / "out"))
+    # Same name, different extensions, so the extension goes into the output name
+    assert targets(jobs) == [[("north", "counties_gpkg.gpkg", "GPKG"), ("south", "counties_gpkg.gpkg", "GPKG")],
+                             [("counties", "counties_shp.gpkg", "GPKG")]]
+
+
+def test_clashes_and_overwrites_are_rejected(two_layers, tmp_path):
+    with pytest.raises(ValueError, match="both be written"):
+        converter.plan([two_layers, two_layers], "shp", output_dir=str(tmp_path / "out"))
+    with pytest.raises(ValueError, match="overwritten by its own conversion"):
+        converter.plan([two_layers], "gpkg")
+    with pytest.raises(ValueError):
+        converter.plan([two_layers, two_layers], "shp", output_file=str(tmp_path / "named.shp"))
+    with pytest.raises(IOError):
+        converter.plan([str(tmp_path / "missing.gpkg")], "shp")
+    with pytest.raises(TypeError):
+        converter.plan([two_layers], "docx")
+
+
+def test_promote_geometry():
+    polygon = {"type": "Polygon", "coordinates": [[(0, 0), (1, 0), (1, 1), (0, 0)]]}
+    assert converter.promote_geometry(polygon) == {"type": "MultiPolygon", "coordinates": [polygon["coordinates"]]}
+    line = {"type": "LineString", "coordinates": [(0, 0), (1, 1)]}
+    assert converter.promote_geometry(line)["type"] == "MultiLineString"
+    multi = {"type": "MultiPolygon", "coordinates": [polygon["coordinates"]]}
+    point = {"type": "Point", "coordinates": (0, 0)}
+    assert converter.promote_geometry(multi) is multi and converter.promote_geometry(point) is point
+    assert converter.promote_geometry(None) is None
+
+
+def test_convert_files(two_layers, tmp_path):
+    results = converter.convert_files([two_layers], "json", output_dir=str(tmp_path / "out"), processes=1)
+    assert [(os.path.basename(r["output"]), r["features"]) for r in results] == [("counties_north.json", 4),
+                                                                                 ("counties_south.json", 4)]
+    # Written as the Multi type. (Shapefiles can't tell the two apart when they're read back, GeoJSON can.)
+    with fiona.open(results[0]["output"]) as fh:
+        assert fh.schema["geometry"] == "MultiPolygon"
+        assert {f["geometry"]["type"] for f in fh} == {"MultiPolygon"}
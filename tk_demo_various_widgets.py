@@ -7,6 +7,7 @@ Program to illustrate GUI programming with Tkinter by showing various widgets in
 * ScrolledText
 * Canvas
 * Image
+* Map viewer (a Canvas that shows spatial data, see utilities/map_viewer.py)
 
 Mark Foley
 March 2021
@@ -17,6 +18,7 @@ from tkinter import ttk
 from tkinter import messagebox
 from tkinter import filedialog
 from tkinter.scrolledtext import ScrolledText
+from utilities.map_viewer import MapViewer
 # import PIL.Image as Image
 # import PIL.ImageDraw as ImageDraw
 
@@ -81,8 +83,13 @@ class MyGUI(tk.Tk):
         self.canvas_1.bind("<B1-Motion>", self.draw_canvas)
         self.canvas_1.grid(row=0, column=0, **self.padding, sticky="nwse")
 
+        # Drag to pan, mouse wheel to zoom
+        self.map_viewer = MapViewer(self.notebook, bg="white")
+        self.map_viewer.grid(row=0, column=0, **self.padding, sticky="nwse")
+
         self.notebook.add(self.scrolled_text1, text="Text Editor")
         self.notebook.add(self.canvas_1, text="Whiteboard")
+        self.notebook.add(self.map_viewer, text="Map")
 
     def catch_destroy(self):
         if messagebox.askokcancel("Quit", "Do you really want to quit?"):
@@ -117,6 +124,22 @@ class MyGUI(tk.Tk):
             except Exception as e:
                 self.show_info("Error", f"{e}")
 
+    def open_layer(self):
+        chosen_file = filedialog.askopenfilename(filetypes=(("Spatial data", "*.shp *.gpkg *.geojson *.json"),
+                                                            ("WKT files", "*.csv"),
+                                                            ("All files", "*.*")))
+        if not chosen_file:
+            return
+        try:
+            self.map_viewer.add_file(chosen_file)
+            self.chosen_file.set(chosen_file)
+        except Exception as e:
+            self.show_info("Error", f"{e}")
+
+    def clear_map(self):
+        self.chosen_file.set("")
+        self.map_viewer.clear()
+
     def show_info(self, title="Info", message="Nothing to show."):
         messagebox.showinfo(title, message)
 
@@ -144,6 +167,9 @@ class MyGUI(tk.Tk):
         elif nb.tab(nb.select(), "text") == "Whiteboard":
             self.create_canvas_menu()
 
+        elif nb.tab(nb.select(), "text") == "Map":
+            self.create_map_menu()
+
         else:
             return
 
@@ -169,6 +195,20 @@ class MyGUI(tk.Tk):
                                  command=lambda: self.show_info(title="Help text", message=f"{__doc__}"))
         self.config(menu=self.menubar)
 
+    def create_map_menu(self):
+        # set up menu
+        self.menubar = tk.Menu(self)
+        self.file_menu = tk.Menu(self.menubar, tearoff=False)
+        self.file_menu.add_command(label="Open Layer", command=self.open_layer)
+        self.file_menu.add_command(label="Clear Map", command=self.clear_map)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="Exit", command=self.catch_destroy)
+        self.menubar.add_cascade(label="File", menu=self.file_menu)
+        self.menubar.add_command(label="Zoom to Extent", command=self.map_viewer.zoom_to_extent)
+        self.menubar.add_command(label="Help",
+                                 command=lambda: self.show_info(title="Help text", message=f"{__doc__}"))
+        self.config(menu=self.menubar)
+
 
 def main():
     GUI_SETTINGS = {
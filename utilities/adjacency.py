@@ -0,0 +1,118 @@
+"""
+Find which features in a layer are next to (touch) each other.
+
+The simple way to find the neighbours of a feature is to open the layer and test 'touches' against every other
+feature. That's fine for the 26 counties but it's a test against every feature for every question, so finding all of
+the neighbours of every feature means n x n tests. Instead, AdjacencyIndex
+* reads the layer once, making each shapely geometry once
+* builds an STRtree (a spatial index) of the geometries so that only features whose bounding boxes overlap are
+  considered at all
+* tests 'touches' only against those candidates, using a prepared geometry (shapely does extra work up front so that
+  repeated tests against the same geometry are quick)
+* can work out the neighbours of every feature in a single pass with 'graph'
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import fiona
+    import numpy as np
+    from shapely.geometry import shape, GeometryCollection
+    from shapely.prepared import prep
+    from shapely.strtree import STRtree
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+
+class AdjacencyIndex:
+    """
+    Spatial index of a layer for answering 'which features touch this one?'
+    """
+
+    def __init__(self, keys, geometries, properties=None):
+        """
+        :param keys: one key per feature, such as its id or name. Keys don't have to be unique.
+        :param geometries: one shapely geometry per feature
+        :param properties: optional list of the features' properties, kept so that you don't have to read them again
+        """
+        self.keys = list(keys)
+        self.geometries = np.array(list(geometries), dtype=object)
+        self.properties = properties
+        if len(self.keys) != len(self.geometries):
+            raise ValueError("Need exactly one key per geometry.")
+        self.tree = STRtree(self.geometries)
+
+        # Where each key is in the layer
+        self.positions = {}
+        for position, key in enumerate(self.keys):
+            self.positions.setdefault(key, []).append(position)
+
+    @classmethod
+    def from_file(cls, source, key_property=None, layer=None):
+        """
+        Read a spatial data file once and index it.
+
+        :param source: path to any file fiona can read
+        :param key_property: property to use as the key of each feature. Defaults to the feature id.
+        :param layer: layer to read, for formats such as GeoPackage which can have more than one
+        :return: AdjacencyIndex
+        """
+        keys, geometries, properties = [], [], []
+        with fiona.open(source, "r", layer=layer) as fh:
+            for feature in fh:
+                keys.append(feature["properties"][key_property] if key_property else feature["id"])
+                # A feature without a geometry is kept, as an empty one, so it's in the layer but touches nothing
+                geometries.append(shape(feature["geometry"]) if feature["geometry"] else GeometryCollection())
+                properties.append(dict(feature["properties"]))
+
+        return cls(keys, geometries, properties)
+
+    def neighbours_of_geometry(self, geometry):
+        """
+        :param geometry: any shapely geometry
+        :return: list of the keys of features which touch it
+        """
+        # The tree gives us the features whose bounding boxes overlap, then we do the real test on just those
+        prepared = prep(geometry)
+        return [self.keys[i] for i in self.tree.query(geometry) if prepared.touches(self.geometries[i])]
+
+    def neighbours(self, key):
+        """
+        :param key: key of a feature in the layer
+        :return: list of the keys of features which touch it
+        """
+        if key not in self.positions:
+            raise KeyError(f"'{key}' isn't in the layer.")
+
+        found = []
+        for position in self.positions[key]:
+            prepared = prep(self.geometries[position])
+            for i in self.tree.query(self.geometries[position]):
+                if self.keys[i] != key and self.keys[i] not in found and prepared.touches(self.geometries[i]):
+                    found.append(self.keys[i])
+        return found
+
+    def pairs(self):
+        """
+        Every pair of features that touch, worked out in one pass.
+
+        :return: tuple of two NumPy arrays of positions in the layer. Feature pairs[0][n] touches feature pairs[1][n].
+        Each pair appears both ways round.
+        """
+        # Querying the tree with every geometry at once means the bounding box filter and the 'touches' test (which
+        # uses prepared geometries internally) all happen inside GEOS rather than in a Python loop.
+        left, right = self.tree.query(self.geometries, predicate="touches")
+        not_self = left != right
+        return left[not_self], right[not_self]
+
+    def graph(self):
+        """
+        The neighbours of every feature.
+
+        :return: dict of key: list of neighbouring keys
+        """
+        graph = {key: [] for key in self.keys}
+        for i, j in zip(*self.pairs()):
+            if self.keys[j] != self.keys[i] and self.keys[j] not in graph[self.keys[i]]:
+                graph[self.keys[i]].append(self.keys[j])
+        return graph
@@ -0,0 +1,175 @@
+"""
+An attribute index for picking features out of a layer by the value of one property.
+
+Picking, say, the Dublin counties out of the counties layer means reading every feature and testing its 'nuts3name'.
+With a big layer that's a lot of reading for a handful of matches. Instead we read the layer once to make an index of
+value -> feature ids and keep it in a small file next to the layer (e.g. counties.shp.nuts3name.idx.json). After that
+a selection only reads the matching features, using fiona's indexed access (collection[fid]).
+
+* 'equals' matches use the index directly.
+* 'contains' (substring) matches only have to look through the distinct values in the index, not every feature.
+
+If the layer changes (its modification time or size), the index is made again the next time it's used.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import json
+    import os
+    import tempfile
+    import fiona
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+MATCH_TYPES = ("equals", "contains")
+
+# Files that make up a shapefile and matter to the attributes
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf")
+
+
+def _real_path(source):
+    # GDAL virtual paths such as /vsizip/path/to/file.zip/counties.shp point inside a zip file. The index can't go
+    # inside the zip file, so it goes next to it instead.
+    if source.startswith("/vsizip/"):
+        path = source[len("/vsizip/"):]
+        split = path.lower().find(".zip/")
+        if split > -1:
+            return path[:split + 4], path[split + 5:].replace("/", ".")
+    return source, None
+
+
+def _source_files(source):
+    path, member = _real_path(source)
+    if member:
+        return [path]
+    stem, extension = os.path.splitext(path)
+    if extension.lower() == ".shp":
+        return [f"{stem}{part}" for part in SHAPEFILE_PARTS if os.path.exists(f"{stem}{part}")]
+    return [path]
+
+
+def _source_signature(source):
+    return [[os.path.getmtime(path), os.path.getsize(path)] for path in _source_files(source)]
+
+
+def index_path(source, property_name, layer=None):
+    """
+    Where the index for a property is stored, e.g. counties.shp.nuts3name.idx.json
+
+    :return: path as str
+    """
+    path, member = _real_path(source)
+    base = f"{path}.{member}" if member else path
+    return f"{base}.{layer}.{property_name}.idx.json" if layer else f"{base}.{property_name}.idx.json"
+
+
+class AttributeIndex:
+    """
+    Map from the values of one property to the ids of the features that have them.
+    """
+
+    def __init__(self, property_name, values, signature=None):
+        """
+        :param property_name: the property that's indexed
+        :param values: dict of value: list of feature ids
+        :param signature: modification times and sizes of the layer's files when the index was made
+        """
+        self.property_name = property_name
+        self.values = values
+        self.signature = signature
+
+    @classmethod
+    def build(cls, source, property_name, layer=None):
+        """
+        Read the layer once and index one property.
+
+        :return: AttributeIndex
+        """
+        values = {}
+        signature = _source_signature(source)
+        with fiona.open(source, "r", layer=layer) as fh:
+            if property_name not in fh.schema["properties"]:
+                raise KeyError(f"'{property_name}' isn't a property of {source}.")
+            for feature in fh:
+                values.setdefault(feature["properties"][property_name], []).append(int(feature["id"]))
+
+        return cls(property_name, values, signature)
+
+    def save(self, path):
+        # Stored as a list of [value, ids] sorted by value, so values that aren't strings survive the trip to JSON
+        # Each writer gets its own temporary file, so two processes indexing the same layer can't clobber each other
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump({
+                "property": self.property_name,
+                "signature": self.signature,
+                "values": sorted(([k, v] for k, v in self.values.items()), key=lambda item: str(item[0])),
+            }, fh)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as fh:
+            stored = json.load(fh)
+        return cls(stored["property"], {k: v for k, v in stored["values"]}, stored["signature"])
+
+    def fids(self, value, match="equals"):
+        """
+        :param value: value to look for
+        :param match: "equals" for an exact match, "contains" for features whose value contains 'value'
+        :return: sorted list of feature ids
+        """
+        if match == "equals":
+            return sorted(self.values.get(value, []))
+        if match == "contains":
+            return sorted(fid for k, fids in self.values.items() if k is not None and value in str(k) for fid in fids)
+        raise ValueError(f"Match must be one of {MATCH_TYPES}.")
+
+
+def get_index(source, property_name, layer=None):
+    """
+    Get the index of a property, using the stored one if the layer hasn't changed since it was made.
+
+    :param source: path to any file fiona can read
+    :param property_name: property to index
+    :param layer: layer to read, for formats such as GeoPackage which can have more than one
+    :return: AttributeIndex
+    """
+    path = index_path(source, property_name, layer)
+    if os.path.exists(path):
+        try:
+            index = AttributeIndex.load(path)
+            if index.signature == _source_signature(source):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = AttributeIndex.build(source, property_name, layer)
+    index.save(path)
+
+    return index
+
+
+def select_features(source, property_name, value, match="equals", layer=None):
+    """
+    Read only the features whose property matches a value.
+
+    :param source: path to any file fiona can read, or a collection that you've already opened with fiona
+    :param property_name: property to test
+    :param value: value to look for
+    :param match: "equals" or "contains"
+    :param layer: layer to read, for formats such as GeoPackage which can have more than one. For a collection,
+    defaults to the collection's own layer.
+    :return: generator of features
+    """
+    if isinstance(source, fiona.Collection):
+        # Index the layer that was opened, not the file's first layer
+        for fid in get_index(source.path, property_name, layer or source.name).fids(value, match):
+            yield source[fid]
+        return
+
+    fids = get_index(source, property_name, layer).fids(value, match)
+    with fiona.open(source, "r", layer=layer) as fh:
+        for fid in fids:
+            yield fh[fid]
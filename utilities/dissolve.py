@@ -0,0 +1,152 @@
+"""
+Dissolve a layer by the value of a property: one output feature per value, with the geometries merged and numeric
+properties added up (or averaged, or whatever you ask for).
+
+The layer is read once, feature by feature. We don't keep the features, only a small set of running totals for each
+group and a few geometries waiting to be merged. Every so often (PARTIAL_UNION_EVERY geometries) a group's waiting
+geometries are merged into its running result, so memory use depends on the number of groups, not the size of the
+layer.
+
+What to work out for each group is given as a dict of output property: (reducer, input property), e.g.
+
+    {"total2011": ("sum", "total2011"), "counties": ("count", None)}
+
+The reducers are sum, mean, min, max, first and count. 'first' keeps the first value read, which is handy for
+properties that are the same throughout a group, such as a region's name. Missing (None) values are skipped, except by
+count, which counts features.
+
+If you have the memory to hold every geometry and lots of cores, merge_engine.dissolve_by merges in parallel instead.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import shapely
+    from shapely.geometry import shape, mapping
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+REDUCERS = ("sum", "mean", "min", "max", "first", "count")
+
+# Number of geometries a group collects before they're merged into its running result
+PARTIAL_UNION_EVERY = 256
+
+
+class _Group:
+    """
+    Running totals and geometry for one value of the key property.
+    """
+
+    def __init__(self, aggregates):
+        self.aggregates = aggregates
+        self.count = 0
+        self.totals = {name: None for name in aggregates}
+        self.counts = {name: 0 for name in aggregates}
+        self.merged = None
+        self.waiting = []
+
+    def add(self, feature, grid_size=None):
+        self.count += 1
+        for name, (reducer, property_name) in self.aggregates.items():
+            if reducer == "count":
+                continue
+            value = feature["properties"][property_name]
+            if value is None:
+                continue
+            total = self.totals[name]
+            # 'first' never gets past here once it has a value
+            if total is None:
+                self.totals[name] = value
+            elif reducer in ("sum", "mean"):
+                self.totals[name] = total + value
+            elif reducer == "min":
+                self.totals[name] = min(total, value)
+            elif reducer == "max":
+                self.totals[name] = max(total, value)
+            self.counts[name] += 1
+
+        if feature["geometry"] is not None:
+            self.waiting.append(shape(feature["geometry"]))
+            if len(self.waiting) >= PARTIAL_UNION_EVERY:
+                self.merge_waiting(grid_size)
+
+    def merge_waiting(self, grid_size=None):
+        if self.merged is not None:
+            self.waiting.append(self.merged)
+        if self.waiting:
+            self.merged = shapely.union_all(self.waiting, grid_size=grid_size)
+        self.waiting = []
+
+    def properties(self):
+        result = {}
+        for name, (reducer, _) in self.aggregates.items():
+            if reducer == "count":
+                result[name] = self.count
+            elif reducer == "mean":
+                result[name] = self.totals[name] / self.counts[name] if self.counts[name] else None
+            else:
+                result[name] = self.totals[name]
+        return result
+
+
+def _check_aggregates(aggregates):
+    for name, (reducer, property_name) in aggregates.items():
+        if reducer not in REDUCERS:
+            raise ValueError(f"Reducer for '{name}' must be one of {REDUCERS}.")
+        if reducer != "count" and not property_name:
+            raise ValueError(f"Reducer '{reducer}' for '{name}' needs an input property.")
+
+
+def dissolve(features, key, aggregates=None, grid_size=None):
+    """
+    Group features by the value of a property, merging the geometries and reducing the properties of each group.
+
+    :param features: iterable of GeoJSON-like features, such as an open fiona collection
+    :param key: property to group by, e.g. "nuts3name"
+    :param aggregates: dict of output property: (reducer, input property). See the top of this file.
+    :param grid_size: if given, every vertex is snapped to a grid this size when geometries are merged
+    :return: generator of GeoJSON-like features, one per group, in the order each group was first seen
+    """
+    aggregates = aggregates or {}
+    _check_aggregates(aggregates)
+
+    groups = {}
+    for feature in features:
+        value = feature["properties"][key]
+        if value not in groups:
+            groups[value] = _Group(aggregates)
+        groups[value].add(feature, grid_size)
+
+    for fid, (value, group) in enumerate(groups.items()):
+        group.merge_waiting(grid_size)
+        properties = {key: value}
+        properties.update(group.properties())
+        yield {
+            "type": "Feature",
+            "id": fid,
+            "properties": properties,
+            "geometry": mapping(group.merged) if group.merged is not None else None,
+        }
+
+
+def dissolve_schema(source_schema, key, aggregates=None):
+    """
+    Make a fiona schema for the output of 'dissolve'.
+
+    :param source_schema: schema of the layer being dissolved
+    :param key: property the layer is grouped by
+    :param aggregates: as passed to 'dissolve'
+    :return: fiona schema
+    """
+    properties = {key: source_schema["properties"][key]}
+    for name, (reducer, property_name) in (aggregates or {}).items():
+        # sum, min, max and first keep the type of the input property (an int written to a float field comes out
+        # empty)
+        if reducer == "count":
+            properties[name] = "int"
+        elif reducer == "mean":
+            properties[name] = "float"
+        else:
+            properties[name] = source_schema["properties"][property_name].split(":")[0]
+
+    return {"geometry": source_schema["geometry"], "properties": properties}
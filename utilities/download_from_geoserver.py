@@ -7,17 +7,35 @@ Download any dataset from a Geoserver installation.
 To use just import 'download_wfs_data' into your program. You can run this program stand-alone as well for testing
 purposes.
 
+For very large layers use 'stream_wfs_features' instead. This pages through the layer and hands back one GeoJSON feature
+at a time, so you never hold the whole layer in memory. 'download_wfs_tiles' splits the extent of a layer into a grid of
+tiles and downloads them in parallel, which is much quicker for big layers.
+
+Before we download any data we need the capabilities of the WFS service and the schema of the dataset. These are two
+extra round trips to Geoserver, so we remember them (for SCHEMA_CACHE_SETTINGS["ttl"] seconds) and only ask again when
+they've expired. Set SCHEMA_CACHE_SETTINGS["cache_dir"] to a directory to remember schemas between runs as well.
+
 Mark Foley,
 April 2021
 """
 
 # If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
 try:
-    from io import BytesIO
-    from zipfile import ZipFile
+    import codecs
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    import copy
+    import hashlib
+    import json
+    import os
+    import re
+    import tempfile
+    import threading
+    import time
     import urllib
-    import requests
     from owslib.wfs import WebFeatureService
+    import utilities.http_session as http
+    import utilities.http_cache as http_cache
+    from utilities.spooled_zip import save_zip
 except Exception as e:
     print(f"{e}")
     quit(1)
@@ -25,9 +43,20 @@ except Exception as e:
 # Default host, it's unlikely that you'll need to change this.
 HOST = "https://markfoley.info/geoserver"
 
+# How long we remember WFS capabilities and dataset schemas for and, optionally, where we keep schemas on disk.
+SCHEMA_CACHE_SETTINGS = {
+    "ttl": 60 * 60,
+    "cache_dir": None,
+}
+
+# In-memory memo of WebFeatureService objects and raw schemas. Each value is a tuple of (expiry time, value).
+_wfs_memo = {}
+_schema_memo = {}
+_memo_lock = threading.Lock()
+
 
 def download_wfs_data(host=HOST, workspace=None, dataset=None, output_format="application/json", srs=None,
-                      filter_expression=None, property_list=None, return_directory=None):
+                      filter_expression=None, property_list=None, return_directory=None, cache_dir=None):
     """
     This is the main 'active ingredient' in this process. You import this into your program and provide the necessary
     parameters. Note that some have defaults (which can be None).
@@ -41,6 +70,8 @@ def download_wfs_data(host=HOST, workspace=None, dataset=None, output_format="ap
     :param property_list: You can select a subset of non-spatial properties to download.
     :param return_directory: Only relevant to Zip files. This is where the contents of a zipfile will be stored. Used
     when you want to get shapefiles.
+    :param cache_dir: If you supply a directory, responses are cached here and re-used until the data on Geoserver
+    changes. See 'http_cache'.
 
     :return: The result. Content depends on output format.
     * Zip returns a tuple of directory (location) and a list of files.
@@ -53,39 +84,11 @@ def download_wfs_data(host=HOST, workspace=None, dataset=None, output_format="ap
     valid_formats = ["text/csv", "application/zip", "application/json"]
 
     try:
-        # Create an OWSlib WebFeatureService object and get the relevant schema
-        wfs11 = WebFeatureService(url=f"{HOST}/wfs", version='1.1.0')
-        this_schema = wfs11.get_schema(f"{workspace}:{dataset}")
+        this_schema, property_list = _get_schema(host, workspace, dataset, property_list)
+        url = _build_getfeature_url(host, workspace, dataset, output_format, srs, filter_expression, property_list)
 
-        # If we have a properties filter, we adjust the schema to reflect this. We need to add the geometry column
-        # otherwise we won't get the feature geometries.
-        if property_list:
-            if isinstance(property_list, str):
-                property_list = property_list.split(",")
-            required_properties = {k: v for k, v in this_schema["properties"].items() if k in property_list}
-            if required_properties:
-                property_list.append(this_schema["geometry_column"])
-                this_schema["properties"] = required_properties
-
-        # OWSlib 'get_schema' is a mess so we fix it.
-        for k in this_schema["properties"]:
-            if this_schema["properties"][k] == "string":
-                this_schema["properties"][k] = "str"
-            elif this_schema["properties"][k] == "decimal":
-                this_schema["properties"][k] = "float"
-            elif this_schema["properties"][k] == "double":
-                this_schema["properties"][k] = "float"
-
-        # Strings to supply to URL. Note that (E)CQL and propertyName expressions must be URL-encoded.
-        cql_string = f"&cql_filter={urllib.parse.quote(filter_expression)}" if filter_expression else ""
-        property_string = f"&propertyName={urllib.parse.quote(','.join(property_list))}" if property_list else ""
-        srs_string = f"&srsName=EPSG:{srs}" if srs else ""
-        format_string = f"&outputFormat={output_format}" if output_format else ""
-
-        url = f"{host}/{workspace}/ows?service=WFS&version=1.0.0&request=GetFeature" \
-              f"&typeName={workspace}:{dataset}{cql_string}{property_string}{srs_string}{format_string}"
-
-        response = requests.get(url)
+        # Stream zip files to disk rather than holding them in memory
+        response = http_cache.get(url, cache_dir=cache_dir, stream=output_format in ("application/zip", "SHAPE-ZIP"))
         if 200 <= response.status_code <= 299:
             if not response.headers["Content-Type"]:
                 raise ValueError("Couldn't figure out what type this is, sorry.")
@@ -96,9 +99,7 @@ def download_wfs_data(host=HOST, workspace=None, dataset=None, output_format="ap
             if content_type[0][0] == "application/zip":
                 if not return_directory:
                     raise ValueError("No return directory supplied.")
-                my_zipfile = ZipFile(BytesIO(response.content))
-                my_zipfile.extractall(path=return_directory)
-                return return_directory, my_zipfile.namelist()
+                return save_zip(response, return_directory)
             if content_type[0][0] == "application/json":
                 return {
                     "schema": this_schema,
@@ -113,6 +114,401 @@ def download_wfs_data(host=HOST, workspace=None, dataset=None, output_format="ap
         quit(1)
 
 
+def _get_wfs(host):
+    """
+    Make an OWSlib WebFeatureService object for a Geoserver instance. This does a GetCapabilities request, so we
+    remember the object and hand back the same one until it expires.
+
+    :param host: Geoserver host and port.
+    :return: WebFeatureService object
+    """
+    with _memo_lock:
+        expires, wfs = _wfs_memo.get(host, (0, None))
+        if time.time() < expires:
+            return wfs
+
+    wfs = WebFeatureService(url=f"{host}/wfs", version='1.1.0')
+    with _memo_lock:
+        _wfs_memo[host] = (time.time() + SCHEMA_CACHE_SETTINGS["ttl"], wfs)
+
+    return wfs
+
+
+def _schema_cache_path(host, type_name):
+    key = hashlib.sha256(f"{host}|{type_name}".encode("utf-8")).hexdigest()
+    return os.path.join(SCHEMA_CACHE_SETTINGS["cache_dir"], f"wfs_schema_{key}.json")
+
+
+def _get_raw_schema(host, type_name):
+    """
+    Get the schema for a dataset as OWSlib gives it to us (a DescribeFeatureType request). We look in memory first,
+    then on disk if there's a cache directory, and only then ask Geoserver.
+
+    :param host: Geoserver host and port.
+    :param type_name: workspace:dataset
+    :return: a copy of the schema which the caller is free to change
+    """
+    now = time.time()
+    with _memo_lock:
+        expires, schema = _schema_memo.get((host, type_name), (0, None))
+    if now < expires:
+        return copy.deepcopy(schema)
+
+    if SCHEMA_CACHE_SETTINGS["cache_dir"]:
+        try:
+            with open(_schema_cache_path(host, type_name), "r") as fh:
+                stored = json.load(fh)
+            if now < stored["expires"]:
+                with _memo_lock:
+                    _schema_memo[(host, type_name)] = (stored["expires"], stored["schema"])
+                return copy.deepcopy(stored["schema"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    schema = _get_wfs(host).get_schema(type_name)
+    expires = now + SCHEMA_CACHE_SETTINGS["ttl"]
+    with _memo_lock:
+        _schema_memo[(host, type_name)] = (expires, schema)
+
+    if SCHEMA_CACHE_SETTINGS["cache_dir"]:
+        # Write to a temporary file and swap it in, so other threads and interrupted runs never see half a file
+        path = _schema_cache_path(host, type_name)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"expires": expires, "schema": schema}, fh)
+        os.replace(tmp_path, path)
+
+    return copy.deepcopy(schema)
+
+
+def clear_schema_cache():
+    """
+    Forget all remembered capabilities and schemas (in memory only, files in the cache directory are left alone).
+
+    :return: None
+    """
+    with _memo_lock:
+        _wfs_memo.clear()
+        _schema_memo.clear()
+
+
+def _get_schema(host, workspace, dataset, property_list=None):
+    """
+    Get the schema of a dataset from Geoserver and tidy it up so that fiona can use it.
+
+    :param host: Geoserver host and port.
+    :param workspace: WS on Geoserver.
+    :param dataset: Any WFS dataset on Geoserver.
+    :param property_list: Optional subset of non-spatial properties. The geometry column is added to this.
+    :return: tuple of schema and (possibly amended) property list
+    """
+    # Get the relevant schema. This comes from OWSlib via the memo, so we don't ask Geoserver every time.
+    this_schema = _get_raw_schema(host, f"{workspace}:{dataset}")
+
+    # If we have a properties filter, we adjust the schema to reflect this. We need to add the geometry column
+    # otherwise we won't get the feature geometries.
+    if property_list:
+        if isinstance(property_list, str):
+            property_list = property_list.split(",")
+        property_list = list(property_list)
+        required_properties = {k: v for k, v in this_schema["properties"].items() if k in property_list}
+        if required_properties:
+            property_list.append(this_schema["geometry_column"])
+            this_schema["properties"] = required_properties
+
+    # OWSlib 'get_schema' is a mess so we fix it.
+    for k in this_schema["properties"]:
+        if this_schema["properties"][k] == "string":
+            this_schema["properties"][k] = "str"
+        elif this_schema["properties"][k] == "decimal":
+            this_schema["properties"][k] = "float"
+        elif this_schema["properties"][k] == "double":
+            this_schema["properties"][k] = "float"
+
+    return this_schema, property_list
+
+
+def _build_getfeature_url(host, workspace, dataset, output_format=None, srs=None, filter_expression=None,
+                          property_list=None, **extra_params):
+    """
+    Make a WFS GetFeature URL. Any extra keyword arguments (e.g. startIndex, maxFeatures, sortBy) are added as they are.
+
+    :return: URL as str
+    """
+    # Strings to supply to URL. Note that (E)CQL and propertyName expressions must be URL-encoded.
+    cql_string = f"&cql_filter={urllib.parse.quote(filter_expression)}" if filter_expression else ""
+    property_string = f"&propertyName={urllib.parse.quote(','.join(property_list))}" if property_list else ""
+    srs_string = f"&srsName=EPSG:{srs}" if srs else ""
+    format_string = f"&outputFormat={output_format}" if output_format else ""
+    extra_string = "".join(f"&{k}={urllib.parse.quote(str(v))}" for k, v in extra_params.items() if v is not None)
+
+    return f"{host}/{workspace}/ows?service=WFS&version=1.0.0&request=GetFeature" \
+           f"&typeName={workspace}:{dataset}{cql_string}{property_string}{srs_string}{format_string}{extra_string}"
+
+
+# What the GeoJSON parser looks for next: between features, the next thing that isn't white space or a comma; inside a
+# feature, the next brace or quote (coordinates have neither, so they're skipped over in one go); inside a string, the
+# next quote or backslash.
+_NEXT_ITEM = re.compile(r"[^\s,]")
+_NEXT_IN_FEATURE = re.compile(r'[{}"]')
+_NEXT_IN_STRING = re.compile(r'["\\]')
+
+
+def _collection_members(header, trailer):
+    # The members of the feature collection before and after "features", e.g. '{"type": "FeatureCollection",' and
+    # ', "totalFeatures": 26, "numberMatched": 26}'
+    members = json.loads(header.rstrip(" \t\r\n,") + "}")
+    members.update(json.loads("{" + trailer.lstrip(" \t\r\n,")))
+    return members
+
+
+def _iter_geojson_features(chunks, collection=None):
+    """
+    Incremental GeoJSON parser. Takes an iterable of byte chunks (such as 'response.iter_content()') making up a
+    FeatureCollection and yields each member of its "features" array as soon as it has fully arrived. Only the feature
+    currently being parsed is held in memory, not the whole document.
+
+    Each chunk is only looked at once: we keep track of how deeply nested in braces (and whether inside a string) we
+    are, and only decode a feature once its closing brace has arrived.
+
+    :param chunks: iterable of bytes
+    :param collection: optional dict. Once the stream has ended, the collection's other members (e.g. numberMatched or
+    totalFeatures) are put into it.
+    :return: generator of GeoJSON features (dicts)
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    features_start = re.compile(r'"features"\s*:\s*\[')
+    buffer, header = "", None
+    # How far through the buffer we've looked, and where the feature we're in started
+    position = start = depth = 0
+    in_feature = in_string = at_end = False
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        if header is None:
+            match = features_start.search(buffer)
+            if not match:
+                continue
+            header, buffer = buffer[:match.start()], buffer[match.end():]
+        if at_end:
+            continue
+
+        while True:
+            if not in_feature:
+                match = _NEXT_ITEM.search(buffer, position)
+                if not match:
+                    position = len(buffer)
+                    break
+                if match.group() == "]":
+                    buffer, at_end = buffer[match.end():], True
+                    break
+                if match.group() != "{":
+                    raise ValueError(f"Expected a feature but found '{match.group()}'.")
+                start, position, depth, in_feature = match.start(), match.end(), 1, True
+                continue
+
+            match = (_NEXT_IN_STRING if in_string else _NEXT_IN_FEATURE).search(buffer, position)
+            if not match:
+                # Not before the end, or we'd lose a skipped escape that hasn't arrived yet
+                position = max(position, len(buffer))
+                break
+            position = match.end()
+            if in_string:
+                if match.group() == "\\":
+                    # Skip whatever's escaped, even if it's in the next chunk
+                    position += 1
+                else:
+                    in_string = False
+            elif match.group() == '"':
+                in_string = True
+            elif match.group() == "{":
+                depth += 1
+            else:
+                depth -= 1
+                if not depth:
+                    in_feature = False
+                    yield json.loads(buffer[start:position])
+
+        # Forget what we've finished with, so the buffer only holds the feature we're in
+        if not at_end:
+            keep = start if in_feature else position
+            buffer, position, start = buffer[keep:], position - keep, 0
+
+    buffer += text_decoder.decode(b"", final=True)
+    if not at_end:
+        raise ValueError("Response ended before the end of the feature collection.")
+    try:
+        members = _collection_members(header, buffer)
+    except ValueError:
+        raise ValueError("Response ended before the end of the feature collection.")
+    if collection is not None:
+        collection.update(members)
+
+
+def stream_wfs_features(host=HOST, workspace=None, dataset=None, srs=None, filter_expression=None,
+                        property_list=None, page_size=1000, sort_by=None, chunk_size=65536):
+    """
+    Generator version of 'download_wfs_data' for GeoJSON. Rather than getting the whole dataset in one go, we page
+    through it with the WFS 'startIndex' and 'maxFeatures' parameters and parse each page as it arrives. Peak memory
+    is bounded by the page size rather than the size of the layer.
+
+    :param host: Geoserver host and port. usually defaults to our current instance.
+    :param workspace: WS on Geoserver. In our case it's usually TUDublin, census2011 or census2016.
+    :param dataset: Any WFS dataset on Geoserver. You must supply this.
+    :param srs: Supply any desired EPSG code otherwise ignore ant you'll get the native CRS of the dataset.
+    :param filter_expression: You can filter records from the response using any valid ECQL or CQL expression.
+    :param property_list: You can select a subset of non-spatial properties to download.
+    :param page_size: Number of features requested per page.
+    :param sort_by: Property to sort by. Paging is only guaranteed to be consistent if the order is stable, so supply
+    this if your data store doesn't have a natural order (e.g. a primary key).
+    :param chunk_size: Number of bytes read from the network at a time.
+    :return: generator of GeoJSON features (dicts)
+    """
+    try:
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1.")
+        if property_list:
+            _, property_list = _get_schema(host, workspace, dataset, property_list)
+
+        start_index = 0
+        while True:
+            url = _build_getfeature_url(host, workspace, dataset, "application/json", srs, filter_expression,
+                                        property_list, startIndex=start_index, maxFeatures=page_size, sortBy=sort_by)
+            with http.get(url, stream=True) as response:
+                if not 200 <= response.status_code <= 299:
+                    raise ValueError(f"Bad status code: {response.status_code}")
+                if not response.headers.get("Content-Type", "").startswith("application/json"):
+                    raise ValueError(f"Looks like an invalid content type: {response.headers.get('Content-Type')}")
+                features_in_page, collection = 0, {}
+                for feature in _iter_geojson_features(http.iter_content(response, chunk_size=chunk_size), collection):
+                    features_in_page += 1
+                    yield feature
+
+            start_index += features_in_page
+            # Servers can send fewer features than we asked for (Geoserver has a maximum per request), so a short page
+            # only means the end of the layer if the server hasn't told us how many features there are. Geoserver
+            # says "unknown" when it doesn't know.
+            matched = collection.get("numberMatched", collection.get("totalFeatures"))
+            if not features_in_page:
+                return
+            if isinstance(matched, int):
+                if start_index >= matched:
+                    return
+            elif features_in_page < page_size:
+                return
+    except Exception as e:
+        print(f"{e}")
+        quit(1)
+
+
+def _split_bbox(bbox, tiles):
+    """
+    Split a bounding box into a grid of tiles.
+
+    :param bbox: (minx, miny, maxx, maxy)
+    :param tiles: (columns, rows) or a single number for a square grid
+    :return: list of (minx, miny, maxx, maxy) tuples
+    """
+    if isinstance(tiles, int):
+        tiles = (tiles, tiles)
+    columns, rows = tiles
+    if columns < 1 or rows < 1:
+        raise ValueError("Need at least one tile in each direction.")
+    width = (bbox[2] - bbox[0]) / columns
+    height = (bbox[3] - bbox[1]) / rows
+
+    return [
+        (bbox[0] + column * width, bbox[1] + row * height,
+         bbox[0] + (column + 1) * width, bbox[1] + (row + 1) * height)
+        for row in range(rows) for column in range(columns)
+    ]
+
+
+def _get_tile(url, chunk_size=65536):
+    """
+    Download one tile and parse it as it arrives.
+
+    :param url: GetFeature URL for the tile
+    :return: list of GeoJSON features
+    """
+    with http.get(url, stream=True) as response:
+        if not 200 <= response.status_code <= 299:
+            raise ValueError(f"Bad status code: {response.status_code}")
+        return list(_iter_geojson_features(http.iter_content(response, chunk_size=chunk_size)))
+
+
+def _feature_key(feature):
+    """
+    What makes a feature the same feature when it comes back from more than one tile: its id or, if it hasn't got
+    one, a hash of its geometry and properties.
+    """
+    if feature.get("id") is not None:
+        return "id", feature["id"]
+    content = json.dumps([feature.get("geometry"), feature.get("properties")], sort_keys=True)
+    return "hash", hashlib.sha1(content.encode("utf-8")).digest()
+
+
+def download_wfs_tiles(host=HOST, workspace=None, dataset=None, srs=None, filter_expression=None,
+                       property_list=None, bbox=None, bbox_srs=None, tiles=(4, 4), max_workers=8):
+    """
+    Parallel version of 'download_wfs_data' for GeoJSON. The extent of the dataset is split into a grid of tiles and
+    each tile is requested separately, using a pool of threads, by adding a BBOX test to the CQL filter. Features which
+    straddle a tile boundary are returned by more than one tile so we de-duplicate them by feature id (or, for
+    features without one, by their geometry and properties).
+
+    :param host: Geoserver host and port. usually defaults to our current instance.
+    :param workspace: WS on Geoserver. In our case it's usually TUDublin, census2011 or census2016.
+    :param dataset: Any WFS dataset on Geoserver. You must supply this.
+    :param srs: Supply any desired EPSG code otherwise ignore ant you'll get the native CRS of the dataset.
+    :param filter_expression: You can filter records from the response using any valid ECQL or CQL expression.
+    :param property_list: You can select a subset of non-spatial properties to download.
+    :param bbox: (minx, miny, maxx, maxy) extent to download. Defaults to the WGS84 extent reported by Geoserver.
+    :param bbox_srs: EPSG code of 'bbox'. Defaults to 'srs' if you supply a bbox, otherwise 4326.
+    :param tiles: (columns, rows) of the tile grid or a single number for a square grid.
+    :param max_workers: Maximum number of tiles downloaded at the same time.
+    :return: A dictionary with schema and GeoJSON data, as for 'download_wfs_data'.
+    """
+    try:
+        this_schema, property_list = _get_schema(host, workspace, dataset, property_list)
+
+        if not bbox:
+            bbox = _get_wfs(host).contents[f"{workspace}:{dataset}"].boundingBoxWGS84
+            bbox_srs = 4326
+        if not bbox_srs:
+            bbox_srs = srs or 4326
+
+        urls = []
+        for tile in _split_bbox(bbox, tiles):
+            tile_filter = f"BBOX({this_schema['geometry_column']}, {tile[0]}, {tile[1]}, {tile[2]}, {tile[3]}, " \
+                          f"'EPSG:{bbox_srs}')"
+            if filter_expression:
+                tile_filter = f"({filter_expression}) AND {tile_filter}"
+            urls.append(_build_getfeature_url(host, workspace, dataset, "application/json", srs, tile_filter,
+                                              property_list))
+
+        features = []
+        seen = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in as_completed([executor.submit(_get_tile, url) for url in urls]):
+                for feature in future.result():
+                    key = _feature_key(feature)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    features.append(feature)
+
+        return {
+            "schema": this_schema,
+            "geojson_data": {
+                "type": "FeatureCollection",
+                "features": features
+            }
+        }
+    except Exception as e:
+        print(f"{e}")
+        quit(1)
+
+
 if __name__ == "__main__":
     # Test the Geoserver download process.
 
@@ -149,3 +545,16 @@ if __name__ == "__main__":
     for feature in polys_result["geojson_data"]["features"]:
         pass
 
+    # Stream the points, one page at a time
+    for feature in stream_wfs_features(
+            workspace=WORKSPACE_POINTS,
+            dataset=DATASET_POINTS,
+            srs=SRS_NAME,
+            filter_expression=POINTS_CQL_FILTER,
+            page_size=500
+    ):
+        pass
+
+    # How much did we download and how many connections did we need?
+    print(http.get_stats())
+
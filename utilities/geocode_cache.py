@@ -0,0 +1,144 @@
+"""
+A persistent cache for geocoder results, kept in an SQLite database.
+
+Geocoding is slow (Nominatim allows one request a second) and we tend to ask the same questions every time we run a
+program. This remembers the answers between runs.
+* Addresses are stored under a normalised version of the address, so "Mullingar,  Westmeath" and
+  "mullingar, westmeath" are the same question.
+* Locations (for reverse geocoding) are snapped to a grid of cells 'precision' metres across, so two centroids a few
+  metres apart share the same answer. Coordinates must be lon/lat (EPSG:4326).
+* Answers older than 'ttl' seconds are ignored and can be cleared out with 'evict_expired'.
+
+Use it by passing a GeocodeCache as the 'cache' argument to the functions in 'geopy_nominatim'.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import json
+    import math
+    import re
+    import sqlite3
+    import threading
+    import time
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Roughly how many metres there are in a degree of latitude
+METRES_PER_DEGREE = 111320
+
+
+class GeocodeCache:
+    """
+    SQLite-backed store of raw geocoder results for forward (address) and reverse (location) lookups.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 60 * 60, precision=25):
+        """
+        :param path: SQLite database file. It's created if it doesn't exist.
+        :param ttl: Seconds that an answer stays good for.
+        :param precision: Size in metres of the grid cells that reverse lookups are snapped to.
+        """
+        if precision <= 0:
+            raise ValueError("Precision must be more than zero metres.")
+        self.ttl = ttl
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        # The batch geocoder calls us from several threads, so share one connection and take turns with it
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, raw TEXT NOT NULL, stored REAL NOT NULL, "
+                "PRIMARY KEY (kind, key))"
+            )
+
+    @staticmethod
+    def address_key(address):
+        # Case, punctuation and spacing don't change the meaning of an address
+        return " ".join(re.sub(r"[^\w]+", " ", address.lower()).split())
+
+    def location_key(self, lon, lat):
+        # Work out which grid cell the location is in. A degree of longitude gets shorter as you go north, so the cell
+        # width in degrees depends on the row that we're in.
+        cell_height = self.precision / METRES_PER_DEGREE
+        row = math.floor(lat / cell_height)
+        row_lat = (row + 0.5) * cell_height
+        cell_width = self.precision / (METRES_PER_DEGREE * max(math.cos(math.radians(row_lat)), 1e-6))
+        column = math.floor(lon / cell_width)
+        return f"{self.precision}:{row}:{column}"
+
+    def _get(self, kind, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT raw, stored FROM geocodes WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row and time.time() - row[1] < self.ttl:
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def _put(self, kind, key, raw):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO geocodes (kind, key, raw, stored) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(raw), time.time())
+            )
+
+    def get_address(self, address):
+        """
+        :param address: Address as str
+        :return: raw geocoder result or None if we don't have (a fresh) one
+        """
+        return self._get("address", self.address_key(address))
+
+    def put_address(self, address, raw):
+        self._put("address", self.address_key(address), raw)
+
+    def get_location(self, lon, lat):
+        """
+        :param lon: Longitude (EPSG:4326)
+        :param lat: Latitude (EPSG:4326)
+        :return: raw reverse geocoder result or None if we don't have (a fresh) one
+        """
+        return self._get("location", self.location_key(lon, lat))
+
+    def put_location(self, lon, lat, raw):
+        self._put("location", self.location_key(lon, lat), raw)
+
+    def evict_expired(self):
+        """
+        Delete answers older than the TTL.
+
+        :return: number of answers deleted
+        """
+        with self.lock, self.connection:
+            return self.connection.execute(
+                "DELETE FROM geocodes WHERE stored < ?", (time.time() - self.ttl,)
+            ).rowcount
+
+    def stats(self):
+        """
+        :return: dict of hits, misses, hit ratio and number of answers stored
+        """
+        with self.lock:
+            stored = self.connection.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "stored": stored,
+            }
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,38 +1,54 @@
 # If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
 try:
+    from concurrent.futures import ThreadPoolExecutor
     import datetime
+    import threading
+    import time
     from geopy.geocoders import Nominatim
-    import pyproj
     from shapely.geometry import Point
+    from utilities.transformer_registry import get_transformer
 except Exception as e:
     print(f"{e}")
     quit(1)
 
 geolocator = Nominatim(user_agent="gisp-agent")
 
-def geocode_address(address=""):
+# Nominatim's usage policy allows an absolute maximum of one request per second.
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+
+
+def geocode_address(address="", geocoder=None, cache=None):
     """
     Address geocoder using OSM Nominatim. Accepts 'address' string and returns a dictionary response containing
     everything that the geocoder provides.
 
     :param address: Address to be geocoded
+    :param geocoder: Any geopy-style geocoder. Defaults to Nominatim.
+    :param cache: Optional GeocodeCache (see 'geocode_cache'). If it has the answer we don't ask the geocoder.
     :return: response as dict
     """
+    geocoder = geocoder or geolocator
     body = {}
 
     try:
         if not address:
             raise Exception("No address supplied")
 
-        # This object gives us everything the the geocoder can tell us about the address supplied
-        loc = geolocator.geocode(address, addressdetails=True)
+        raw = cache.get_address(address) if cache else None
+        if not raw:
+            # This object gives us everything the the geocoder can tell us about the address supplied
+            loc = geocoder.geocode(address, addressdetails=True)
+
+            if not loc:
+                raise Exception(f"No result found for '{address}'")
 
-        if not loc:
-            raise Exception(f"No result found for '{address}'")
+            raw = loc.raw
+            if cache:
+                cache.put_address(address, raw)
 
         body["message"] = f"Called 'geocode_address'. OK! {datetime.datetime.now()}"
         body["input_address"] = address
-        body["result"] = loc.raw
+        body["result"] = raw
 
         # We return a dictionary with everything that the geocoder gave us
         response = {
@@ -47,15 +63,19 @@ def geocode_address(address=""):
     return response
 
 
-def geocode_location(location="", epsg=4326):
+def geocode_location(location="", epsg=4326, geocoder=None, cache=None):
     """
     Address geocoder using OSM Nominatim. Accepts 'location' string in lat, lon format and returns a
     dictionary response containing everything that the geocoder provides.
 
     :param location: string in lon, lat
     :param epsg: EPSG code of input coordinates, these will be converted to EPSG:4326 if not already 4326
+    :param geocoder: Any geopy-style geocoder. Defaults to Nominatim.
+    :param cache: Optional GeocodeCache (see 'geocode_cache'). If it has an answer for a location close enough to
+    this one we don't ask the geocoder.
     :return: dict response
     """
+    geocoder = geocoder or geolocator
     body = {}
 
     try:
@@ -74,20 +94,27 @@ def geocode_location(location="", epsg=4326):
             y = float(location.strip().split(",")[1])
 
         if epsg != 4326:
-            input_transformer = pyproj.Transformer.from_crs(int(epsg), 4326, always_xy=True)
+            # geocode_batch calls this from several threads, so each thread gets its own transformer
+            input_transformer = get_transformer(int(epsg), 4326, always_xy=True, thread_local=True)
             lon, lat = input_transformer.transform(x, y)
         else:
             lon, lat = x, y
 
-        # This object gives us everything the the geocoder can tell us about the coordinates supplied
-        loc = geolocator.reverse(f"{lat}, {lon}")
+        raw = cache.get_location(lon, lat) if cache else None
+        if not raw:
+            # This object gives us everything the the geocoder can tell us about the coordinates supplied
+            loc = geocoder.reverse(f"{lat}, {lon}")
 
-        if not loc:
-            raise Exception(f"No result found for '{location}'")
+            if not loc:
+                raise Exception(f"No result found for '{location}'")
+
+            raw = loc.raw
+            if cache:
+                cache.put_location(lon, lat, raw)
 
         body["message"] = f"Called 'geocode_location'. OK! {datetime.datetime.now()}"
         body["input_location"] = location
-        body["result"] = loc.raw
+        body["result"] = raw
 
         # As above, we return a dictionary with everything that the geocoder gave us
         response = {
@@ -102,6 +129,78 @@ def geocode_location(location="", epsg=4326):
     return response
 
 
+class _RateLimiter:
+    """
+    Hands out time slots so that, however many threads are calling 'wait', no more than 'requests_per_second' calls
+    get through in any second.
+    """
+
+    def __init__(self, requests_per_second):
+        if requests_per_second <= 0:
+            raise ValueError("Requests per second must be more than zero.")
+        self.interval = 1.0 / requests_per_second
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class _RateLimitedGeocoder:
+    """
+    Wraps a geocoder so that every request to it waits for a slot from a _RateLimiter. Answers that come from a cache
+    never reach the geocoder so they don't use up a slot.
+    """
+
+    def __init__(self, geocoder, limiter):
+        self.geocoder = geocoder
+        self.limiter = limiter
+
+    def geocode(self, *args, **kwargs):
+        self.limiter.wait()
+        return self.geocoder.geocode(*args, **kwargs)
+
+    def reverse(self, *args, **kwargs):
+        self.limiter.wait()
+        return self.geocoder.reverse(*args, **kwargs)
+
+
+def geocode_batch(items, reverse=False, epsg=4326, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, max_workers=4,
+                  geocoder=None, cache=None):
+    """
+    Geocode (or reverse geocode) lots of addresses or locations. Requests are run on a pool of threads so that the
+    time spent waiting on the network overlaps, but they're scheduled so that we never go over 'requests_per_second'.
+    Keep this at 1 for the public Nominatim server. If you have your own geocoder (or a local stand-in for testing)
+    you can turn it up.
+
+    :param items: Iterable of addresses, or of locations ("x, y" strings or shapely Points) if 'reverse' is True
+    :param reverse: False to geocode addresses, True to reverse geocode locations
+    :param epsg: EPSG code of the locations, only used if 'reverse' is True
+    :param requests_per_second: Most requests we'll make in any one second
+    :param max_workers: Number of requests that can be waiting on the geocoder at the same time
+    :param geocoder: Any geopy-style geocoder, i.e. an object with 'geocode' and 'reverse' methods which return
+    something with a 'raw' attribute. Defaults to Nominatim.
+    :param cache: Optional GeocodeCache. Answers found here don't count against 'requests_per_second'.
+    :return: list of responses, in the same order as 'items', as returned by 'geocode_address' or 'geocode_location'.
+    If an item couldn't be geocoded its response has an 'error' in its body, as usual.
+    """
+    limited_geocoder = _RateLimitedGeocoder(geocoder or geolocator, _RateLimiter(requests_per_second))
+
+    def geocode_one(item):
+        if reverse:
+            return geocode_location(item, epsg=epsg, geocoder=limited_geocoder, cache=cache)
+        return geocode_address(item, geocoder=limited_geocoder, cache=cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 'map' hands back the results in the order of the input, whatever order they finish in
+        return list(executor.map(geocode_one, items))
+
+
 if __name__ == "__main__":
     # Test some samples
     my_address = "Drumcondra, Dublin, Ireland"
@@ -113,3 +212,6 @@ if __name__ == "__main__":
     my_location = "200000.0, 250000"
     result = geocode_location(my_location, 29902)
     print(result)
+    results = geocode_batch(["Mullingar, Westmeath, Ireland", "Tralee, Kerry, Ireland", "Nowhere at all"])
+    for result in results:
+        print(result)
@@ -1,16 +1,19 @@
-from io import BytesIO
-from zipfile import ZipFile
-import requests
+import utilities.http_cache as http_cache
+from utilities.spooled_zip import save_zip
 import os
 from utilities.get_or_create_temporary_directory import get_temporary_directory as get_temp
 
 
-def get_file_from_server(url, return_directory, **kwargs):
+def get_file_from_server(url, return_directory, cache_dir=None, extract=True, **kwargs):
     """
     This accepts a  a URL and (ii) retrieves a zipped shapefile from the URL.
 
     :param return_directory:
     :param url: URL of zip file
+    :param cache_dir: If you supply a directory, the download is cached here and re-used until the file on the server
+    changes. See 'http_cache'.
+    :param extract: Zip files only. If False, the zip file is saved as it is and the directory handed back is a
+    '/vsizip/' path that fiona can read from directly. See 'spooled_zip'.
     :return: a list of files from th zip file
     """
 
@@ -21,34 +24,36 @@ def get_file_from_server(url, return_directory, **kwargs):
     }
 
     try:
-        response = requests.get(url)
-        if 200 <= response.status_code <= 299:
-            if not response.headers["Content-Type"]:
-                raise ValueError("Couldn't figure out what type this is, sorry.")
-            content_type = [item.strip().split("=") for item in
-                            response.headers["Content-Type"].split(";")]
-            if content_type[0][0] not in valid_formats.values():
-                raise ValueError(f"Looks like an invalid content type: {response.headers['Content-Type']}")
-            if content_type[0][0] == "application/zip":
-                my_zipfile = ZipFile(BytesIO(response.content))
-                my_zipfile.extractall(path=return_directory)
-                return return_directory, my_zipfile.namelist()
+        # We don't know what we're getting until the headers arrive, so the body is always streamed: nothing is read
+        # until it's needed. Zip files are then spooled to disk a chunk at a time by 'save_zip', and anything else
+        # (CSV, JSON) is read whole by response.text, just as it would have been without stream=True. 'with' hands the
+        # connection back to the pool even when the body isn't read, e.g. after a bad status code.
+        with http_cache.get(url, cache_dir=cache_dir, stream=True) as response:
+            if 200 <= response.status_code <= 299:
+                if not response.headers["Content-Type"]:
+                    raise ValueError("Couldn't figure out what type this is, sorry.")
+                content_type = [item.strip().split("=") for item in
+                                response.headers["Content-Type"].split(";")]
+                if content_type[0][0] not in valid_formats.values():
+                    raise ValueError(f"Looks like an invalid content type: {response.headers['Content-Type']}")
+                if content_type[0][0] == "application/zip":
+                    return save_zip(response, return_directory, extract=extract)
+                else:
+                    content_disposition = [item.strip().split("=") for item in
+                                           response.headers["Content-Disposition"].split(";")]
+                    for item in content_type + content_disposition:
+                        if len(item) == 2:
+                            locals()[item[0]] = item[1]
+                    if "filename" in kwargs:
+                        locals()["filename"] = kwargs["filename"]
+                    if not locals()["filename"]:
+                        raise ValueError("Got data but couldn't find a filename for it.")
+                    with open(os.path.join(return_directory, locals()["filename"]),
+                              mode="w", encoding=locals().get("charset", "utf-8")) as fh:
+                        fh.write(response.text)
+                        return return_directory, locals()["filename"]
             else:
-                content_disposition = [item.strip().split("=") for item in
-                                       response.headers["Content-Disposition"].split(";")]
-                for item in content_type + content_disposition:
-                    if len(item) == 2:
-                        locals()[item[0]] = item[1]
-                if "filename" in kwargs:
-                    locals()["filename"] = kwargs["filename"]
-                if not locals()["filename"]:
-                    raise ValueError("Got data but couldn't find a filename for it.")
-                with open(os.path.join(return_directory, locals()["filename"]),
-                          mode="w", encoding=locals().get("charset", "utf-8")) as fh:
-                    fh.write(response.text)
-                    return return_directory, locals()["filename"]
-        else:
-            raise ValueError(f"Bad status code: {response.status_code}")
+                raise ValueError(f"Bad status code: {response.status_code}")
     except Exception as e:
         print(f"{e}")
         quit(1)
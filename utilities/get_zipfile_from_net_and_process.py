@@ -1,29 +1,30 @@
-from io import BytesIO
-from zipfile import ZipFile
-import requests
+import utilities.http_cache as http_cache
+from utilities.spooled_zip import save_zip
 
 
-def get_zip_from_server(url, return_directory):
+def get_zip_from_server(url, return_directory, cache_dir=None):
     """
     This accepts a  a URL and (ii) retrieves a zipped shapefile from the URL.
 
     :param url: URL of zip file
+    :param cache_dir: If you supply a directory, the download is cached here and re-used until the file on the server
+    changes. See 'http_cache'.
     :return: a list of files from th zip file
     """
 
     try:
-        response = requests.get(url)
-        if 200 <= response.status_code <= 299:
-            if response.headers["Content-Type"] and response.headers["Content-Type"] == "application/zip":
-                my_zipfile = ZipFile(BytesIO(response.content))
-                my_zipfile.extractall(path=return_directory)
-                return my_zipfile.namelist()
+        # 'with' hands the connection back to the pool even when the body isn't read, e.g. after a bad status code
+        with http_cache.get(url, cache_dir=cache_dir, stream=True) as response:
+            if 200 <= response.status_code <= 299:
+                if response.headers["Content-Type"] and response.headers["Content-Type"] == "application/zip":
+                    return save_zip(response, return_directory)[1]
+                else:
+                    raise ValueError(
+                        f"Doesn't look like  can deal with the content\n"
+                        f"Content-Type is '{response.headers['Content-Type']}'"
+                    )
             else:
-                raise ValueError(
-                    f"Doesn't look like  can deal with the content\nContent-Type is '{response.headers['Content-Type']}'"
-                )
-        else:
-            raise ValueError(f"Bad status code: {response.status_code}")
+                raise ValueError(f"Bad status code: {response.status_code}")
     except Exception as e:
         print(f"{e}")
         quit(1)
@@ -0,0 +1,252 @@
+"""
+An on-disk cache for anything we download from Geoserver (or anywhere else).
+
+Every time you run a program that gets, say, the counties SHAPE-ZIP it downloads the whole thing again even though it
+hasn't changed. This keeps a copy of each response in a cache directory (use 'get_temporary_directory' to make one) so
+that
+* if the copy is younger than its TTL (time to live) we use it without going near the network
+* if it's older we ask the server if it has changed (a 'conditional GET' using ETag / Last-Modified). If the server
+  says '304 Not Modified' we use our copy, otherwise we download and store the new version
+* if the cache gets bigger than its size limit, the least recently used copies are deleted
+
+Responses are stored by a hash of the normalised URL, so the order or case of WFS parameters such as typeName,
+cql_filter, propertyName, srsName and outputFormat doesn't matter.
+
+To use just call 'cached_get' in place of 'requests.get'. You get back something that looks enough like a
+'requests.Response' for our utilities to use it.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import hashlib
+    import json
+    import os
+    import tempfile
+    import time
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+    from requests.structures import CaseInsensitiveDict
+    import utilities.http_session as http
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+CACHE_SETTINGS = {
+    # Seconds before we check with the server whether a cached response has changed
+    "ttl": 24 * 60 * 60,
+    # Total size of the cache in bytes before we start deleting the least recently used responses
+    "max_bytes": 1024 * 1024 * 1024,
+}
+
+# WFS parameter values that are case-insensitive, so we can lower-case them when making the cache key.
+CASE_INSENSITIVE_PARAMS = ("service", "version", "request", "srsname", "outputformat")
+
+# Response headers that we keep with the cached copy
+KEPT_HEADERS = ("Content-Type", "Content-Disposition", "ETag", "Last-Modified")
+
+
+class CachedResponse:
+    """
+    Stands in for a 'requests.Response' when the body comes from the cache. The body is read from disk only when you
+    ask for it.
+    """
+
+    def __init__(self, path, headers, status_code=200, url=None, from_cache=True):
+        self.path = path
+        self.headers = CaseInsensitiveDict(headers)
+        self.status_code = status_code
+        self.url = url
+        self.from_cache = from_cache
+
+    @property
+    def content(self):
+        with open(self.path, "rb") as fh:
+            return fh.read()
+
+    @property
+    def encoding(self):
+        for item in self.headers.get("Content-Type", "").split(";"):
+            item = item.strip().split("=")
+            if len(item) == 2 and item[0].lower() == "charset":
+                return item[1]
+        return "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=65536):
+        with open(self.path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                yield chunk
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def normalise_url(url):
+    """
+    Put a URL into a standard form so that equivalent URLs give the same cache key. Parameter names are lower-cased and
+    sorted and case-insensitive values (such as srsName and outputFormat) are lower-cased.
+
+    :param url: any URL
+    :return: normalised URL as str
+    """
+    parts = urlsplit(url)
+    params = []
+    for k, v in parse_qsl(parts.query, keep_blank_values=True):
+        k = k.lower()
+        if k in CASE_INSENSITIVE_PARAMS:
+            v = v.lower()
+        params.append((k, v.strip()))
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(sorted(params)), ""))
+
+
+def cache_key(url):
+    return hashlib.sha256(normalise_url(url).encode("utf-8")).hexdigest()
+
+
+def _paths(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.json"), os.path.join(cache_dir, f"{key}.body")
+
+
+def _read_meta(meta_path, body_path):
+    if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+        return None
+    try:
+        with open(meta_path, "r") as fh:
+            return json.load(fh)
+    except ValueError:
+        return None
+
+
+def _write_meta(meta_path, meta):
+    # Write to a temporary file and then move it into place so that nobody ever sees a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix=".tmp")
+    with os.fdopen(fd, "w") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_path, meta_path)
+
+
+def _evict(cache_dir, max_bytes, keep=None):
+    """
+    Delete the least recently used responses until the cache is no bigger than 'max_bytes'. The response in 'keep' (a
+    meta file path) is never deleted as we're about to hand it back.
+    """
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        meta_path, body_path = _paths(cache_dir, name[:-5])
+        meta = _read_meta(meta_path, body_path)
+        if not meta:
+            continue
+        entries.append((meta["accessed"], meta["size"], meta_path, body_path))
+        total += meta["size"]
+
+    for accessed, size, meta_path, body_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if meta_path == keep:
+            continue
+        for path in (meta_path, body_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+
+def cached_get(url, cache_dir, ttl=None, max_bytes=None, chunk_size=65536):
+    """
+    Get a URL through the cache.
+
+    :param url: Address of resource to be read
+    :param cache_dir: Directory where the cache lives. It must exist.
+    :param ttl: Seconds before a cached response is re-validated with the server. Defaults to CACHE_SETTINGS.
+    :param max_bytes: Maximum size of the cache. Defaults to CACHE_SETTINGS.
+    :param chunk_size: Number of bytes read from the network at a time.
+    :return: CachedResponse if we have (or now have) a good copy, otherwise the server's response as it stands.
+    """
+    ttl = CACHE_SETTINGS["ttl"] if ttl is None else ttl
+    max_bytes = CACHE_SETTINGS["max_bytes"] if max_bytes is None else max_bytes
+
+    if not os.path.isdir(cache_dir):
+        raise ValueError(f"Cache directory '{cache_dir}' doesn't exist.")
+
+    meta_path, body_path = _paths(cache_dir, cache_key(url))
+    meta = _read_meta(meta_path, body_path)
+    now = time.time()
+
+    if meta and now - meta["stored"] < ttl:
+        # Fresh enough, don't even ask the server
+        meta["accessed"] = now
+        _write_meta(meta_path, meta)
+        return CachedResponse(body_path, meta["headers"], url=url)
+
+    request_headers = {}
+    if meta:
+        if meta["headers"].get("ETag"):
+            request_headers["If-None-Match"] = meta["headers"]["ETag"]
+        if meta["headers"].get("Last-Modified"):
+            request_headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+
+    response = http.get(url, headers=request_headers, stream=True)
+
+    if response.status_code == 304 and meta:
+        # Not modified, our copy is good for another TTL
+        response.close()
+        meta["stored"] = meta["accessed"] = now
+        _write_meta(meta_path, meta)
+        return CachedResponse(body_path, meta["headers"], url=url)
+
+    if not 200 <= response.status_code <= 299:
+        return response
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    size = 0
+    with response, os.fdopen(fd, "wb") as fh:
+        for chunk in http.iter_content(response, chunk_size=chunk_size):
+            fh.write(chunk)
+            size += len(chunk)
+    os.replace(tmp_path, body_path)
+
+    # requests has already decompressed the body, so we don't keep Content-Encoding
+    headers = {k: response.headers[k] for k in KEPT_HEADERS if k in response.headers}
+    meta = {
+        "url": normalise_url(url),
+        "headers": headers,
+        "size": size,
+        "stored": now,
+        "accessed": now,
+    }
+    _write_meta(meta_path, meta)
+    _evict(cache_dir, max_bytes, keep=meta_path)
+
+    return CachedResponse(body_path, headers, url=url, from_cache=False)
+
+
+def get(url, cache_dir=None, **kwargs):
+    """
+    Use the cache if we have been given a cache directory, otherwise just use the shared session.
+
+    :param url: Address of resource to be read
+    :param cache_dir: Directory where the cache lives or None for no caching
+    :param kwargs: passed on to 'cached_get' or 'http_session.get'
+    :return: CachedResponse or requests.Response
+    """
+    if cache_dir:
+        # The cache always streams the body to disk so 'stream' means nothing to it
+        kwargs.pop("stream", None)
+        return cached_get(url, cache_dir, **kwargs)
+    return http.get(url, **kwargs)
@@ -0,0 +1,204 @@
+"""
+A shared HTTP session for all of the programs that get data from the Net.
+
+Calling 'requests.get' on its own opens a new connection (TCP and TLS handshake) every time. When you download dozens
+of layers from the same Geoserver most of the time goes on those handshakes. A 'requests.Session' keeps connections
+open and re-uses them, so we make one session here and everything else uses it. The session also
+* retries failed requests, backing off a little more each time
+* asks the server to compress (gzip/deflate) the response
+* applies a timeout so that a dead server doesn't hang your program
+* counts requests, bytes transferred and how often a connection was re-used
+
+To use just import this and call 'get' in place of 'requests.get'. Use 'configure_session' before your first request
+if you want to change any of the SESSION_SETTINGS.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import threading
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.util.retry import Retry
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Sensible defaults. Timeout is (connect, read) in seconds.
+SESSION_SETTINGS = {
+    "pool_connections": 10,
+    "pool_maxsize": 20,
+    "retries": 3,
+    "backoff_factor": 0.5,
+    "status_forcelist": (429, 500, 502, 503, 504),
+    "timeout": (10, 300),
+    "accept_encoding": "gzip, deflate",
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats = {"requests": 0, "bytes": 0, "connections": 0}
+_stats_lock = threading.Lock()
+
+
+# urllib3 calls 'connect' every time it has to open a new socket (and do the TLS handshake for https), so counting
+# these calls tells us how often a request couldn't re-use an open connection.
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _count(connections_opened=1)
+        super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count(connections_opened=1)
+        super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+def configure_session(**settings):
+    """
+    Change any of the SESSION_SETTINGS. The current session is closed and a new one is made with the new settings the
+    next time it's needed.
+
+    :param settings: any of the keys in SESSION_SETTINGS
+    :return: None
+    """
+    global _session
+
+    for k in settings:
+        if k not in SESSION_SETTINGS:
+            raise ValueError(f"Unknown session setting '{k}'.")
+
+    with _session_lock:
+        SESSION_SETTINGS.update(settings)
+        if _session:
+            _session.close()
+        _session = None
+
+
+def get_session():
+    """
+    Get the shared session, making it first if necessary.
+
+    :return: requests.Session object
+    """
+    global _session
+
+    with _session_lock:
+        if not _session:
+            retries = Retry(
+                total=SESSION_SETTINGS["retries"],
+                backoff_factor=SESSION_SETTINGS["backoff_factor"],
+                status_forcelist=SESSION_SETTINGS["status_forcelist"],
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                # Hand back the last bad response rather than raising, so callers can report the status code
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=SESSION_SETTINGS["pool_connections"],
+                pool_maxsize=SESSION_SETTINGS["pool_maxsize"],
+                max_retries=retries,
+            )
+            adapter.poolmanager.pool_classes_by_scheme = {
+                "http": _CountingHTTPConnectionPool,
+                "https": _CountingHTTPSConnectionPool,
+            }
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Accept-Encoding"] = SESSION_SETTINGS["accept_encoding"]
+            _session = session
+
+        return _session
+
+
+def _count(requests_made=0, bytes_transferred=0, connections_opened=0):
+    with _stats_lock:
+        _stats["requests"] += requests_made
+        _stats["bytes"] += bytes_transferred
+        _stats["connections"] += connections_opened
+
+
+def _bytes_on_the_wire(response, fallback=0):
+    # urllib3 knows how many (possibly compressed) bytes it actually read from the socket
+    try:
+        return response.raw.tell()
+    except Exception:
+        return fallback
+
+
+def get(url, **kwargs):
+    """
+    Drop-in replacement for 'requests.get' which uses the shared session. If 'stream' is True, read the content with
+    'iter_content' from this module so that the bytes are counted.
+
+    :param url: Address of resource to be read
+    :param kwargs: Anything you'd pass to 'requests.get'
+    :return: requests.Response object
+    """
+    kwargs.setdefault("timeout", SESSION_SETTINGS["timeout"])
+    response = get_session().get(url, **kwargs)
+    if kwargs.get("stream"):
+        _count(requests_made=1)
+    else:
+        _count(requests_made=1, bytes_transferred=_bytes_on_the_wire(response, len(response.content)))
+
+    return response
+
+
+def iter_content(response, chunk_size=65536):
+    """
+    Read a streamed response chunk by chunk, counting the bytes as we go.
+
+    :param response: requests.Response object from 'get' with stream=True
+    :param chunk_size: number of bytes to read at a time
+    :return: generator of bytes
+    """
+    received = 0
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            received += len(chunk)
+            yield chunk
+    finally:
+        _count(bytes_transferred=_bytes_on_the_wire(response, received))
+
+
+def get_stats():
+    """
+    Report how much work the session has done.
+
+    :return: dict with number of requests, bytes transferred, connections opened and the connection re-use ratio
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["reuse_ratio"] = 1 - (stats["connections"] / stats["requests"]) if stats["requests"] else 0.0
+
+    return stats
+
+
+def reset_stats():
+    """
+    Set the counters back to zero.
+
+    :return: None
+    """
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+if __name__ == "__main__":
+    # Get the same small file a few times and show that we only opened one connection
+    for i in range(5):
+        get("https://markfoley.info/pa1/gettysburg.txt")
+    print(get_stats())
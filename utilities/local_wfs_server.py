@@ -0,0 +1,647 @@
+"""
+A small stand-in for Geoserver's WFS, serving local files, so that the download utilities can be tested and timed
+without the Net.
+
+It answers the requests our utilities (and OWSlib) make
+* GetCapabilities (WFS 1.1.0)
+* DescribeFeatureType
+* GetFeature, as GeoJSON (application/json), CSV (csv or text/csv) or a zipped shapefile (SHAPE-ZIP), with
+  - startIndex and maxFeatures (or count) for paging
+  - sortBy, propertyName and srsName
+  - cql_filter, for the simple filters we use: comparisons (=, <>, <, >, <=, >=), LIKE, IN, BBOX, AND, OR, NOT and
+    brackets
+Anything under /files/ is served from a directory of plain files, for 'get_file_from_net'.
+
+Like Geoserver, responses carry an ETag and Last-Modified so conditional GETs (see 'http_cache') get a '304 Not
+Modified'. Connections are kept alive (HTTP/1.1) so connection re-use in 'http_session' can be measured.
+
+To make it behave more like a real server on the other side of the world, you can add a delay before every response
+(latency, in seconds) and limit how fast the body is sent (bandwidth, in bytes per second). Like Geoserver's "Maximum
+number of features" setting, max_features caps how many features a GetFeature sends, whatever the client asks for.
+
+Every layer is read into memory when the server starts. The URL path is ignored, so any host such as
+http://127.0.0.1:8080/geoserver works in place of https://markfoley.info/geoserver. Run it stand-alone with, e.g.
+
+    python -m utilities.local_wfs_server --layer census2011:counties=.temp_data/counties.shp --port 8080 --latency 0.05
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import argparse
+    import csv
+    import email.utils
+    import hashlib
+    import io
+    import json
+    import mimetypes
+    import os
+    import re
+    import tempfile
+    import threading
+    import time
+    import zipfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qsl
+    from xml.sax.saxutils import escape
+    import fiona
+    import numpy as np
+    import shapely
+    from shapely.geometry import shape, box, mapping
+    from utilities.reproject_point import reproject_geometries
+    from utilities.transformer_registry import get_transformer
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Name given to the geometry column, as Geoserver does for layers that don't have one of their own (e.g. shapefiles)
+GEOMETRY_COLUMN = "geom"
+
+# How the server describes fiona's property types in DescribeFeatureType
+XSD_TYPES = {
+    "str": "string", "int": "int", "float": "double", "date": "date", "datetime": "dateTime", "bool": "boolean"
+}
+
+# Geoserver describes shapefile geometries as Multi... because a shapefile can hold both kinds
+MULTI_TYPES = {"Polygon": "MultiPolygon", "LineString": "MultiLineString"}
+
+# Chunks sent per second when limiting bandwidth. More chunks make the rate smoother.
+THROTTLE_CHUNKS_PER_SECOND = 20
+
+
+class WFSError(Exception):
+    """
+    Something wrong with a request. Sent back to the client as a ServiceExceptionReport.
+    """
+    pass
+
+
+class Layer:
+    """
+    One dataset (feature type), held in memory.
+    """
+
+    def __init__(self, type_name, path, layer=None, geometry_column=GEOMETRY_COLUMN):
+        """
+        :param type_name: workspace:dataset, e.g. census2011:counties
+        :param path: any file fiona can read
+        :param layer: layer to read, for formats such as GeoPackage which can have more than one
+        :param geometry_column: what to call the geometry column
+        """
+        self.type_name = type_name
+        self.workspace, self.dataset = type_name.split(":", 1)
+        self.path = path
+        self.geometry_column = geometry_column
+
+        ids, properties, geometries = [], [], []
+        with fiona.open(path, "r", layer=layer) as source:
+            self.schema = {"geometry": source.schema["geometry"], "properties": dict(source.schema["properties"])}
+            self.epsg = source.crs.to_epsg() or 4326
+            for feature in source:
+                ids.append(f"{self.dataset}.{feature['id']}")
+                properties.append(dict(feature["properties"]))
+                geometries.append(shape(feature["geometry"]) if feature["geometry"] else None)
+
+        self.ids = ids
+        self.properties = properties
+        self.geometries = np.array(geometries, dtype=object)
+        self.bounds = tuple(shapely.total_bounds(self.geometries).tolist())
+        self.wgs84_bounds = get_transformer(self.epsg, 4326).transform_bounds(*self.bounds) if self.epsg != 4326 \
+            else self.bounds
+
+        modified = os.path.getmtime(path)
+        self.last_modified = email.utils.formatdate(modified, usegmt=True)
+        self.signature = f"{path}|{modified}|{os.path.getsize(path)}"
+
+    @property
+    def geometry_type(self):
+        return MULTI_TYPES.get(self.schema["geometry"], self.schema["geometry"])
+
+    def values(self, name):
+        if name not in self.schema["properties"]:
+            raise WFSError(f"Unknown property '{name}' in {self.type_name}.")
+        return [properties[name] for properties in self.properties]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# A (very) small CQL parser. It turns a filter into a NumPy array of True/False, one per feature.
+
+_CQL_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')
+  | (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+  | (?P<op><=|>=|<>|!=|=|<|>)
+  | (?P<punct>[(),])
+  | (?P<word>[A-Za-z_][\w.:]*)
+)""", re.VERBOSE)
+
+
+def _tokenise(expression):
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _CQL_TOKEN.match(expression, position)
+        if not match:
+            raise WFSError(f"Can't parse the filter at '{expression[position:]}'.")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = value[1:-1].replace("''", "'")
+        elif kind == "number":
+            value = float(value) if any(c in value for c in ".eE") else int(value)
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _CQLParser:
+    def __init__(self, layer, expression):
+        self.layer = layer
+        self.tokens = _tokenise(expression)
+        self.position = 0
+
+    def parse(self):
+        mask = self._or()
+        if self.position != len(self.tokens):
+            raise WFSError(f"Unexpected '{self.tokens[self.position][1]}' in the filter.")
+        return mask
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, kind=None, value=None):
+        token = self._peek()
+        if token[0] is None or (kind and token[0] != kind) or \
+                (value and str(token[1]).upper() != value):
+            raise WFSError(f"Expected {value or kind} in the filter.")
+        self.position += 1
+        return token[1]
+
+    def _is_word(self, word):
+        kind, value = self._peek()
+        return kind == "word" and value.upper() == word
+
+    def _or(self):
+        mask = self._and()
+        while self._is_word("OR"):
+            self._take()
+            mask = mask | self._and()
+        return mask
+
+    def _and(self):
+        mask = self._not()
+        while self._is_word("AND"):
+            self._take()
+            mask = mask & self._not()
+        return mask
+
+    def _not(self):
+        if self._is_word("NOT"):
+            self._take()
+            return ~self._not()
+        if self._peek() == ("punct", "("):
+            self._take()
+            mask = self._or()
+            self._take("punct", ")")
+            return mask
+        return self._predicate()
+
+    def _literal(self):
+        kind, value = self._peek()
+        if kind not in ("string", "number"):
+            raise WFSError("Expected a value in the filter.")
+        self.position += 1
+        return value
+
+    def _predicate(self):
+        if self._is_word("BBOX"):
+            return self._bbox()
+
+        name = self._take("word")
+        values = self.layer.values(name)
+
+        if self._is_word("LIKE"):
+            self._take()
+            pattern = self._take("string")
+            regex = re.compile("^" + re.escape(pattern).replace("%", ".*").replace("_", ".") + "$", re.DOTALL)
+            return np.array([value is not None and bool(regex.match(str(value))) for value in values], dtype=bool)
+
+        if self._is_word("IN"):
+            self._take()
+            self._take("punct", "(")
+            wanted = [self._literal()]
+            while self._peek() == ("punct", ","):
+                self._take()
+                wanted.append(self._literal())
+            self._take("punct", ")")
+            return np.array([value in wanted for value in values], dtype=bool)
+
+        op = self._take("op")
+        literal = self._literal()
+        compare = {
+            "=": lambda a, b: a == b, "<>": lambda a, b: a != b, "!=": lambda a, b: a != b,
+            "<": lambda a, b: a < b, ">": lambda a, b: a > b, "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b,
+        }[op]
+        try:
+            return np.array([value is not None and compare(value, literal) for value in values], dtype=bool)
+        except TypeError:
+            raise WFSError(f"Can't compare '{name}' with {literal!r}.")
+
+    def _bbox(self):
+        self._take()
+        self._take("punct", "(")
+        self._take("word")
+        corners = []
+        for _ in range(4):
+            self._take("punct", ",")
+            corners.append(float(self._literal()))
+        epsg = self.layer.epsg
+        if self._peek() == ("punct", ","):
+            self._take()
+            epsg = int(str(self._take("string")).split(":")[-1])
+        self._take("punct", ")")
+
+        if epsg != self.layer.epsg:
+            corners = get_transformer(epsg, self.layer.epsg).transform_bounds(*corners)
+        return shapely.intersects(self.layer.geometries, box(*corners))
+
+
+def cql_mask(layer, expression):
+    """
+    :param layer: Layer
+    :param expression: CQL filter, e.g. "nuts3name = 'Dublin' AND total2011 > 100000"
+    :return: NumPy array of True/False, one per feature
+    """
+    return _CQLParser(layer, expression).parse()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Responses
+
+def capabilities_xml(layers, url):
+    feature_types = "".join(f"""
+    <FeatureType>
+      <Name>{escape(layer.type_name)}</Name>
+      <Title>{escape(layer.dataset)}</Title>
+      <DefaultSRS>urn:ogc:def:crs:EPSG::{layer.epsg}</DefaultSRS>
+      <ows:WGS84BoundingBox>
+        <ows:LowerCorner>{layer.wgs84_bounds[0]} {layer.wgs84_bounds[1]}</ows:LowerCorner>
+        <ows:UpperCorner>{layer.wgs84_bounds[2]} {layer.wgs84_bounds[3]}</ows:UpperCorner>
+      </ows:WGS84BoundingBox>
+    </FeatureType>""" for layer in layers.values())
+    operations = "".join(f"""
+    <ows:Operation name="{name}">
+      <ows:DCP><ows:HTTP><ows:Get xlink:href="{escape(url)}"/></ows:HTTP></ows:DCP>
+    </ows:Operation>""" for name in ("GetCapabilities", "DescribeFeatureType", "GetFeature"))
+
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<wfs:WFS_Capabilities version="1.1.0" xmlns:wfs="http://www.opengis.net/wfs" xmlns:ows="http://www.opengis.net/ows"
+    xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink">
+  <ows:ServiceIdentification>
+    <ows:Title>Local WFS</ows:Title>
+    <ows:ServiceType>WFS</ows:ServiceType>
+    <ows:ServiceTypeVersion>1.1.0</ows:ServiceTypeVersion>
+  </ows:ServiceIdentification>
+  <ows:OperationsMetadata>{operations}
+  </ows:OperationsMetadata>
+  <FeatureTypeList xmlns="http://www.opengis.net/wfs">{feature_types}
+  </FeatureTypeList>
+</wfs:WFS_Capabilities>
+""".encode("utf-8")
+
+
+def describe_feature_type_xsd(layer):
+    elements = [f'<xsd:element maxOccurs="1" minOccurs="0" name="{layer.geometry_column}" nillable="true" '
+                f'type="gml:{layer.geometry_type}PropertyType"/>']
+    for name, fiona_type in layer.schema["properties"].items():
+        xsd_type = XSD_TYPES.get(fiona_type.split(":")[0], "string")
+        elements.append(f'<xsd:element maxOccurs="1" minOccurs="0" name="{escape(name)}" nillable="true" '
+                        f'type="xsd:{xsd_type}"/>')
+    sequence = "\n          ".join(elements)
+
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:gml="http://www.opengis.net/gml"
+    xmlns:{layer.workspace}="http://{layer.workspace}" elementFormDefault="qualified"
+    targetNamespace="http://{layer.workspace}">
+  <xsd:import namespace="http://www.opengis.net/gml"/>
+  <xsd:complexType name="{layer.dataset}Type">
+    <xsd:complexContent>
+      <xsd:extension base="gml:AbstractFeatureType">
+        <xsd:sequence>
+          {sequence}
+        </xsd:sequence>
+      </xsd:extension>
+    </xsd:complexContent>
+  </xsd:complexType>
+  <xsd:element name="{layer.dataset}" substitutionGroup="gml:_Feature" type="{layer.workspace}:{layer.dataset}Type"/>
+</xsd:schema>
+""".encode("utf-8")
+
+
+def exception_xml(message):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<ServiceExceptionReport version="1.2.0" xmlns="http://www.opengis.net/ogc">
+  <ServiceException>{escape(str(message))}</ServiceException>
+</ServiceExceptionReport>
+""".encode("utf-8")
+
+
+def select_features(layer, params):
+    """
+    Apply the GetFeature parameters to a layer.
+
+    :param layer: Layer
+    :param params: request parameters, with lower case names
+    :return: tuple of (positions of the selected features, property names, geometries, number matched)
+    """
+    positions = np.arange(len(layer.ids))
+    if params.get("cql_filter"):
+        positions = positions[cql_mask(layer, params["cql_filter"])]
+    matched = len(positions)
+
+    if params.get("sortby"):
+        name, _, direction = params["sortby"].partition(" ")
+        values = layer.values(name)
+        positions = np.array(sorted(positions, key=lambda n: (values[n] is None, values[n]),
+                                    reverse=direction.strip().upper() in ("D", "DESC")), dtype=int)
+
+    start = int(params.get("startindex", 0) or 0)
+    count = params.get("maxfeatures") or params.get("count")
+    positions = positions[start:start + int(count)] if count else positions[start:]
+
+    names = list(layer.schema["properties"])
+    include_geometry = True
+    if params.get("propertyname"):
+        wanted = params["propertyname"].split(",")
+        names = [name for name in names if name in wanted]
+        include_geometry = layer.geometry_column in wanted
+
+    geometries = layer.geometries[positions] if include_geometry else None
+    if include_geometry and params.get("srsname"):
+        epsg = int(params["srsname"].split(":")[-1])
+        if epsg != layer.epsg:
+            geometries = reproject_geometries(geometries, layer.epsg, epsg)
+
+    return positions, names, geometries, matched
+
+
+def encode_json(layer, params):
+    positions, names, geometries, matched = select_features(layer, params)
+    epsg = params.get("srsname", str(layer.epsg)).split(":")[-1]
+    features = []
+    for n, position in enumerate(positions.tolist()):
+        features.append({
+            "type": "Feature",
+            "id": layer.ids[position],
+            "geometry": mapping(geometries[n]) if geometries is not None and geometries[n] is not None else None,
+            "geometry_name": layer.geometry_column,
+            "properties": {name: layer.properties[position][name] for name in names},
+        })
+    collection = {
+        "type": "FeatureCollection",
+        "features": features,
+        "totalFeatures": matched,
+        "numberMatched": matched,
+        "numberReturned": len(features),
+        "crs": {"type": "name", "properties": {"name": f"urn:ogc:def:crs:EPSG::{epsg}"}},
+    }
+    return json.dumps(collection).encode("utf-8"), "application/json;charset=UTF-8", {}
+
+
+def encode_csv(layer, params):
+    positions, names, geometries, _ = select_features(layer, params)
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator="\r\n")
+    writer.writerow(["FID"] + names + ([layer.geometry_column] if geometries is not None else []))
+    for n, position in enumerate(positions.tolist()):
+        row = [layer.ids[position]] + [layer.properties[position][name] for name in names]
+        if geometries is not None:
+            row.append(geometries[n].wkt if geometries[n] is not None else "")
+        writer.writerow(row)
+    headers = {"Content-Disposition": f"attachment; filename={layer.dataset}.csv"}
+    return text.getvalue().encode("utf-8"), "text/csv;charset=UTF-8", headers
+
+
+def encode_shape_zip(layer, params):
+    positions, names, geometries, _ = select_features(layer, params)
+    epsg = int(params.get("srsname", str(layer.epsg)).split(":")[-1])
+    schema = {"geometry": layer.schema["geometry"],
+              "properties": {name: layer.schema["properties"][name] for name in names}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        with fiona.open(os.path.join(directory, f"{layer.dataset}.shp"), "w", driver="ESRI Shapefile",
+                        schema=schema, crs=f"EPSG:{epsg}") as sink:
+            sink.writerecords({
+                "geometry": mapping(geometries[n]) if geometries is not None and geometries[n] is not None else None,
+                "properties": {name: layer.properties[position][name] for name in names},
+            } for n, position in enumerate(positions.tolist()))
+
+        body = io.BytesIO()
+        with zipfile.ZipFile(body, "w", zipfile.ZIP_DEFLATED) as zf:
+            for file_name in sorted(os.listdir(directory)):
+                zf.write(os.path.join(directory, file_name), file_name)
+
+    headers = {"Content-Disposition": f"attachment; filename={layer.dataset}.zip"}
+    return body.getvalue(), "application/zip", headers
+
+
+OUTPUT_FORMATS = {
+    "application/json": encode_json,
+    "json": encode_json,
+    "text/csv": encode_csv,
+    "csv": encode_csv,
+    "shape-zip": encode_shape_zip,
+    "application/zip": encode_shape_zip,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, as Geoserver does
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.settings["verbose"]:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        try:
+            if self.server.settings["latency"]:
+                time.sleep(self.server.settings["latency"])
+
+            split = urlsplit(self.path)
+            if "/files/" in split.path and self.server.settings["files_dir"]:
+                return self._send_file(split.path.split("/files/", 1)[1])
+
+            params = {k.lower(): v for k, v in parse_qsl(split.query)}
+            request = params.get("request", "").lower()
+            if request == "getcapabilities":
+                url = f"http://{self.headers.get('Host', '')}{split.path}"
+                return self._send(200, capabilities_xml(self.server.layers, url), "text/xml")
+            if request == "describefeaturetype":
+                layer = self._layer(params)
+                return self._send(200, describe_feature_type_xsd(layer), "text/xml", layer=layer)
+            if request == "getfeature":
+                return self._get_feature(params, split.query)
+            raise WFSError(f"Unknown request '{params.get('request', '')}'.")
+        except WFSError as e:
+            self._send(400, exception_xml(e), "text/xml")
+        except Exception as e:
+            self._send(500, exception_xml(e), "text/xml")
+
+    def _layer(self, params):
+        type_name = params.get("typename") or params.get("typenames")
+        layers = self.server.layers
+        if type_name in layers:
+            return layers[type_name]
+        # Geoserver also finds a layer by its name on its own
+        for layer in layers.values():
+            if layer.dataset == type_name:
+                return layer
+        raise WFSError(f"Unknown feature type '{type_name}'.")
+
+    def _get_feature(self, params, query):
+        layer = self._layer(params)
+        output_format = params.get("outputformat", "application/json").lower()
+        if output_format not in OUTPUT_FORMATS:
+            raise WFSError(f"Unknown output format '{params.get('outputformat')}'.")
+
+        # The same request against the same version of a layer always gives the same answer
+        etag = '"' + hashlib.sha1(f"{layer.signature}|{query}".encode("utf-8")).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag or (
+                not self.headers.get("If-None-Match") and self.headers.get("If-Modified-Since") == layer.last_modified):
+            return self._send(304, b"", None, etag=etag, layer=layer)
+
+        max_features = self.server.settings["max_features"]
+        if max_features:
+            asked_for = params.get("maxfeatures") or params.get("count")
+            params["maxfeatures"] = str(min(int(asked_for), max_features) if asked_for else max_features)
+
+        body, content_type, headers = OUTPUT_FORMATS[output_format](layer, params)
+        self._send(200, body, content_type, headers, etag=etag, layer=layer)
+
+    def _send_file(self, name):
+        directory = os.path.abspath(self.server.settings["files_dir"])
+        path = os.path.abspath(os.path.join(directory, name))
+        if not path.startswith(directory + os.sep) or not os.path.isfile(path):
+            return self._send(404, b"Not found", "text/plain")
+        with open(path, "rb") as fh:
+            body = fh.read()
+        last_modified = email.utils.formatdate(os.path.getmtime(path), usegmt=True)
+        if self.headers.get("If-Modified-Since") == last_modified:
+            return self._send(304, b"", None, headers={"Last-Modified": last_modified})
+        self._send(200, body, mimetypes.guess_type(path)[0] or "application/octet-stream",
+                   {"Last-Modified": last_modified})
+
+    def _send(self, status, body, content_type, headers=None, etag=None, layer=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        if layer:
+            self.send_header("Last-Modified", layer.last_modified)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._write(body)
+        self.server.count(len(body))
+
+    def _write(self, body):
+        bandwidth = self.server.settings["bandwidth"]
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        # Send a chunk, then wait as long as it would have taken at this bandwidth
+        chunk_size = max(1, int(bandwidth / THROTTLE_CHUNKS_PER_SECOND))
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(len(chunk) / bandwidth)
+
+
+class LocalWFSServer(ThreadingHTTPServer):
+    """
+    The server. Each request is handled in its own thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, layers, address="127.0.0.1", port=0, latency=0.0, bandwidth=None, files_dir=None,
+                 verbose=False, max_features=None):
+        """
+        :param layers: dict of "workspace:dataset": path, or "workspace:dataset": (path, layer name)
+        :param address: address to listen on
+        :param port: port to listen on. 0 picks a free one.
+        :param latency: seconds to wait before answering each request
+        :param bandwidth: most bytes per second to send, or None for as fast as possible
+        :param files_dir: directory of plain files served under /files/
+        :param verbose: print a line for every request
+        :param max_features: most features sent in answer to a GetFeature, or None for no limit
+        """
+        self.layers = {}
+        for type_name, source in layers.items():
+            path, layer = source if isinstance(source, (tuple, list)) else (source, None)
+            self.layers[type_name] = Layer(type_name, path, layer)
+        self.settings = {"latency": latency, "bandwidth": bandwidth, "files_dir": files_dir, "verbose": verbose,
+                         "max_features": max_features}
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+        super().__init__((address, port), _Handler)
+
+    @property
+    def url(self):
+        """
+        Use this in place of https://markfoley.info/geoserver
+        """
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/geoserver"
+
+    def count(self, size):
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {"requests": 0, "bytes": 0}
+
+
+def start_server(layers, **settings):
+    """
+    Start a LocalWFSServer in a background thread. Call 'shutdown()' on it when you've finished.
+
+    :param layers: as for LocalWFSServer
+    :param settings: anything else LocalWFSServer takes
+    :return: LocalWFSServer
+    """
+    server = LocalWFSServer(layers, **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve local files as a (very) small WFS.")
+    parser.add_argument("--layer", action="append", required=True, metavar="WORKSPACE:DATASET=PATH",
+                        help="layer to serve, e.g. census2011:counties=.temp_data/counties.shp. Repeat for more.")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    parser.add_argument("--bandwidth", type=float, help="most bytes per second to send")
+    parser.add_argument("--files", help="directory of plain files to serve under /files/")
+    parser.add_argument("--verbose", action="store_true", help="print a line for every request")
+    parser.add_argument("--max-features", type=int, help="most features sent in answer to a GetFeature")
+    args = parser.parse_args()
+
+    try:
+        layers = dict(item.split("=", 1) for item in args.layer)
+        server = LocalWFSServer(layers, args.address, args.port, args.latency, args.bandwidth, args.files,
+                                args.verbose, args.max_features)
+        print(f"Serving {', '.join(server.layers)} at {server.url}. Press Ctrl-C to stop.")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"{e}")
+        quit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Keep several simplified copies of a layer's geometries, from full detail down to very coarse, so that a map can be
+drawn from the copy that has just enough detail for the scale it's drawn at (a level-of-detail pyramid).
+
+Level 0 is the geometries as they are. Level 1 is simplified (Douglas-Peucker, shapely.simplify) with a tolerance of
+BASE_PIXELS-th of the width of the layer, and each level after that with twice the tolerance of the one before.
+To draw at a scale where a pixel is p world units across, use the coarsest level whose tolerance is no more than p:
+it looks the same as full detail, but has far fewer vertices. Zoomed out, a whole country is drawn from a few
+thousand vertices however detailed the source is.
+
+The pyramid is saved to a binary file next to the source, e.g. Data/data-ky-wkt2.lod.npz for Data/data-ky-wkt2.csv,
+holding each level as WKB (well-known binary) all run together, with the offset of each geometry. It's rebuilt if
+the source file has changed since, if it was built with different settings, or if it doesn't have the same number of
+features as the layer. Files with more than one layer get a file per layer (see 'cache_path_for'). Levels are only
+turned back into shapely geometries when they're first used.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import os
+    import numpy as np
+    import shapely
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Level 1 tolerance is the layer's width divided by this, i.e. about a pixel for a map this many pixels wide
+BASE_PIXELS = 4096
+
+# Number of simplified levels, on top of level 0
+LEVELS = 8
+
+# Each level's tolerance is this times the one before
+FACTOR = 2.0
+
+CACHE_SUFFIX = ".lod.npz"
+
+
+def _pack(geometries):
+    # All of the WKB run together, and where each geometry starts and ends
+    wkb = shapely.to_wkb(geometries)
+    lengths = np.array([len(b) if b is not None else 0 for b in wkb], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    buffer = np.frombuffer(b"".join(b for b in wkb if b is not None), dtype=np.uint8)
+    return buffer, offsets
+
+
+def _unpack(buffer, offsets):
+    data = buffer.tobytes()
+    wkb = [data[start:end] if end > start else None for start, end in zip(offsets[:-1], offsets[1:])]
+    return shapely.from_wkb(np.array(wkb, dtype=object))
+
+
+class GeometryPyramid:
+    """
+    The same geometries at several levels of detail.
+    """
+
+    def __init__(self, tolerances, levels):
+        """
+        :param tolerances: simplification tolerance of each level, in world units, starting with 0 for level 0
+        :param levels: for each level, an array of shapely geometries, or (WKB buffer, offsets) as saved
+        """
+        self.tolerances = [float(t) for t in tolerances]
+        self._levels = list(levels)
+
+    @classmethod
+    def build(cls, geometries, base_tolerance=None, levels=LEVELS, factor=FACTOR):
+        """
+        :param geometries: array of shapely geometries
+        :param base_tolerance: tolerance of level 1. Defaults to the layer's width (or height) / BASE_PIXELS.
+        :param levels: number of simplified levels
+        :param factor: each level's tolerance is this times the one before
+        :return: GeometryPyramid
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        if base_tolerance is None:
+            bbox = shapely.total_bounds(geometries) if len(geometries) else [0, 0, 0, 0]
+            base_tolerance = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) / BASE_PIXELS or 1.0
+
+        tolerances, built = [0.0], [geometries]
+        for level in range(levels):
+            tolerances.append(base_tolerance * factor ** level)
+            # Simplified from the full detail geometries, so no further from them than the tolerance. Not preserving
+            # topology is many times quicker, but anything smaller than the tolerance collapses to nothing, so those
+            # keep the level before's geometry.
+            simplified = shapely.simplify(geometries, tolerances[-1], preserve_topology=False)
+            collapsed = shapely.is_empty(simplified) & ~shapely.is_empty(geometries)
+            simplified[collapsed] = built[-1][collapsed]
+            built.append(simplified)
+        return cls(tolerances, built)
+
+    def __len__(self):
+        return len(self.tolerances)
+
+    @property
+    def feature_count(self):
+        """
+        :return: number of geometries in each level
+        """
+        first = self._levels[0]
+        return len(first[1]) - 1 if isinstance(first, tuple) else len(first)
+
+    def level_for(self, pixel_size):
+        """
+        :param pixel_size: the size of a pixel in world units
+        :return: the coarsest level with a tolerance no more than a pixel
+        """
+        return max(i for i, tolerance in enumerate(self.tolerances) if tolerance <= pixel_size)
+
+    def level(self, index):
+        """
+        :param index: level number, 0 for full detail
+        :return: array of shapely geometries
+        """
+        if isinstance(self._levels[index], tuple):
+            self._levels[index] = _unpack(*self._levels[index])
+        return self._levels[index]
+
+    def geometries(self, pixel_size):
+        """
+        :param pixel_size: the size of a pixel in world units
+        :return: array of shapely geometries with just enough detail to draw at that scale
+        """
+        return self.level(self.level_for(pixel_size))
+
+    def vertex_counts(self):
+        """
+        :return: total number of vertices at each level
+        """
+        return [int(shapely.get_num_coordinates(self.level(i)).sum()) for i in range(len(self))]
+
+    def save(self, path, signature=(0.0, 0.0)):
+        """
+        :param path: file to write, ending '.npz'
+        :param signature: numbers that identify the source file and the settings the pyramid was built with, for
+        checking the file is still up to date
+        :return: path
+        """
+        arrays = {"tolerances": np.array(self.tolerances), "signature": np.array(signature, dtype=float)}
+        for i in range(len(self)):
+            arrays[f"wkb_{i}"], arrays[f"offsets_{i}"] = (self._levels[i] if isinstance(self._levels[i], tuple)
+                                                          else _pack(self._levels[i]))
+        np.savez(path, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path, signature=None):
+        """
+        :param path: file written by 'save'
+        :param signature: what was given to 'save', or None not to check
+        :return: GeometryPyramid, or None if it was made from a different version of the source or with different
+        settings
+        """
+        with np.load(path) as npz:
+            if signature is not None and not np.array_equal(npz["signature"], np.array(signature, dtype=float)):
+                # Includes signatures of a different length, from older versions of this module
+                return None
+            tolerances = npz["tolerances"]
+            levels = [(npz[f"wkb_{i}"], npz[f"offsets_{i}"]) for i in range(len(tolerances))]
+        return cls(tolerances, levels)
+
+
+def cache_path_for(source_path, layer=None):
+    """
+    :param layer: layer name, for files that have more than one
+    :return: where the pyramid for a source file is saved, e.g. 'Data/data-ky-wkt2.lod.npz' or, for a layer,
+    'Data/counties_kerry.lod.npz'
+    """
+    stem = os.path.splitext(source_path)[0]
+    return f"{stem}_{layer}{CACHE_SUFFIX}" if layer else stem + CACHE_SUFFIX
+
+
+def pyramid_for(source_path, geometries=None, read=None, cache_path=None, **options):
+    """
+    The pyramid for a source file: loaded from its cache if that's up to date, otherwise built and saved.
+
+    :param source_path: the file the geometries were read from
+    :param geometries: the file's geometries, if they've already been read
+    :param read: function that reads the geometries from source_path, only called if they're needed
+    :param cache_path: where to save the pyramid. Defaults to 'cache_path_for(source_path)'.
+    :param options: anything 'GeometryPyramid.build' takes
+    :return: GeometryPyramid
+    """
+    cache_path = cache_path or cache_path_for(source_path)
+    # The settings are part of the signature, so asking for a different pyramid of the same file builds it again.
+    # A base tolerance of 0 means the default.
+    signature = (os.path.getmtime(source_path), os.path.getsize(source_path), options.get("base_tolerance") or 0.0,
+                 options.get("levels", LEVELS), options.get("factor", FACTOR))
+    if os.path.exists(cache_path):
+        try:
+            pyramid = GeometryPyramid.load(cache_path, signature)
+            if pyramid is not None and (geometries is None or pyramid.feature_count == len(geometries)):
+                return pyramid
+        except Exception as e:
+            print(f"Ignoring unreadable {cache_path}: {e}")
+
+    if geometries is None:
+        geometries = read(source_path)
+    pyramid = GeometryPyramid.build(geometries, **options)
+    try:
+        pyramid.save(cache_path, signature)
+    except OSError as e:
+        # Still usable, just not saved for next time
+        print(f"Couldn't save {cache_path}: {e}")
+    return pyramid
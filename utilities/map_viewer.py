@@ -0,0 +1,454 @@
+"""
+A map viewer widget for Tk: a Canvas that shows spatial data layers and can be panned (drag with the left button) and
+zoomed (mouse wheel).
+
+Drawing every vertex of every feature each time the map moves would be far too slow for something like all of a
+country's small areas, so
+* each layer's features are indexed in a spatial tree (shapely STRtree), and only the ones that overlap the part of
+  the map on screen are drawn
+* the map is divided into tiles. When part of the map comes into view for the first time, only the features in the
+  new tiles that haven't been drawn yet are drawn
+* panning moves the items already on the canvas (canvas.move) and zooming scales them (canvas.scale), rather than
+  drawing them again
+* features are drawn from the level of detail that suits the scale (see utilities/lod_pyramid.py), simplified to a
+  pixel. Only when zooming makes that a different level, or changes the scale by more than REDRAW_SCALE, is
+  everything on screen drawn again.
+
+MapView does the sums and keeps track of what's been drawn, without needing Tk. MapViewer is the widget, e.g.
+
+    viewer = MapViewer(root, width=800, height=600, bg="white")
+    viewer.add_layer("Data/data-ky-wkt2.csv")
+    viewer.pack()
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import math
+    import tkinter as tk
+    import numpy as np
+    import shapely
+    from utilities.screen_transform import ScreenTransform, fit_bbox
+    from utilities.wkt_loader import load_layer
+    from utilities.lod_pyramid import pyramid_for, cache_path_for
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Size of a tile, in pixels at the scale the map was last drawn
+TILE_PIXELS = 256
+
+# Each turn of the mouse wheel zooms by this much
+ZOOM_STEP = 1.25
+
+# How long to wait after zooming stops before drawing more detail, in milliseconds
+REDRAW_DELAY = 200
+
+# Everything is drawn again once the map has been zoomed in or out by more than this since it was last drawn
+REDRAW_SCALE = 2.0
+
+# (fill, outline) for each layer in turn
+LAYER_STYLES = [("#8dd3c7", "#333333"), ("#fdb462", "#333333"), ("#bebada", "#333333"), ("#fb8072", "#333333"),
+                ("#80b1d3", "#333333")]
+
+# Radius of a point, in pixels
+POINT_RADIUS = 3
+
+# Shapely geometry type ids
+POINT, LINESTRING, LINEARRING, POLYGON = 0, 1, 2, 3
+
+
+class ViewerLayer:
+    """
+    One layer's features, their spatial index and their level-of-detail pyramid.
+    """
+
+    def __init__(self, path, layer=None, fill=None, outline="#333333", data=None, pyramid=None):
+        """
+        :param path: a WKT file (.csv, see utilities/wkt_loader.py) or anything fiona can open
+        :param layer: layer name, for files that have more than one
+        :param fill: fill colour for polygons
+        :param outline: line colour
+        :param data: WKTLayer, if it's already been read
+        :param pyramid: GeometryPyramid, if it's already been made. Otherwise it's loaded or built and saved next to
+        the file.
+        """
+        self.path = path
+        self.name = layer or path
+        self.fill = fill
+        self.outline = outline
+        self.data = data or load_layer(path, layer)
+        self.tree = shapely.STRtree(self.data.geometries)
+        self.pyramid = pyramid or pyramid_for(path, self.data.geometries,
+                                              cache_path=cache_path_for(path, layer))
+        # Indices of the features on the canvas
+        self.drawn = set()
+
+    @property
+    def bounds(self):
+        return self.data.bounds
+
+
+def screen_parts(geometries, transform):
+    """
+    Screen coordinates of each part of each geometry: each polygon, each line and each point, after simplifying to a
+    pixel.
+
+    :param geometries: array of shapely geometries
+    :param transform: ScreenTransform
+    :return: list of (index of the geometry, shapely type id of the part, screen coordinates). The coordinates are a
+    NumPy array or, for a polygon, a list of NumPy arrays, one per ring with the outside ring first.
+    """
+    geometries = shapely.simplify(np.asarray(geometries, dtype=object), transform.pixel_size)
+    parts, part_index = shapely.get_parts(geometries, return_index=True)
+    if not len(parts):
+        return []
+    types = shapely.get_type_id(parts)
+
+    # Every ring of the polygons (get_rings gives nothing for other types), then the other parts as they are, put
+    # back in the order of the parts so each polygon's rings are together, the outside one first
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    others = np.flatnonzero(types != POLYGON)
+    outlines = np.concatenate([rings, parts[others]])
+    owners = np.concatenate([ring_part, others])
+    order = np.argsort(owners, kind="stable")
+    outlines, owners = outlines[order], owners[order]
+
+    screen = transform.apply(shapely.get_coordinates(outlines))
+    ends = np.cumsum(shapely.get_num_coordinates(outlines))
+    found = []
+    for n, (owner, coords) in enumerate(zip(owners.tolist(), np.split(screen, ends[:-1]))):
+        if types[owner] != POLYGON:
+            if len(coords):
+                found.append((part_index[owner], types[owner], coords))
+        elif n and owners[n - 1] == owner:
+            found[-1][2].append(coords)
+        else:
+            found.append((part_index[owner], POLYGON, [coords]))
+    return found
+
+
+def polygon_fill_coords(rings):
+    """
+    One list of coordinates for a polygon with holes, for a Tk canvas polygon: the outside ring, then each hole
+    followed by a jump back to the start of the outside ring. Canvas polygons are filled by the even-odd rule, so the
+    holes are left empty (and whatever's under them shows through) and the jumps, which go there and back along the
+    same line, don't show.
+
+    :param rings: list of NumPy arrays of screen coordinates, the outside ring first
+    :return: NumPy array of screen coordinates
+    """
+    joined = [rings[0]]
+    for hole in rings[1:]:
+        joined.extend([hole, rings[0][:1]])
+    return np.concatenate(joined)
+
+
+class MapView:
+    """
+    Which part of the map is on screen, and what has been drawn. Screen (canvas) coordinates start at the top left and
+    go down; world coordinates go up.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.layers = []
+        # World coordinates of the top left of the screen, and the size of a pixel in world units
+        self.left = self.top = 0.0
+        self.pixel_size = None
+        self.tile_size = None
+        self.tiles = set()
+        self.levels = []
+
+    def add_layer(self, layer):
+        """
+        :param layer: ViewerLayer
+        :return: True if it's the first layer, so there's no view yet
+        """
+        self.layers.append(layer)
+        return self.pixel_size is None
+
+    @property
+    def bbox(self):
+        """
+        :return: (min x, min y, max x, max y) of the part of the map on screen
+        """
+        return (self.left, self.top - self.height * self.pixel_size,
+                self.left + self.width * self.pixel_size, self.top)
+
+    def transform(self):
+        """
+        :return: ScreenTransform from world coordinates to where things are on the canvas now
+        """
+        return ScreenTransform(self.bbox, self.width, self.height, origin="top-left")
+
+    def full_extent(self):
+        """
+        :return: bounding box of every layer
+        """
+        bounds = np.array([layer.bounds for layer in self.layers if layer.bounds is not None])
+        return [bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max()]
+
+    def zoom_to(self, bbox, margin=0.02):
+        """
+        Show a bounding box, as large as fits on the screen without stretching. Everything has to be drawn again.
+
+        :param bbox: (min x, min y, max x, max y)
+        :return: None
+        """
+        bbox = fit_bbox(bbox, self.width, self.height, margin)
+        self.pixel_size = (bbox[2] - bbox[0]) / self.width
+        self.left, self.top = bbox[0], bbox[3]
+
+    def pan(self, dx, dy):
+        """
+        The map has been moved by (dx, dy) pixels.
+
+        :return: None
+        """
+        self.left -= dx * self.pixel_size
+        self.top += dy * self.pixel_size
+
+    def zoom(self, factor, x, y):
+        """
+        The map has been scaled by 'factor' about the screen point (x, y). The world point under (x, y) stays put.
+
+        :return: None
+        """
+        world_x, world_y = self.left + x * self.pixel_size, self.top - y * self.pixel_size
+        self.pixel_size /= factor
+        self.left, self.top = world_x - x * self.pixel_size, world_y + y * self.pixel_size
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+
+    def wanted_levels(self):
+        """
+        :return: the level of detail each layer should be drawn from at the current scale
+        """
+        return [layer.pyramid.level_for(self.pixel_size) for layer in self.layers]
+
+    def needs_redraw(self):
+        """
+        :return: True if the level of detail has changed since everything was last drawn, or the scale has changed
+        by more than REDRAW_SCALE (things simplified for one scale look wrong at another, and tiles get too many or
+        too big)
+        """
+        if self.tile_size is None or self.wanted_levels() != self.levels:
+            return True
+        drawn_pixel_size = self.tile_size / TILE_PIXELS
+        return not 1 / REDRAW_SCALE <= drawn_pixel_size / self.pixel_size <= REDRAW_SCALE
+
+    def reset(self):
+        """
+        Forget everything drawn, before drawing it all again at the current scale.
+
+        :return: None
+        """
+        self.levels = self.wanted_levels()
+        self.tile_size = TILE_PIXELS * self.pixel_size
+        self.tiles = set()
+        for layer in self.layers:
+            layer.drawn = set()
+
+    def visible_tiles(self):
+        """
+        :return: set of (column, row) of the tiles overlapping the screen
+        """
+        min_x, min_y, max_x, max_y = self.bbox
+        columns = range(math.floor(min_x / self.tile_size), math.floor(max_x / self.tile_size) + 1)
+        rows = range(math.floor(min_y / self.tile_size), math.floor(max_y / self.tile_size) + 1)
+        return {(column, row) for column in columns for row in rows}
+
+    def new_features(self):
+        """
+        Work out which features in tiles coming into view haven't been drawn yet, and count them as drawn.
+
+        :return: list of (layer, array of feature indices, array of their geometries at the right level of detail)
+        """
+        if self.tile_size is None:
+            self.reset()
+        new_tiles = self.visible_tiles() - self.tiles
+        if not new_tiles:
+            return []
+        self.tiles |= new_tiles
+
+        boxes = shapely.box(*np.array([(column * self.tile_size, row * self.tile_size,
+                                        (column + 1) * self.tile_size, (row + 1) * self.tile_size)
+                                       for column, row in new_tiles]).T)
+        found = []
+        for layer, level in zip(self.layers, self.levels):
+            # The tree holds full detail geometries, so any feature that really overlaps a tile is found
+            indices = np.unique(layer.tree.query(boxes, predicate="intersects")[1])
+            indices = np.array([i for i in indices.tolist() if i not in layer.drawn], dtype=int)
+            if len(indices):
+                layer.drawn.update(indices.tolist())
+                found.append((layer, indices, layer.pyramid.level(level)[indices]))
+        return found
+
+
+class MapViewer(tk.Canvas):
+    """
+    Canvas that shows map layers, with pan and zoom.
+    """
+
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.view = MapView(self.winfo_reqwidth(), self.winfo_reqheight())
+        self._drag = None
+        self._pending = None
+
+        self.bind("<ButtonPress-1>", self._start_drag)
+        self.bind("<B1-Motion>", self._drag_to)
+        self.bind("<ButtonRelease-1>", lambda event: self.draw_new())
+        # Windows and macOS send a delta, X11 sends button 4 or 5
+        self.bind("<MouseWheel>", lambda event: self.zoom(ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP, event.x,
+                                                          event.y))
+        self.bind("<Button-4>", lambda event: self.zoom(ZOOM_STEP, event.x, event.y))
+        self.bind("<Button-5>", lambda event: self.zoom(1 / ZOOM_STEP, event.x, event.y))
+        self.bind("<Configure>", self._resized)
+
+    def add_layer(self, path, layer=None, **style):
+        """
+        Read a layer and show it.
+
+        :param path: a WKT file (.csv) or anything fiona can open
+        :param layer: layer name, for files that have more than one
+        :param style: fill and outline colours. Default to the next of LAYER_STYLES.
+        :return: ViewerLayer
+        """
+        fill, outline = LAYER_STYLES[len(self.view.layers) % len(LAYER_STYLES)]
+        viewer_layer = ViewerLayer(path, layer, fill=style.get("fill", fill), outline=style.get("outline", outline))
+        if self.view.add_layer(viewer_layer):
+            self.zoom_to_extent()
+        else:
+            self.redraw()
+        return viewer_layer
+
+    def add_file(self, path):
+        """
+        Read every layer in a file and show them.
+
+        :param path: a WKT file (.csv) or anything fiona can open
+        :return: list of ViewerLayer
+        """
+        if path.lower().endswith(".csv"):
+            return [self.add_layer(path)]
+
+        import fiona
+        layers = fiona.listlayers(path)
+        return [self.add_layer(path, layer if len(layers) > 1 else None) for layer in layers]
+
+    def clear(self):
+        """
+        Remove every layer.
+
+        :return: None
+        """
+        self.delete("map")
+        self.view = MapView(self.view.width, self.view.height)
+
+    def zoom_to_extent(self):
+        """
+        Show every layer in full.
+
+        :return: None
+        """
+        if self.view.layers:
+            self.view.zoom_to(self.view.full_extent())
+            self.redraw()
+
+    def redraw(self):
+        """
+        Draw everything on screen again, from scratch.
+
+        :return: None
+        """
+        self.delete("map")
+        self.view.reset()
+        self.draw_new()
+
+    def draw_new(self):
+        """
+        Draw features that have come into view, if any. The layers are then put back in order, the first at the
+        bottom, as the new features have been drawn on top of everything.
+
+        :return: None
+        """
+        if self.view.pixel_size is None:
+            return
+        transform = self.view.transform()
+        drawn = False
+        for layer, indices, geometries in self.view.new_features():
+            layer_tag = f"layer{self.view.layers.index(layer)}"
+            for i, kind, coords in screen_parts(geometries, transform):
+                tags = ("map", layer_tag, f"{layer.name}:{indices[i]}")
+                if kind == POLYGON and len(coords) == 1:
+                    self.create_polygon(coords[0].ravel().tolist(), fill=layer.fill, outline=layer.outline, tags=tags)
+                elif kind == POLYGON:
+                    # Filled without an outline, which would show the jumps to the holes, then each ring outlined
+                    self.create_polygon(polygon_fill_coords(coords).ravel().tolist(), fill=layer.fill, outline="",
+                                        tags=tags)
+                    for ring in coords:
+                        self.create_line(ring.ravel().tolist(), fill=layer.outline, tags=tags)
+                elif kind in (LINESTRING, LINEARRING):
+                    self.create_line(coords.ravel().tolist(), fill=layer.outline, tags=tags)
+                else:
+                    x, y = coords[0]
+                    self.create_oval(x - POINT_RADIUS, y - POINT_RADIUS, x + POINT_RADIUS, y + POINT_RADIUS,
+                                     fill=layer.fill, outline=layer.outline, tags=tags)
+                drawn = True
+
+        if drawn:
+            # Raising each layer in turn keeps the order of the features within it
+            for position in range(len(self.view.layers)):
+                self.tag_raise(f"layer{position}")
+
+    def pan(self, dx, dy):
+        """
+        Move the map by (dx, dy) pixels.
+
+        :return: None
+        """
+        if self.view.pixel_size is None:
+            return
+        self.move("map", dx, dy)
+        self.view.pan(dx, dy)
+        self.draw_new()
+
+    def zoom(self, factor, x, y):
+        """
+        Zoom in (factor > 1) or out about the screen point (x, y). What's on the canvas is scaled straight away. More
+        (or less) detail is drawn once zooming has stopped for a moment.
+
+        :return: None
+        """
+        if self.view.pixel_size is None:
+            return
+        self.scale("map", x, y, factor, factor)
+        self.view.zoom(factor, x, y)
+        if self._pending:
+            self.after_cancel(self._pending)
+        self._pending = self.after(REDRAW_DELAY, self._zoom_finished)
+
+    def _zoom_finished(self):
+        self._pending = None
+        if self.view.needs_redraw():
+            self.redraw()
+        else:
+            self.draw_new()
+
+    def _start_drag(self, event):
+        self._drag = (event.x, event.y)
+
+    def _drag_to(self, event):
+        if self._drag:
+            dx, dy = event.x - self._drag[0], event.y - self._drag[1]
+            self._drag = (event.x, event.y)
+            self.move("map", dx, dy)
+            if self.view.pixel_size is not None:
+                self.view.pan(dx, dy)
+
+    def _resized(self, event):
+        self.view.resize(event.width, event.height)
+        self.draw_new()
@@ -0,0 +1,215 @@
+"""
+Merge (union) lots of polygons using all of the processor's cores.
+
+'unary_union' on its own runs on one core. For a few dozen counties that's fine, but dissolving thousands of small
+areas takes minutes. 'parallel_union'
+* splits the polygons into spatially compact groups (neighbours end up in the same group, so each group's union is
+  small and simple)
+* unions each group in a separate process
+* unions the results a few at a time, again in parallel, until only one is left
+
+'dissolve_by' does the same for every distinct value of a property at once, e.g. a merged polygon for every nuts3name
+in one pass.
+
+Adjacent polygons whose shared boundaries don't quite match leave slivers and 'ghost' internal boundaries when they're
+merged. 'merge' cleans these up in one of two ways
+* snap - snap every vertex to a grid (grid_size) as part of the union, so near-misses become exact matches. Cheap and
+  the outline stays where it was (to within the grid size).
+* buffer - buffer the result outwards, the way CA1_2021 used to. Much slower on detailed polygons and the outline grows
+  by the buffer distance.
+'compare_merge_modes' times the two on the same polygons.
+
+Because new processes are started, programs that use this must have the usual 'if __name__ == "__main__":' guard,
+otherwise MS Windows will start them over and over.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    import math
+    import os
+    import time
+    import numpy as np
+    import shapely
+    from shapely.geometry import shape
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Below this many geometries a process pool costs more than it saves, so we just union them here
+PARALLEL_THRESHOLD = 256
+
+# Number of partial results unioned together at each step of the hierarchical merge
+FAN_IN = 4
+
+MERGE_MODES = ("snap", "buffer")
+
+# Default grid (in the units of the CRS, metres for Irish Grid) that vertices are snapped to in 'snap' mode
+SNAP_GRID_SIZE = 1.0
+
+# Default distance the result is buffered by in 'buffer' mode
+BUFFER_DISTANCE = 10
+
+
+def _union(geometries, grid_size=None):
+    # This runs in the worker processes so it has to be a plain module-level function
+    return shapely.union_all(np.array(geometries, dtype=object), grid_size=grid_size)
+
+
+def partition(geometries, partitions):
+    """
+    Split geometries into spatially compact groups. They are sorted into vertical strips by the x of their centres and
+    each strip is then cut by y, so each group covers a roughly square area.
+
+    :param geometries: list of shapely geometries
+    :param partitions: roughly how many groups to make
+    :return: list of lists of geometries
+    """
+    geometries = np.array(geometries, dtype=object)
+    count = len(geometries)
+    partitions = max(1, min(partitions, count))
+    strips = max(1, int(math.ceil(math.sqrt(partitions))))
+    per_strip = int(math.ceil(count / strips))
+    per_group = int(math.ceil(count / partitions))
+
+    bounds = shapely.bounds(geometries)
+    centre_x = (bounds[:, 0] + bounds[:, 2]) / 2
+    centre_y = (bounds[:, 1] + bounds[:, 3]) / 2
+
+    groups = []
+    by_x = np.argsort(centre_x, kind="stable")
+    for start in range(0, count, per_strip):
+        strip = by_x[start:start + per_strip]
+        strip = strip[np.argsort(centre_y[strip], kind="stable")]
+        for group_start in range(0, len(strip), per_group):
+            groups.append(list(geometries[strip[group_start:group_start + per_group]]))
+
+    return groups
+
+
+def _hierarchical_union(executor, groups_by_key, grid_size=None):
+    """
+    Union every key's groups, FAN_IN at a time, until each key has a single geometry. All keys are worked on together
+    so the pool is kept busy.
+    """
+    union = partial(_union, grid_size=grid_size)
+    while True:
+        tasks = [(key, group) for key, groups in groups_by_key.items() for group in groups]
+        results = list(executor.map(union, [group for _, group in tasks]))
+
+        partials = {}
+        for (key, _), result in zip(tasks, results):
+            partials.setdefault(key, []).append(result)
+
+        if all(len(values) == 1 for values in partials.values()):
+            return {key: values[0] for key, values in partials.items()}
+
+        groups_by_key = {
+            key: [values[i:i + FAN_IN] for i in range(0, len(values), FAN_IN)] for key, values in partials.items()
+        }
+
+
+def parallel_union(geometries, processes=None, partitions=None, grid_size=None):
+    """
+    Union any number of geometries, in parallel if there are enough of them to make it worthwhile.
+
+    :param geometries: iterable of shapely geometries
+    :param processes: number of worker processes. Defaults to the number of cores.
+    :param partitions: number of groups the geometries are split into at the start. Defaults to 4 per process.
+    :param grid_size: if given, every vertex is snapped to a grid this size before the union (see shapely.union_all)
+    :return: merged geometry
+    """
+    geometries = list(geometries)
+    processes = processes or os.cpu_count() or 1
+
+    if len(geometries) < PARALLEL_THRESHOLD or processes == 1:
+        return _union(geometries, grid_size)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        groups = partition(geometries, partitions or processes * 4)
+        return _hierarchical_union(executor, {None: groups}, grid_size)[None]
+
+
+def dissolve_by(features, key, processes=None, grid_size=None):
+    """
+    Merge the geometries of features that share the same value of a property, for every value at once.
+
+    :param features: iterable of GeoJSON-like features, such as you get from fiona
+    :param key: property to group by, e.g. "nuts3name"
+    :param processes: number of worker processes. Defaults to the number of cores.
+    :param grid_size: if given, every vertex is snapped to a grid this size before the union
+    :return: dict of property value: merged geometry
+    """
+    geometries_by_key = {}
+    for feature in features:
+        # Features without a geometry still get their key in the result. union_all leaves out the Nones.
+        geometry = shape(feature["geometry"]) if feature["geometry"] else None
+        geometries_by_key.setdefault(feature["properties"][key], []).append(geometry)
+
+    processes = processes or os.cpu_count() or 1
+    if sum(len(geometries) for geometries in geometries_by_key.values()) < PARALLEL_THRESHOLD or processes == 1:
+        return {k: _union(geometries, grid_size) for k, geometries in geometries_by_key.items()}
+
+    # Big groups are split so their parts can be unioned in parallel, small ones go as they are
+    groups_by_key = {}
+    for k, geometries in geometries_by_key.items():
+        parts = max(1, len(geometries) // PARALLEL_THRESHOLD)
+        groups_by_key[k] = partition(geometries, parts) if parts > 1 else [geometries]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return _hierarchical_union(executor, groups_by_key, grid_size)
+
+
+def merge(geometries, mode="snap", grid_size=SNAP_GRID_SIZE, buffer_distance=BUFFER_DISTANCE, processes=None):
+    """
+    Merge polygons and clean up the slivers left where their shared boundaries don't exactly match.
+
+    :param geometries: iterable of shapely geometries
+    :param mode: "snap" to snap vertices to a grid of 'grid_size' during the union, "buffer" to buffer the result by
+    'buffer_distance' afterwards
+    :param grid_size: grid size for "snap", in the units of the geometries' CRS
+    :param buffer_distance: buffer distance for "buffer", in the units of the geometries' CRS
+    :param processes: number of worker processes (see 'parallel_union')
+    :return: merged geometry
+    """
+    if mode == "snap":
+        return parallel_union(geometries, processes=processes, grid_size=grid_size)
+    if mode == "buffer":
+        return parallel_union(geometries, processes=processes).buffer(buffer_distance)
+    raise ValueError(f"Merge mode must be one of {MERGE_MODES}.")
+
+
+def compare_merge_modes(geometries, grid_size=SNAP_GRID_SIZE, buffer_distance=BUFFER_DISTANCE, repeat=3,
+                        processes=None):
+    """
+    Time each merge mode on the same polygons and describe what it produced.
+
+    :param geometries: iterable of shapely geometries
+    :param grid_size: grid size for "snap"
+    :param buffer_distance: buffer distance for "buffer"
+    :param repeat: number of times to run each mode. The fastest time is reported.
+    :param processes: number of worker processes (see 'parallel_union')
+    :return: dict of mode: {"seconds", "area", "parts", "holes", "vertices"}. 'holes' counts the interior rings left,
+    which is where any ghost boundaries show up.
+    """
+    geometries = list(geometries)
+    results = {}
+    for mode in MERGE_MODES:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            merged = merge(geometries, mode, grid_size, buffer_distance, processes)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        parts = shapely.get_parts(merged)
+        results[mode] = {
+            "seconds": best,
+            "area": merged.area,
+            "parts": len(parts),
+            "holes": int(shapely.get_num_interior_rings(parts).sum()),
+            "vertices": int(shapely.get_num_coordinates(merged)),
+        }
+
+    return results
@@ -0,0 +1,310 @@
+"""
+Work out the contiguity (neighbour) graph of a polygon layer once, store it on disk next to the layer and answer
+"which features are next to X?" from the stored graph after that.
+
+Two kinds of neighbour are stored
+* queen - the features share at least one point of their boundaries (a corner is enough)
+* rook - the features share a length of boundary
+
+The graph is stored in CSR (compressed sparse row) form in a NumPy .npz file: for feature n, its neighbours are
+indices[indptr[n]:indptr[n + 1]]. This is compact and a lookup is just a slice.
+
+The stored graph remembers the modification time and a hash of the layer, and a hash of every feature's geometry. If
+the layer changes, only the features whose geometry changed (or which are new) have their neighbours worked out again.
+It also remembers which property the features are keyed on, so asking for the same layer keyed on something else gets
+a graph of its own. Features with no geometry are kept, with no neighbours.
+
+Run this stand-alone to build (or update) the graph for a layer and look up a feature, e.g.
+
+    python -m utilities.neighbour_graph .temp_data/counties.shp --key countyname --neighbours Longford
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import argparse
+    import hashlib
+    import os
+    import fiona
+    import numpy as np
+    import shapely
+    from shapely.geometry import shape
+    from shapely.strtree import STRtree
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+CONTIGUITY_TYPES = ("rook", "queen")
+
+EMPTY = shapely.GeometryCollection()
+
+# Files that make up a shapefile and matter to the geometry and attributes
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf")
+
+
+def _source_files(source):
+    stem, extension = os.path.splitext(source)
+    if extension.lower() == ".shp":
+        return [f"{stem}{part}" for part in SHAPEFILE_PARTS if os.path.exists(f"{stem}{part}")]
+    return [source]
+
+
+def _source_mtime(source):
+    return max(os.path.getmtime(path) for path in _source_files(source))
+
+
+def _source_hash(source):
+    digest = hashlib.sha256()
+    for path in _source_files(source):
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def graph_path(source, layer=None, key_property=None):
+    """
+    Where the graph for a layer is stored: next to the source, e.g. counties.shp.neighbours.npz, or
+    counties.shp.countyname.neighbours.npz when keyed on countyname
+
+    :return: path as str
+    """
+    parts = [source] + [part for part in (layer, key_property) if part]
+    return ".".join(parts + ["neighbours", "npz"])
+
+
+def _to_csr(adjacency, count):
+    indptr = np.zeros(count + 1, dtype="int64")
+    for position in range(count):
+        indptr[position + 1] = indptr[position] + len(adjacency[position])
+    indices = np.fromiter(
+        (neighbour for position in range(count) for neighbour in sorted(adjacency[position])),
+        dtype="int64", count=int(indptr[-1])
+    )
+    return indptr, indices
+
+
+def _from_csr(indptr, indices):
+    return [set(indices[indptr[n]:indptr[n + 1]].tolist()) for n in range(len(indptr) - 1)]
+
+
+def _touching_pairs(geometries, positions=None):
+    """
+    Find touching pairs, either for every geometry or just for those at 'positions'.
+
+    :return: tuple of (left, right, is_rook) NumPy arrays
+    """
+    tree = STRtree(geometries)
+    query_positions = np.arange(len(geometries)) if positions is None else np.asarray(positions, dtype="int64")
+    left, right = tree.query(geometries[query_positions], predicate="touches")
+    left = query_positions[left]
+    not_self = left != right
+    left, right = left[not_self], right[not_self]
+
+    # Touching features are rook neighbours if their shared boundary has some length rather than being just points
+    boundaries = shapely.boundary(geometries)
+    shared = shapely.intersection(boundaries[left], boundaries[right])
+    is_rook = shapely.length(shared) > 0
+
+    return left, right, is_rook
+
+
+class NeighbourGraph:
+    """
+    Rook and queen contiguity of a layer, held in CSR form.
+    """
+
+    def __init__(self, keys, geometry_hashes, csr, source_mtime=None, source_hash=None, key_property=None):
+        """
+        :param keys: one key (feature id or property value) per feature
+        :param geometry_hashes: one hash of the WKB of each feature's geometry
+        :param csr: dict of contiguity type: (indptr, indices)
+        :param source_mtime: modification time of the layer the graph was made from
+        :param source_hash: hash of the layer the graph was made from
+        :param key_property: property the keys come from, or None for feature ids
+        """
+        self.keys = list(keys)
+        self.geometry_hashes = list(geometry_hashes)
+        self.csr = csr
+        self.source_mtime = source_mtime
+        self.source_hash = source_hash
+        self.key_property = key_property or None
+        self.positions = {key: position for position, key in enumerate(self.keys)}
+        if len(self.positions) != len(self.keys):
+            raise ValueError("Keys must be unique. Choose a different key property.")
+
+    def neighbours(self, key, contiguity="queen"):
+        """
+        :param key: key of a feature
+        :param contiguity: "rook" or "queen"
+        :return: list of the keys of its neighbours
+        """
+        if contiguity not in CONTIGUITY_TYPES:
+            raise ValueError(f"Contiguity must be one of {CONTIGUITY_TYPES}.")
+        indptr, indices = self.csr[contiguity]
+        position = self.positions[key]
+        return [self.keys[i] for i in indices[indptr[position]:indptr[position + 1]]]
+
+    def save(self, path):
+        arrays = {
+            "keys": np.array(self.keys, dtype=str),
+            "geometry_hashes": np.array(self.geometry_hashes, dtype="S20"),
+            "source_mtime": np.array(self.source_mtime if self.source_mtime is not None else np.nan),
+            "source_hash": np.array(self.source_hash or ""),
+            "key_property": np.array(self.key_property or ""),
+        }
+        for contiguity, (indptr, indices) in self.csr.items():
+            arrays[f"{contiguity}_indptr"] = indptr
+            arrays[f"{contiguity}_indices"] = indices
+
+        # Write to a temporary file and move it into place so nobody ever reads a half-written graph
+        with open(f"{path}.tmp", "wb") as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(
+                keys=arrays["keys"].tolist(),
+                geometry_hashes=arrays["geometry_hashes"].tolist(),
+                csr={
+                    contiguity: (arrays[f"{contiguity}_indptr"], arrays[f"{contiguity}_indices"])
+                    for contiguity in CONTIGUITY_TYPES
+                },
+                source_mtime=float(arrays["source_mtime"]),
+                source_hash=str(arrays["source_hash"]),
+                # Graphs stored before the key property was recorded were keyed on feature ids
+                key_property=str(arrays["key_property"]) if "key_property" in arrays else None,
+            )
+
+
+def _read_layer(source, layer=None, key_property=None):
+    keys, geometries = [], []
+    with fiona.open(source, "r", layer=layer) as fh:
+        for feature in fh:
+            keys.append(str(feature["properties"][key_property] if key_property else feature["id"]))
+            # A feature with no geometry is empty, so it touches nothing
+            geometries.append(shape(feature["geometry"]) if feature["geometry"] else EMPTY)
+    geometries = np.array(geometries, dtype=object)
+    geometry_hashes = [hashlib.sha1(wkb).digest() for wkb in shapely.to_wkb(geometries)]
+
+    return keys, geometries, geometry_hashes
+
+
+def build_graph(source, layer=None, key_property=None, previous=None):
+    """
+    Work out the rook and queen contiguity graph of a layer. If we're given the graph from an earlier version of the
+    layer, only features whose geometry has changed are looked at again.
+
+    :param source: path to any polygon layer fiona can read
+    :param layer: layer to read, for formats such as GeoPackage which can have more than one
+    :param key_property: property to use as the key of each feature. Must be unique. Defaults to the feature id.
+    :param previous: NeighbourGraph for an earlier version of the layer, or None to start from scratch
+    :return: NeighbourGraph
+    """
+    keys, geometries, geometry_hashes = _read_layer(source, layer, key_property)
+    count = len(keys)
+
+    if previous:
+        old_hashes = dict(zip(previous.keys, previous.geometry_hashes))
+        changed = [position for position, key in enumerate(keys) if old_hashes.get(key) != geometry_hashes[position]]
+        changed_keys = {keys[position] for position in changed}
+        adjacency = {}
+        for contiguity in CONTIGUITY_TYPES:
+            old_adjacency = _from_csr(*previous.csr[contiguity])
+            adjacency[contiguity] = []
+            for key in keys:
+                # Neighbours that are unchanged on both sides are still neighbours. Anything involving a changed,
+                # new or deleted feature is worked out again below.
+                old_position = previous.positions.get(key)
+                if old_position is None or key in changed_keys:
+                    adjacency[contiguity].append(set())
+                    continue
+                adjacency[contiguity].append({
+                    previous.keys[n] for n in old_adjacency[old_position]
+                    if previous.keys[n] not in changed_keys
+                })
+            # Turn the neighbours' keys into positions in the new layer, dropping any that have been deleted
+            new_positions = {key: position for position, key in enumerate(keys)}
+            adjacency[contiguity] = [
+                {new_positions[key] for key in neighbours if key in new_positions}
+                for neighbours in adjacency[contiguity]
+            ]
+    else:
+        changed = None
+        adjacency = {contiguity: [set() for _ in range(count)] for contiguity in CONTIGUITY_TYPES}
+
+    if count and (changed is None or changed):
+        left, right, is_rook = _touching_pairs(geometries, changed)
+        for i, j, rook in zip(left.tolist(), right.tolist(), is_rook.tolist()):
+            adjacency["queen"][i].add(j)
+            adjacency["queen"][j].add(i)
+            if rook:
+                adjacency["rook"][i].add(j)
+                adjacency["rook"][j].add(i)
+
+    return NeighbourGraph(
+        keys=keys,
+        geometry_hashes=geometry_hashes,
+        csr={contiguity: _to_csr(adjacency[contiguity], count) for contiguity in CONTIGUITY_TYPES},
+        source_mtime=_source_mtime(source),
+        source_hash=_source_hash(source),
+        key_property=key_property,
+    )
+
+
+def get_graph(source, layer=None, key_property=None, path=None):
+    """
+    Get the neighbour graph for a layer, using the stored one if the layer hasn't changed and updating (or making) it
+    if it has.
+
+    :param source: path to any polygon layer fiona can read
+    :param layer: layer to read, for formats such as GeoPackage which can have more than one
+    :param key_property: property to use as the key of each feature. Must be unique. Defaults to the feature id.
+    :param path: where to store the graph. Defaults to next to the source (see 'graph_path').
+    :return: NeighbourGraph
+    """
+    path = path or graph_path(source, layer, key_property)
+    previous = NeighbourGraph.load(path) if os.path.exists(path) else None
+    if previous and previous.key_property != (key_property or None):
+        # Keyed on something else, so none of it can be used
+        previous = None
+
+    if previous:
+        if previous.source_mtime == _source_mtime(source):
+            return previous
+        if previous.source_hash == _source_hash(source):
+            # Touched but not changed
+            previous.source_mtime = _source_mtime(source)
+            previous.save(path)
+            return previous
+
+    graph = build_graph(source, layer, key_property, previous)
+    graph.save(path)
+
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, update and query the neighbour graph of a polygon layer.")
+    parser.add_argument("source", help="path to any polygon layer fiona can read")
+    parser.add_argument("--layer", help="layer name, for formats with more than one layer")
+    parser.add_argument("--key", help="unique property to identify features by (default: feature id)")
+    parser.add_argument("--contiguity", choices=CONTIGUITY_TYPES, default="queen")
+    parser.add_argument("--neighbours", help="print the neighbours of the feature with this key")
+    args = parser.parse_args()
+
+    try:
+        graph = get_graph(args.source, layer=args.layer, key_property=args.key)
+        if args.neighbours:
+            print("\n".join(graph.neighbours(args.neighbours, args.contiguity)))
+        else:
+            print(f"{len(graph.keys)} features, {len(graph.csr[args.contiguity][1]) // 2} {args.contiguity} "
+                  f"neighbour pairs, stored in {graph_path(args.source, args.layer, args.key)}")
+    except Exception as e:
+        print(f"{e}")
+        quit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Draw maps straight into an image, without turtle, Tk or a display.
+
+kerry_turtle draws with turtle graphics, which opens a window and draws while you watch. This draws the same map
+(the polygons, with "name (pop: ...)" at each centroid) into a NumPy array of pixels and saves it as a PNG or PPM
+file. It only needs NumPy, shapely and the standard library, so it works on a server with no display.
+
+* World coordinates are turned into pixels by utilities/screen_transform.py, using the same bounding box as
+  kerry_turtle.calc_ratios, after simplifying each ring to a pixel.
+* Polygons are filled with a scanline fill: for each row of pixels, find where the row crosses the polygon's edges
+  and fill between pairs of crossings (the even-odd rule, so holes stay empty). The crossings for every row are found
+  at once with NumPy.
+* Labels use a tiny built-in 5x7 bitmap font of capital letters, digits and some punctuation. Lower case letters are
+  drawn as capitals.
+* PNG files are written with zlib, PPM files are just a header and the raw pixels.
+
+Thumbnails of every feature in a layer, each drawn to fit its own picture, are made by a pool of processes, e.g.
+
+    python -m utilities.raster_render Data/data-ky-wkt2.csv --output kerry.png
+    python -m utilities.raster_render Data/data-ky-wkt2.csv --thumbnails thumbs --size 200 200 --processes 4
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    import os
+    import re
+    import struct
+    import zlib
+    import numpy as np
+    import shapely
+    from utilities.screen_transform import ScreenTransform, collection_bbox, fit_bbox
+    from utilities.wkt_loader import load_layer
+    from utilities.lod_pyramid import pyramid_for, cache_path_for
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+# Fill colours, used in turn for each feature
+PALETTE = [(141, 211, 199), (255, 255, 179), (190, 186, 218), (251, 128, 114), (128, 177, 211), (253, 180, 98),
+           (179, 222, 105), (252, 205, 229), (217, 217, 217), (188, 128, 189)]
+
+DEFAULT_LABEL = "{countyname} (pop: {total2011})"
+
+# Number of features each thumbnail process is given at a time
+THUMBNAILS_PER_TASK = 50
+
+# 5x7 bitmap font. Each character is 7 rows of 5 pixels, '#' for ink.
+GLYPH_WIDTH, GLYPH_HEIGHT = 5, 7
+_GLYPH_ROWS = {
+    "A": ".###. #...# #...# ##### #...# #...# #...#",
+    "B": "####. #...# #...# ####. #...# #...# ####.",
+    "C": ".###. #...# #.... #.... #.... #...# .###.",
+    "D": "####. #...# #...# #...# #...# #...# ####.",
+    "E": "##### #.... #.... ####. #.... #.... #####",
+    "F": "##### #.... #.... ####. #.... #.... #....",
+    "G": ".###. #...# #.... #.### #...# #...# .####",
+    "H": "#...# #...# #...# ##### #...# #...# #...#",
+    "I": ".###. ..#.. ..#.. ..#.. ..#.. ..#.. .###.",
+    "J": "..### ...#. ...#. ...#. ...#. #..#. .##..",
+    "K": "#...# #..#. #.#.. ##... #.#.. #..#. #...#",
+    "L": "#.... #.... #.... #.... #.... #.... #####",
+    "M": "#...# ##.## #.#.# #.#.# #...# #...# #...#",
+    "N": "#...# #...# ##..# #.#.# #..## #...# #...#",
+    "O": ".###. #...# #...# #...# #...# #...# .###.",
+    "P": "####. #...# #...# ####. #.... #.... #....",
+    "Q": ".###. #...# #...# #...# #.#.# #..#. .##.#",
+    "R": "####. #...# #...# ####. #.#.. #..#. #...#",
+    "S": ".#### #.... #.... .###. ....# ....# ####.",
+    "T": "##### ..#.. ..#.. ..#.. ..#.. ..#.. ..#..",
+    "U": "#...# #...# #...# #...# #...# #...# .###.",
+    "V": "#...# #...# #...# #...# #...# .#.#. ..#..",
+    "W": "#...# #...# #...# #.#.# #.#.# #.#.# .#.#.",
+    "X": "#...# #...# .#.#. ..#.. .#.#. #...# #...#",
+    "Y": "#...# #...# .#.#. ..#.. ..#.. ..#.. ..#..",
+    "Z": "##### ....# ...#. ..#.. .#... #.... #####",
+    "0": ".###. #...# #..## #.#.# ##..# #...# .###.",
+    "1": "..#.. .##.. ..#.. ..#.. ..#.. ..#.. .###.",
+    "2": ".###. #...# ....# ...#. ..#.. .#... #####",
+    "3": "##### ...#. ..#.. ...#. ....# #...# .###.",
+    "4": "...#. ..##. .#.#. #..#. ##### ...#. ...#.",
+    "5": "##### #.... ####. ....# ....# #...# .###.",
+    "6": "..##. .#... #.... ####. #...# #...# .###.",
+    "7": "##### ....# ...#. ..#.. .#... .#... .#...",
+    "8": ".###. #...# #...# .###. #...# #...# .###.",
+    "9": ".###. #...# #...# .#### ....# ...#. .##..",
+    " ": "..... ..... ..... ..... ..... ..... .....",
+    "(": "...#. ..#.. .#... .#... .#... ..#.. ...#.",
+    ")": ".#... ..#.. ...#. ...#. ...#. ..#.. .#...",
+    ":": "..... .##.. .##.. ..... .##.. .##.. .....",
+    ".": "..... ..... ..... ..... ..... .##.. .##..",
+    ",": "..... ..... ..... ..... .##.. ..#.. .#...",
+    "-": "..... ..... ..... ##### ..... ..... .....",
+    "'": "..#.. ..#.. .#... ..... ..... ..... .....",
+    "/": "..... ....# ...#. ..#.. .#... #.... .....",
+    "&": ".##.. #..#. #.#.. .#... #.#.# #..#. .##.#",
+    "?": ".###. #...# ....# ...#. ..#.. ..... ..#..",
+}
+GLYPHS = {k: np.array([[c == "#" for c in row] for row in v.split()]) for k, v in _GLYPH_ROWS.items()}
+
+
+def _edges(rings):
+    # Every edge of every ring as rows of (x0, y0, x1, y1)
+    return np.concatenate([np.hstack([ring[:-1], ring[1:]]) for ring in rings if len(ring) > 1])
+
+
+def scanline_mask(rings, width, height):
+    """
+    Which pixels are inside a polygon. A pixel is inside if its centre is, by the even-odd rule.
+
+    :param rings: list of NumPy arrays of closed rings in pixel coordinates (top-left origin), holes included
+    :param width: image width
+    :param height: image height
+    :return: (first row, boolean array of the rows from there on, shape (rows, width)), or None if nothing is inside
+    """
+    if not rings:
+        return None
+    edges = _edges(rings)
+    y_low, y_high = np.minimum(edges[:, 1], edges[:, 3]), np.maximum(edges[:, 1], edges[:, 3])
+
+    # Row i is crossed by an edge if its centre, i + 0.5, is in [y_low, y_high). Flat edges cross no rows.
+    first = np.clip(np.ceil(y_low - 0.5), 0, height).astype(int)
+    last = np.clip(np.ceil(y_high - 0.5), 0, height).astype(int)
+    counts = last - first
+    if not counts.sum():
+        return None
+
+    # One entry per (edge, row) crossing
+    edge_index = np.repeat(np.arange(len(edges)), counts)
+    rows = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[edge_index]
+    x0, y0, x1, y1 = edges[edge_index].T
+    xs = x0 + (rows + 0.5 - y0) * (x1 - x0) / (y1 - y0)
+
+    # Sorted by row then x, crossings pair up: fill from the 1st to the 2nd, 3rd to 4th...
+    order = np.lexsort((xs, rows))
+    rows, xs = rows[order], xs[order]
+    top = rows.min()
+    starts = np.clip(np.ceil(xs[0::2] - 0.5), 0, width).astype(int)
+    ends = np.clip(np.ceil(xs[1::2] - 0.5), 0, width).astype(int)
+
+    # +1 where each span starts and -1 where it ends, then a running total across each row
+    change = np.zeros((rows.max() - top + 1, width + 1), dtype=np.int32)
+    np.add.at(change, (rows[0::2] - top, starts), 1)
+    np.add.at(change, (rows[0::2] - top, ends), -1)
+    return top, np.cumsum(change, axis=1)[:, :width] > 0
+
+
+class Raster:
+    """
+    An RGB image held as a NumPy array of shape (height, width, 3).
+    """
+
+    def __init__(self, width, height, background=WHITE):
+        self.width = width
+        self.height = height
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self.pixels[:] = background
+
+    def fill_polygon(self, rings, colour):
+        """
+        :param rings: list of NumPy arrays of closed rings in pixel coordinates, holes included
+        :param colour: (r, g, b)
+        :return: None
+        """
+        mask = scanline_mask(rings, self.width, self.height)
+        if mask:
+            top, inside = mask
+            self.pixels[top:top + len(inside)][inside] = colour
+
+    def draw_lines(self, rings, colour):
+        """
+        Draw the edges of rings, one pixel wide.
+
+        :param rings: list of NumPy arrays of rings (or lines) in pixel coordinates
+        :param colour: (r, g, b)
+        :return: None
+        """
+        if not any(len(ring) > 1 for ring in rings):
+            return
+        edges = _edges(rings)
+        # Enough points along each edge that there's one in every pixel it passes through
+        steps = np.ceil(np.abs(edges[:, 2:] - edges[:, :2]).max(axis=1)).astype(int) + 1
+        edge_index = np.repeat(np.arange(len(edges)), steps)
+        fraction = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.maximum(
+            steps[edge_index] - 1, 1)
+        points = edges[edge_index, :2] + (edges[edge_index, 2:] - edges[edge_index, :2]) * fraction[:, None]
+        columns, rows = np.floor(points).astype(int).T
+        keep = (columns >= 0) & (columns < self.width) & (rows >= 0) & (rows < self.height)
+        self.pixels[rows[keep], columns[keep]] = colour
+
+    def draw_text(self, text, x, y, colour=BLACK, scale=1):
+        """
+        Write text centred on a point. Anything off the edge of the image is left out.
+
+        :param text: the text. Characters the font doesn't have are drawn as '?'.
+        :param x: centre, in pixels
+        :param y: centre, in pixels
+        :param colour: (r, g, b)
+        :param scale: size of each font pixel, in image pixels
+        :return: None
+        """
+        glyphs = [GLYPHS.get(c, GLYPHS["?"]) for c in str(text).upper()]
+        if not glyphs:
+            return
+        # One blank column between characters
+        spacing = np.zeros((GLYPH_HEIGHT, 1), dtype=bool)
+        bitmap = np.hstack([part for glyph in glyphs for part in (glyph, spacing)][:-1])
+        bitmap = np.kron(bitmap, np.ones((scale, scale), dtype=bool))
+
+        left, top = int(round(x - bitmap.shape[1] / 2)), int(round(y - bitmap.shape[0] / 2))
+        rows, columns = np.nonzero(bitmap)
+        rows, columns = rows + top, columns + left
+        keep = (columns >= 0) & (columns < self.width) & (rows >= 0) & (rows < self.height)
+        self.pixels[rows[keep], columns[keep]] = colour
+
+    def to_ppm(self):
+        """
+        :return: the image as the bytes of a binary PPM (P6) file
+        """
+        return b"P6\n%d %d\n255\n" % (self.width, self.height) + self.pixels.tobytes()
+
+    def to_png(self, level=6):
+        """
+        :param level: zlib compression level
+        :return: the image as the bytes of a PNG file
+        """
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        # Each row starts with its filter type, 0 (none)
+        rows = np.hstack([np.zeros((self.height, 1), dtype=np.uint8), self.pixels.reshape(self.height, -1)])
+        return (b"\x89PNG\r\n\x1a\n"
+                + chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+                + chunk(b"IDAT", zlib.compress(rows.tobytes(), level))
+                + chunk(b"IEND", b""))
+
+    def save(self, path):
+        """
+        :param path: file to write. '.ppm' gets a PPM file, anything else a PNG file.
+        :return: path
+        """
+        with open(path, "wb") as fh:
+            fh.write(self.to_ppm() if path.lower().endswith(".ppm") else self.to_png())
+        return path
+
+
+def _label_for(record, label):
+    try:
+        return label.format(**record)
+    except (KeyError, IndexError):
+        return ""
+
+
+def render(geometries, records=None, width=800, height=600, bbox=None, keep_aspect=False, label=DEFAULT_LABEL,
+           fill=True, outline=BLACK, background=WHITE, label_scale=1, pyramid=None):
+    """
+    Draw polygons, and a label at the centroid of each, into an image.
+
+    :param geometries: array of shapely (Multi)Polygons
+    :param records: list of dicts of attributes for the labels, one per geometry. Leave out for no labels.
+    :param width: image width
+    :param height: image height
+    :param bbox: area to draw, (min x, min y, max x, max y). Defaults to the bounding box of the geometries, as
+    kerry_turtle.calc_ratios works it out.
+    :param keep_aspect: grow the bounding box to the shape of the image, so the map isn't stretched
+    :param label: format string for each label, filled in from the record, or None for no labels
+    :param fill: fill the polygons with colours from PALETTE
+    :param outline: colour of the polygon edges, or None for no edges
+    :param background: background colour
+    :param label_scale: size of each font pixel, in image pixels
+    :param pyramid: GeometryPyramid of the same geometries (see utilities/lod_pyramid.py), to draw from the level of
+    detail that suits the image
+    :return: Raster
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    raster = Raster(width, height, background)
+    if not len(geometries):
+        return raster
+
+    bbox = bbox or collection_bbox(geometries)
+    if keep_aspect:
+        bbox = fit_bbox(bbox, width, height)
+    transform = ScreenTransform(bbox, width, height, origin="top-left")
+    if pyramid is not None:
+        geometries = pyramid.geometries(transform.pixel_size)
+
+    # Holes are needed to fill properly, and are drawn round too
+    rings = transform.rings(geometries, interiors=True)
+    for i, geometry_rings in enumerate(rings):
+        if fill:
+            raster.fill_polygon(geometry_rings, PALETTE[i % len(PALETTE)])
+        if outline is not None:
+            raster.draw_lines(geometry_rings, outline)
+
+    # Labels go on top of every polygon. Features without a geometry don't get one: their centroids would be left out
+    # of the coordinates, so only the ones that have one are paired with their records.
+    if records is not None and label:
+        has_geometry = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+        centroids = transform.points(shapely.centroid(geometries[has_geometry]))
+        labelled = [record for record, keep in zip(records, has_geometry.tolist()) if keep]
+        for record, (x, y) in zip(labelled, centroids):
+            raster.draw_text(_label_for(record, label), x, y, scale=label_scale)
+
+    return raster
+
+
+def render_layer(data, path, width=800, height=600, ratios=None, **options):
+    """
+    Draw a whole layer to an image file, as kerry_turtle would draw it on screen.
+
+    :param data: WKTLayer, or a path for 'load_layer'
+    :param path: image file to write, .png or .ppm
+    :param ratios: what kerry_turtle.calc_ratios returns, to use its bounding box. Defaults to the layer's.
+    :param options: anything else 'render' takes
+    :return: path
+    """
+    if isinstance(data, str):
+        data = load_layer(data)
+    if ratios is not None:
+        options["bbox"] = ratios[2]
+    return render(data.geometries, data.records, width, height, **options).save(path)
+
+
+def thumbnail_name(index, record, name_field, extension):
+    """
+    :return: file name for one feature's thumbnail, e.g. '00003_Kerry.png'
+    """
+    name = re.sub(r"[^A-Za-z0-9_-]+", "_", str(record.get(name_field, ""))).strip("_")
+    return f"{index:05d}_{name}.{extension}" if name else f"{index:05d}.{extension}"
+
+
+def _render_thumbnails(jobs, width, height, options):
+    # jobs is a list of (path, geometry, record). Each feature gets a picture of its own.
+    written = []
+    for path, geometry, record in jobs:
+        if geometry is None or geometry.is_empty:
+            continue
+        render([geometry], [record], width, height, keep_aspect=True,
+               bbox=fit_bbox(geometry.bounds, width, height, margin=0.05), **options).save(path)
+        written.append(path)
+    return written
+
+
+def render_thumbnails(data, directory, width=200, height=200, processes=None, extension="png",
+                      name_field="countyname", pyramid=None, **options):
+    """
+    Draw a picture of each feature in a layer, in a pool of processes.
+
+    :param data: WKTLayer, or a path for 'load_layer'
+    :param directory: where to write the pictures. It's made if it doesn't exist.
+    :param width: picture width
+    :param height: picture height
+    :param processes: number of processes. Defaults to the number of cores. 1 does everything in this process.
+    :param extension: 'png' or 'ppm'
+    :param name_field: attribute used in the file names
+    :param pyramid: GeometryPyramid of the same geometries (see utilities/lod_pyramid.py). Each feature is drawn from
+    the level of detail that suits its picture, and only that level is sent to the processes.
+    :param options: anything else 'render' takes, e.g. label
+    :return: list of the files written
+    """
+    if isinstance(data, str):
+        data = load_layer(data)
+    os.makedirs(directory, exist_ok=True)
+    jobs = []
+    for i, (record, geometry) in enumerate(data):
+        if pyramid is not None and geometry is not None and not geometry.is_empty:
+            bbox = fit_bbox(geometry.bounds, width, height, margin=0.05)
+            geometry = pyramid.geometries((bbox[2] - bbox[0]) / width)[i]
+        jobs.append((os.path.join(directory, thumbnail_name(i, record, name_field, extension)), geometry, record))
+    tasks = [jobs[i:i + THUMBNAILS_PER_TASK] for i in range(0, len(jobs), THUMBNAILS_PER_TASK)]
+
+    if processes == 1 or len(tasks) <= 1:
+        return [path for task in tasks for path in _render_thumbnails(task, width, height, options)]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_render_thumbnails, task, width, height, options) for task in tasks]
+        return [path for future in futures for path in future.result()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw a map, or a picture of each feature, without a display.")
+    parser.add_argument("input", help="WKT file (.csv) or any file fiona can open")
+    parser.add_argument("--layer", help="layer name, for files with more than one")
+    parser.add_argument("--output", help="image file for the whole map, .png or .ppm")
+    parser.add_argument("--thumbnails", help="directory for a picture of each feature")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="image size in pixels")
+    parser.add_argument("--format", choices=("png", "ppm"), default="png", help="thumbnail format")
+    parser.add_argument("--label", default=DEFAULT_LABEL, help="label format, e.g. '{countyname}'")
+    parser.add_argument("--name-field", default="countyname", help="attribute used in thumbnail file names")
+    parser.add_argument("--processes", type=int, help="number of processes for thumbnails (default: one per core)")
+    parser.add_argument("--no-pyramid", action="store_true",
+                        help="draw from full detail, rather than from simplified copies saved next to the input")
+    args = parser.parse_args()
+
+    if not args.output and not args.thumbnails:
+        parser.error("Say what to draw with --output and/or --thumbnails.")
+
+    data = load_layer(args.input, args.layer)
+    pyramid = None if args.no_pyramid else pyramid_for(args.input, data.geometries,
+                                                       cache_path=cache_path_for(args.input, args.layer))
+    if args.output:
+        width, height = args.size or (800, 600)
+        print(f"Wrote {render_layer(data, args.output, width, height, label=args.label, pyramid=pyramid)}")
+    if args.thumbnails:
+        width, height = args.size or (200, 200)
+        written = render_thumbnails(data, args.thumbnails, width, height, args.processes, args.format,
+                                    args.name_field, pyramid, label=args.label)
+        print(f"Wrote {len(written)} pictures to {args.thumbnails}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"{e}")
+        quit(1)
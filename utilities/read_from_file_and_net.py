@@ -14,7 +14,8 @@ This is a brief illustration of
     choose what operations to perform once we have caught the exception.
 4. How to read a file from the Internet with 'requests'.
     The requests module allows you to send HTTP requests using Python. The HTTP request returns a Response Object with
-    all the response data (content, encoding, status, etc). It is assumed that 'requests' is installed.
+    all the response data (content, encoding, status, etc). It is assumed that 'requests' is installed. We use the
+    shared session in 'http_session' rather than calling 'requests.get' directly so that connections are re-used.
 5. How to read a file from the computer's file system.
     In Python you need to give access to a file by opening it. You can do it by using the open() function. Open returns
     a file object, which has methods and attributes for getting information about and manipulating the opened file.
@@ -26,7 +27,7 @@ Mark Foley
 October 2020
 """
 
-import requests
+import utilities.http_session as http
 
 ALLOWED_CONTENT_TYPES = ("application/x-httpd-php", "text/plain", "text/html")
 
@@ -44,7 +45,7 @@ def get_file_from_net(url):
     """
 
     try:
-        response = requests.get(url)
+        response = http.get(url)
         if 200 <= response.status_code <= 299:
             if response.headers["Content-Type"] and response.headers["Content-Type"] in ALLOWED_CONTENT_TYPES:
                 return response.text
@@ -1,15 +1,91 @@
-import pyproj
-from fiona.crs import from_epsg, from_string, to_string
-from shapely.geometry import Point
+"""
+Reproject coordinates from one CRS to another.
+
+'reproject' does one shapely Point at a time. To reproject lots of coordinates (every vertex of a set of county
+polygons, say) use 'reproject_coords', 'reproject_geometries' or 'reproject_features'. These gather all of the
+coordinates into NumPy arrays and transform them in a single pyproj call, which is far quicker than transforming point
+by point in a Python loop. Only x and y are transformed, any z values are dropped.
+"""
+
+import numpy as np
+import shapely
+from shapely.geometry import Point, shape, mapping
+from utilities.transformer_registry import get_transformer
 
 
 def reproject(point, source_epsg_code, target_epsg_code):
-    transformer = pyproj.Transformer.from_crs(from_epsg(source_epsg_code), from_epsg(target_epsg_code), always_xy=True)
+    # Transformers are expensive to make so we get one from the registry rather than making a new one every time
+    transformer = get_transformer(int(source_epsg_code), int(target_epsg_code), always_xy=True, thread_local=True)
     target_x, target_y = transformer.transform(point.x, point.y)
 
     return (target_x, target_y)
 
 
+def reproject_coords(xs, ys, source_crs, target_crs):
+    """
+    Reproject arrays of x and y coordinates in one go.
+
+    :param xs: x coordinates, any sequence or NumPy array
+    :param ys: y coordinates, as above
+    :param source_crs: EPSG code (or anything else pyproj understands, such as 'source.crs' from fiona)
+    :param target_crs: As above
+    :return: tuple of NumPy arrays of x and y coordinates in the target CRS
+    """
+    transformer = get_transformer(source_crs, target_crs, always_xy=True, thread_local=True)
+    return transformer.transform(np.asarray(xs, dtype="float64"), np.asarray(ys, dtype="float64"))
+
+
+def reproject_geometries(geometries, source_crs, target_crs):
+    """
+    Reproject any number of shapely geometries. All of their coordinates are pulled out into one flat array,
+    transformed in a single call and put back.
+
+    :param geometries: iterable of shapely geometries
+    :param source_crs: EPSG code (or anything else pyproj understands)
+    :param target_crs: As above
+    :return: NumPy array of reprojected geometries, in the same order
+    """
+    geometries = np.array(list(geometries), dtype=object)
+    coords = shapely.get_coordinates(geometries)
+    xs, ys = reproject_coords(coords[:, 0], coords[:, 1], source_crs, target_crs)
+
+    # set_coordinates replaces the geometries in the array it's given, so we give it a copy
+    return shapely.set_coordinates(geometries.copy(), np.column_stack([xs, ys]))
+
+
+def reproject_geometry(geometry, source_crs, target_crs):
+    """
+    Reproject one shapely geometry of any type (all of its vertices in a single call).
+
+    :return: reprojected geometry
+    """
+    return reproject_geometries([geometry], source_crs, target_crs)[0]
+
+
+def reproject_features(features, source_crs, target_crs):
+    """
+    Reproject GeoJSON-like features, such as you get from fiona.
+
+    :param features: iterable of features
+    :param source_crs: EPSG code (or anything else pyproj understands, such as 'source.crs' from fiona)
+    :param target_crs: As above
+    :return: list of new features with reprojected geometries. Ids and properties are kept, as are null geometries.
+    """
+    features = list(features)
+    geometries = reproject_geometries(
+        [shape(feature["geometry"]) if feature["geometry"] else None for feature in features], source_crs, target_crs)
+
+    return [
+        {
+            "type": "Feature",
+            "id": feature.get("id"),
+            "properties": dict(feature["properties"]),
+            "geometry": mapping(geometry) if geometry is not None else None,
+        }
+        for feature, geometry in zip(features, geometries)
+    ]
+
+
 def main():
     point_4326 = Point(-6.33, 53.33)
     point_29902 = Point(reproject(point_4326, 4326, 29902))
@@ -17,6 +93,10 @@ def main():
 
     print(f"Source point is {point_4326}\n29902: {point_29902}\n2157: {point_2157}")
 
+    # Lots of points at once
+    xs, ys = reproject_coords([-6.33, -8.5, -9.7], [53.33, 53.5, 52.27], 4326, 29902)
+    print(f"29902: {list(zip(xs.tolist(), ys.tolist()))}")
+
 
 if __name__ == "__main__":
     main()
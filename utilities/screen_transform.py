@@ -0,0 +1,160 @@
+"""
+Turn 'world' coordinates (e.g. eastings and northings) into screen (pixel) coordinates for drawing.
+
+kerry_turtle.convert_point does this one point at a time. Here it's done to all of the coordinates of all of the rings
+of all of the geometries at once: one multiply and one add over a NumPy array.
+
+There's no point drawing detail smaller than a pixel, so before the rings are transformed they're simplified
+(Douglas-Peucker, shapely.simplify) with a tolerance of one pixel in world units. A county with thousands of vertices
+ends up with about as many as there are pixels around its edge.
+
+Two screen layouts are supported:
+* "centre" - (0, 0) is the middle of the screen and y goes up, as in turtle graphics
+* "top-left" - (0, 0) is the top left corner and y goes down, as for images and the Tk canvas
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import numpy as np
+    import shapely
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+ORIGINS = ("centre", "top-left")
+
+
+def collection_bbox(data):
+    """
+    Bounding box of a whole collection of geometries, worked out in one go.
+
+    :param data: WKTLayer (see utilities/wkt_loader.py), array of shapely geometries, or list of rows with WKT in
+    'geom_str'
+    :return: [min x, min y, max x, max y]
+    """
+    if getattr(data, "bounds", None) is not None:
+        # The loader has already worked it out
+        return list(data.bounds)
+    if len(data) and isinstance(data[0], dict):
+        data = shapely.from_wkt([row["geom_str"] for row in data])
+    return shapely.total_bounds(data).tolist()
+
+
+def fit_bbox(bbox, screen_width, screen_height, margin=0.0):
+    """
+    Grow a bounding box so that it has the same shape as the screen, keeping it centred, so that the map isn't
+    stretched.
+
+    :param bbox: (min x, min y, max x, max y)
+    :param margin: extra space around the box, as a fraction of its size
+    :return: [min x, min y, max x, max y]
+    """
+    width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    # A point or a straight line still needs some area to draw in
+    size = max(width, height) or 1.0
+    width, height = max(width, size * 1e-6) * (1 + 2 * margin), max(height, size * 1e-6) * (1 + 2 * margin)
+    if width / height < screen_width / screen_height:
+        width = height * screen_width / screen_height
+    else:
+        height = width * screen_height / screen_width
+    centre_x, centre_y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return [centre_x - width / 2, centre_y - height / 2, centre_x + width / 2, centre_y + height / 2]
+
+
+class ScreenTransform:
+    """
+    Scales and moves world coordinates so that a bounding box fills the screen, exactly as kerry_turtle.convert_point
+    does. Each axis is scaled on its own, so the map is stretched to the shape of the screen.
+    """
+
+    def __init__(self, bbox, screen_width, screen_height, origin="centre"):
+        """
+        :param bbox: (min x, min y, max x, max y) in world coordinates
+        :param screen_width: width in pixels
+        :param screen_height: height in pixels
+        :param origin: "centre" or "top-left"
+        """
+        if origin not in ORIGINS:
+            raise ValueError(f"Origin must be one of {ORIGINS}.")
+        if bbox[2] <= bbox[0] or bbox[3] <= bbox[1]:
+            raise ValueError(f"Bounding box {bbox} has no area.")
+
+        self.bbox = tuple(bbox)
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.origin = origin
+        x_ratio = screen_width / (bbox[2] - bbox[0])
+        y_ratio = screen_height / (bbox[3] - bbox[1])
+
+        # screen = world * scale + offset
+        if origin == "centre":
+            self.scale = np.array([x_ratio, y_ratio])
+            self.offset = np.array([screen_width / 2 - bbox[2] * x_ratio, screen_height / 2 - bbox[3] * y_ratio])
+        else:
+            self.scale = np.array([x_ratio, -y_ratio])
+            self.offset = np.array([-bbox[0] * x_ratio, bbox[3] * y_ratio])
+
+    @classmethod
+    def from_ratios(cls, screen_width, screen_height, ratios, origin="centre"):
+        """
+        :param ratios: what kerry_turtle.calc_ratios returns
+        :return: ScreenTransform for the same bounding box
+        """
+        return cls(ratios[2], screen_width, screen_height, origin)
+
+    @property
+    def pixel_size(self):
+        """
+        :return: the size of a pixel in world units, on whichever axis pixels are smaller
+        """
+        return float(min(1 / abs(self.scale[0]), 1 / abs(self.scale[1])))
+
+    def apply(self, coords):
+        """
+        :param coords: array-like of (x, y) world coordinates, shape (n, 2)
+        :return: NumPy array of screen coordinates, shape (n, 2)
+        """
+        return np.asarray(coords, dtype=float)[:, :2] * self.scale + self.offset
+
+    def points(self, geometries):
+        """
+        :param geometries: array of shapely Points. Missing (None) and empty ones are allowed.
+        :return: NumPy array of their screen coordinates, shape (n, 2), one row per point in the same order. Rows for
+        missing or empty points are NaN.
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        coords = np.full((len(geometries), 2), np.nan)
+        # get_coordinates leaves out missing and empty points, so it's only given the others
+        present = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+        coords[present] = shapely.get_coordinates(geometries[present])
+        return self.apply(coords)
+
+    def rings(self, geometries, simplify=True, interiors=False, tolerance=None):
+        """
+        Screen coordinates of the rings of (multi)polygons.
+
+        :param geometries: array of shapely Polygons or MultiPolygons
+        :param simplify: simplify to a pixel first
+        :param interiors: include the rings of holes as well as the outside of each polygon
+        :param tolerance: simplification tolerance in world units. Defaults to the size of a pixel.
+        :return: list with, for each geometry, a list of NumPy arrays of screen coordinates, one per ring
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        if simplify:
+            geometries = shapely.simplify(geometries, self.pixel_size if tolerance is None else tolerance)
+
+        parts, part_index = shapely.get_parts(geometries, return_index=True)
+        if interiors:
+            rings, ring_index = shapely.get_rings(parts, return_index=True)
+            geometry_index = part_index[ring_index]
+        else:
+            rings, geometry_index = shapely.get_exterior_ring(parts), part_index
+
+        screen = self.apply(shapely.get_coordinates(rings))
+        ends = np.cumsum(shapely.get_num_coordinates(rings))
+
+        result = [[] for _ in range(len(geometries))]
+        for i, ring in zip(geometry_index, np.split(screen, ends[:-1]) if len(rings) else []):
+            if len(ring):
+                result[i].append(ring)
+        return result
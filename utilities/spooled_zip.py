@@ -0,0 +1,101 @@
+"""
+Save a zip file (such as a SHAPE-ZIP from Geoserver) from the Net without holding it in memory.
+
+The simple way to do this is 'ZipFile(BytesIO(response.content)).extractall()'. That holds the whole archive in memory,
+and while it is being extracted there are two copies of it, one in 'response.content' and one in the BytesIO. For a big
+shapefile that's a lot of memory. Instead we
+* write the response to a file on disk a chunk at a time (or use the copy that's already in the cache, see
+  'http_cache'), then
+* either extract the members straight from that file, or
+* don't extract at all. GDAL (and so fiona) can read a shapefile inside a zip file if you give it a path like
+  '/vsizip/path/to/file.zip/counties.shp'.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import os
+    import shutil
+    import tempfile
+    from zipfile import ZipFile
+    import utilities.http_session as http
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _filename_from_headers(response, default="download.zip"):
+    for item in response.headers.get("Content-Disposition", "").split(";"):
+        item = item.strip().split("=")
+        if len(item) == 2 and item[0] == "filename":
+            return os.path.basename(item[1].strip('"'))
+    return default
+
+
+def spool_response(response, directory=None, chunk_size=CHUNK_SIZE):
+    """
+    Write the body of a response to a temporary file, a chunk at a time.
+
+    :param response: requests.Response (ideally from a 'get' with stream=True) or CachedResponse
+    :param directory: Where to make the temporary file. Defaults to the system temporary directory.
+    :param chunk_size: Number of bytes read from the network at a time
+    :return: path to the temporary file. You should delete this when you're finished with it.
+    """
+    fd, path = tempfile.mkstemp(suffix=".zip", dir=directory)
+    with os.fdopen(fd, "wb") as fh:
+        if hasattr(response, "path"):
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                fh.write(chunk)
+        else:
+            for chunk in http.iter_content(response, chunk_size=chunk_size):
+                fh.write(chunk)
+    return path
+
+
+def vsizip_path(zip_path):
+    """
+    Make a path that GDAL/fiona can use to read the contents of a zip file without extracting it. Join a member name
+    onto this, e.g. os.path.join(vsizip_path("counties.zip"), "counties.shp").
+
+    :param zip_path: path to zip file
+    :return: path as str
+    """
+    return f"/vsizip/{os.path.abspath(zip_path)}"
+
+
+def save_zip(response, return_directory, extract=True, chunk_size=CHUNK_SIZE):
+    """
+    Save a zip file from a response, either by extracting its members into 'return_directory' or by keeping the zip file
+    there and reading it in place.
+
+    :param response: requests.Response (ideally from a 'get' with stream=True) or CachedResponse
+    :param return_directory: Where the contents (or the zip file itself, if we don't extract) go
+    :param extract: If False the zip file is kept as it is. The directory handed back is then a '/vsizip/' path.
+    :param chunk_size: Number of bytes read from the network at a time
+    :return: tuple of directory and a list of files in the zip file. os.path.join the two to read a file.
+    """
+    # A response from the cache is already on disk, so we can read it from there
+    if hasattr(response, "path"):
+        zip_path, temporary = response.path, False
+    else:
+        zip_path, temporary = spool_response(response, return_directory, chunk_size), True
+
+    try:
+        with ZipFile(zip_path) as my_zipfile:
+            names = my_zipfile.namelist()
+            if extract:
+                # extractall reads each member from the file in chunks, not all in one go
+                my_zipfile.extractall(path=return_directory)
+                return return_directory, names
+
+        target = os.path.join(return_directory, _filename_from_headers(response))
+        if temporary:
+            os.replace(zip_path, target)
+            temporary = False
+        else:
+            shutil.copyfile(zip_path, target)
+        return vsizip_path(target), names
+    finally:
+        if temporary:
+            os.remove(zip_path)
@@ -0,0 +1,197 @@
+"""
+Make synthetic county-like polygon layers and point layers, of any size, for testing and benchmarking without going to
+the Net.
+
+The polygons are a grid of cells whose corners and edges have been jiggled about so they look a bit more like real
+boundaries. Neighbouring cells share exactly the same edge, vertex for vertex, so they touch the way real counties do
+(rook neighbours share an edge, queen neighbours can share just a corner). Each cell has the same properties as the
+counties layer on Geoserver: countyname (unique), nuts3name (a block of cells makes up a region) and total2011.
+
+Everything is made from a seeded random number generator, so the same arguments always give the same layers.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import csv
+    import os
+    import fiona
+    import numpy as np
+    from shapely.geometry import Polygon, MultiPolygon, Point, mapping
+    import utilities.fiona_supported_drivers as fsd
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Irish Grid, like the counties layer
+DEFAULT_CRS = "EPSG:29903"
+
+# South-west corner of the grid, somewhere in Ireland
+ORIGIN = (100000, 100000)
+
+REGION_NAMES = ["Dublin", "Border", "Midland", "West", "Mid-East", "Mid-West", "South-East", "South-West"]
+
+POLYGON_SCHEMA = {
+    "geometry": "Polygon",
+    "properties": {"countyname": "str:80", "nuts3name": "str:80", "total2011": "int"},
+}
+
+POINT_SCHEMA = {
+    "geometry": "Point",
+    "properties": {"name": "str:80", "population": "int"},
+}
+
+
+def _edge(rng, start, end, vertices, jitter):
+    # Points along an edge with a random wobble at right angles to it. The ends don't wobble so the edges meet.
+    t = np.linspace(0, 1, vertices + 2)[1:-1]
+    start, end = np.asarray(start), np.asarray(end)
+    direction = end - start
+    normal = np.array([-direction[1], direction[0]])
+    wobble = rng.uniform(-jitter, jitter, len(t)) * np.sin(np.pi * t)
+    return start + np.outer(t, direction) + np.outer(wobble, normal)
+
+
+def county_polygons(cols=10, rows=10, cell_size=5000, edge_vertices=20, jitter=0.1, region_size=3, seed=0):
+    """
+    Make a grid of county-like polygon features.
+
+    :param cols: number of cells across
+    :param rows: number of cells up
+    :param cell_size: width and height of a cell, in metres
+    :param edge_vertices: extra vertices along each edge of a cell. More vertices make more detailed boundaries.
+    :param jitter: how far corners and edges wobble, as a fraction of cell_size
+    :param region_size: cells across and up in each nuts3name region
+    :param seed: random number generator seed
+    :return: list of GeoJSON-like features
+    """
+    rng = np.random.default_rng(seed)
+
+    # Corners of the cells. The ones round the outside stay put so the grid is a neat rectangle.
+    x, y = np.meshgrid(np.arange(cols + 1, dtype=float), np.arange(rows + 1, dtype=float), indexing="ij")
+    corners = np.stack([x, y], axis=-1)
+    corners[1:-1, 1:-1] += rng.uniform(-jitter, jitter, (cols - 1, rows - 1, 2)) if cols > 1 and rows > 1 else 0
+    corners = corners * cell_size + ORIGIN
+
+    # Each edge is made once and shared by the cells on either side of it
+    across = [[_edge(rng, corners[i, j], corners[i + 1, j], edge_vertices, jitter) for j in range(rows + 1)]
+              for i in range(cols)]
+    up = [[_edge(rng, corners[i, j], corners[i, j + 1], edge_vertices, jitter) for j in range(rows)]
+          for i in range(cols + 1)]
+
+    features = []
+    for i in range(cols):
+        for j in range(rows):
+            ring = np.concatenate([
+                [corners[i, j]], across[i][j],
+                [corners[i + 1, j]], up[i + 1][j],
+                [corners[i + 1, j + 1]], across[i][j + 1][::-1],
+                [corners[i, j + 1]], up[i][j][::-1],
+            ])
+            region = (i // region_size) + (j // region_size) * ((cols + region_size - 1) // region_size)
+            features.append({
+                "type": "Feature",
+                "id": len(features),
+                "properties": {
+                    "countyname": f"County {len(features):05d}",
+                    "nuts3name": REGION_NAMES[region % len(REGION_NAMES)] + (
+                        f" {region // len(REGION_NAMES)}" if region >= len(REGION_NAMES) else ""),
+                    "total2011": int(rng.integers(10000, 500000)),
+                },
+                "geometry": mapping(Polygon(ring)),
+            })
+
+    return features
+
+
+def random_points(count=1000, bounds=None, seed=0):
+    """
+    Make point features scattered at random.
+
+    :param count: number of points
+    :param bounds: (minx, miny, maxx, maxy) to scatter them in. Defaults to a 10 x 10 grid of 5km cells.
+    :param seed: random number generator seed
+    :return: list of GeoJSON-like features
+    """
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds or (ORIGIN[0], ORIGIN[1], ORIGIN[0] + 50000, ORIGIN[1] + 50000)
+    xs = rng.uniform(minx, maxx, count)
+    ys = rng.uniform(miny, maxy, count)
+
+    return [{
+        "type": "Feature",
+        "id": n,
+        "properties": {"name": f"Place {n:06d}", "population": int(rng.integers(10, 50000))},
+        "geometry": mapping(Point(x, y)),
+    } for n, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))]
+
+
+def driver_for(path):
+    """
+    :param path: file name with an extension fiona can write, e.g. 'counties.gpkg'
+    :return: fiona driver name, e.g. 'GPKG'
+    """
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    for driver, driver_extension in fsd.file_extensions.items():
+        if driver_extension == extension:
+            return driver
+    raise TypeError(f"{extension} is not a valid file extension.")
+
+
+def write_layer(features, path, schema, crs=DEFAULT_CRS):
+    """
+    Write features to a file, in the format given by its extension (shp, gpkg, json, ...).
+
+    :return: path
+    """
+    if os.path.exists(path):
+        fiona.remove(path, driver=driver_for(path))
+    with fiona.open(path, "w", driver=driver_for(path), schema=schema, crs=crs) as fh:
+        fh.writerecords(features)
+    return path
+
+
+def write_wkt_csv(features, path):
+    """
+    Write polygons to a pipe-delimited file of geom_str|countyname|total2011, like Data/data-ky-wkt2.csv (which
+    kerry_turtle.py reads). Polygons are written as MULTIPOLYGONs, as they are in that file.
+
+    :return: path
+    """
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh, delimiter="|")
+        writer.writerow(["geom_str", "countyname", "total2011"])
+        for feature in features:
+            polygon = Polygon(feature["geometry"]["coordinates"][0])
+            writer.writerow([MultiPolygon([polygon]).wkt, feature["properties"]["countyname"],
+                             feature["properties"]["total2011"]])
+    return path
+
+
+def make_layers(directory, cols=10, rows=10, points=1000, formats=("shp", "gpkg", "json"), seed=0, **polygon_options):
+    """
+    Make a polygon layer and a point layer in each format, and the polygons as a WKT file too.
+
+    :param directory: where to write them. It's created if need be.
+    :param cols: number of polygons across
+    :param rows: number of polygons up
+    :param points: number of points
+    :param formats: file extensions to write
+    :param seed: random number generator seed
+    :param polygon_options: anything else 'county_polygons' takes, e.g. edge_vertices
+    :return: dict of {format: {"polygons": path, "points": path}, "wkt": path}
+    """
+    os.makedirs(directory, exist_ok=True)
+    polygons = county_polygons(cols, rows, seed=seed, **polygon_options)
+    cell_size = polygon_options.get("cell_size", 5000)
+    bounds = (ORIGIN[0], ORIGIN[1], ORIGIN[0] + cols * cell_size, ORIGIN[1] + rows * cell_size)
+    point_features = random_points(points, bounds, seed=seed)
+
+    layers = {}
+    for extension in formats:
+        layers[extension] = {
+            "polygons": write_layer(polygons, os.path.join(directory, f"counties.{extension}"), POLYGON_SCHEMA),
+            "points": write_layer(point_features, os.path.join(directory, f"places.{extension}"), POINT_SCHEMA),
+        }
+    layers["wkt"] = write_wkt_csv(polygons, os.path.join(directory, "counties-wkt.csv"))
+
+    return layers
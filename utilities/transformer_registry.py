@@ -0,0 +1,89 @@
+"""
+A shared registry of pyproj Transformer objects.
+
+Making a Transformer with 'pyproj.Transformer.from_crs' takes milliseconds because pyproj has to look up both CRSs and
+work out the best way to get from one to the other. Using it to transform a coordinate pair takes microseconds. So if
+you make a new Transformer for every feature, almost all of the time goes on making Transformers. Instead, ask this
+registry. It makes each (source CRS, target CRS, always_xy) Transformer once and hands back the same one after that.
+
+pyproj Transformers must not be shared between threads. If you're transforming in more than one thread, use
+thread_local=True and each thread gets its own copy.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    from collections import OrderedDict
+    import threading
+    import pyproj
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Most Transformers we keep before dropping the least recently used one
+MAX_TRANSFORMERS = 64
+
+_transformers = OrderedDict()
+_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def _crs_key(crs):
+    # CRSs can come to us as EPSG codes, strings, pyproj CRS objects or fiona-style dicts such as {"init": "epsg:29903"}.
+    # Dicts can't be used as dictionary keys so we turn them into sorted tuples.
+    if isinstance(crs, dict):
+        return tuple(sorted(crs.items()))
+    if isinstance(crs, pyproj.CRS):
+        return crs.to_wkt()
+    return crs
+
+
+def _crs(crs):
+    if isinstance(crs, (dict, str, int)):
+        return pyproj.CRS.from_user_input(crs)
+    return crs
+
+
+def _get_or_make(cache, key, source_crs, target_crs, always_xy):
+    transformer = cache.get(key)
+    if transformer is None:
+        transformer = pyproj.Transformer.from_crs(_crs(source_crs), _crs(target_crs), always_xy=always_xy)
+        cache[key] = transformer
+        if len(cache) > MAX_TRANSFORMERS:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return transformer
+
+
+def get_transformer(source_crs, target_crs, always_xy=True, thread_local=False):
+    """
+    Get a Transformer from the registry, making it if we haven't got one already.
+
+    :param source_crs: Anything that pyproj.CRS.from_user_input accepts, e.g. 29903, "EPSG:29903" or source.crs from
+    fiona
+    :param target_crs: As above
+    :param always_xy: Use x, y (lon, lat) order whatever the CRS says
+    :param thread_local: Get a Transformer that belongs to the calling thread
+    :return: pyproj.Transformer
+    """
+    key = (_crs_key(source_crs), _crs_key(target_crs), always_xy)
+
+    if thread_local:
+        if not hasattr(_thread_local, "transformers"):
+            _thread_local.transformers = OrderedDict()
+        return _get_or_make(_thread_local.transformers, key, source_crs, target_crs, always_xy)
+
+    with _lock:
+        return _get_or_make(_transformers, key, source_crs, target_crs, always_xy)
+
+
+def clear():
+    """
+    Empty the shared registry (and the calling thread's own one).
+
+    :return: None
+    """
+    with _lock:
+        _transformers.clear()
+    if hasattr(_thread_local, "transformers"):
+        _thread_local.transformers.clear()
@@ -0,0 +1,132 @@
+"""
+Read a delimited text file of WKT geometries and attributes, such as Data/data-ky-wkt2.csv, once.
+
+    geom_str|countyname|total2011
+    MULTIPOLYGON(((167200.9996 75288.7503999989, ...)))|Kerry|145502
+
+Turning WKT text into geometries is the slow part, so
+* the WKT is parsed by shapely.from_wkt a chunk of rows at a time, which does the whole chunk inside GEOS rather than
+  calling 'loads' row by row, and only a chunk of WKT text is held in memory at once
+* the geometries are kept in a NumPy array, so the bounding box of the whole lot is one call (shapely.total_bounds)
+* the result is remembered, so reading the same (unchanged) file again costs nothing
+
+'load_layer' reads either one of these files or anything fiona can open into the same kind of object, so the map
+drawing code (utilities/raster_render.py, utilities/map_viewer.py) doesn't need to care which it was given.
+"""
+
+# If any of these imports fail, it's likely to be because you haven't installed the appropriate library.
+try:
+    import csv
+    import os
+    import sys
+    import threading
+    import numpy as np
+    import shapely
+    from shapely.geometry import shape
+except Exception as e:
+    print(f"{e}")
+    quit(1)
+
+# Number of rows parsed together
+CHUNK_ROWS = 1000
+
+# WKT for a whole country can be far longer than csv's default limit of 128KB for a field
+FIELD_SIZE_LIMIT = min(sys.maxsize, 2 ** 31 - 1)
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class WKTLayer:
+    """
+    Geometries and attributes read from a WKT file.
+    """
+
+    def __init__(self, geometries, records):
+        """
+        :param geometries: NumPy array of shapely geometries
+        :param records: list of dicts of the other fields, one per geometry
+        """
+        self.geometries = geometries
+        self.records = records
+        self.bounds = tuple(shapely.total_bounds(geometries).tolist()) if len(geometries) else None
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        """
+        :return: (record, geometry) pairs
+        """
+        return zip(self.records, self.geometries)
+
+
+def _read(path, geometry_field, delimiter, chunk_rows):
+    chunks, records, wkt = [], [], []
+    csv.field_size_limit(FIELD_SIZE_LIMIT)
+    with open(path, "r", newline="") as fh:
+        for row in csv.DictReader(fh, delimiter=delimiter):
+            wkt.append(row.pop(geometry_field))
+            records.append(row)
+            if len(wkt) == chunk_rows:
+                chunks.append(shapely.from_wkt(wkt))
+                wkt = []
+    if wkt:
+        chunks.append(shapely.from_wkt(wkt))
+
+    return WKTLayer(np.concatenate(chunks) if chunks else np.array([], dtype=object), records)
+
+
+def load_wkt_csv(path, geometry_field="geom_str", delimiter="|", chunk_rows=CHUNK_ROWS):
+    """
+    Read a delimited file with a WKT column. If we've read the same file before and it hasn't changed, you get back
+    what we read last time.
+
+    :param path: path to the file
+    :param geometry_field: name of the column holding the WKT
+    :param delimiter: field delimiter
+    :param chunk_rows: number of rows parsed together
+    :return: WKTLayer. Don't change its contents, as it's shared with anyone else who reads the same file.
+    """
+    key = (os.path.abspath(path), geometry_field, delimiter)
+    signature = (os.path.getmtime(path), os.path.getsize(path))
+    with _memo_lock:
+        remembered = _memo.get(key)
+    if remembered and remembered[0] == signature:
+        return remembered[1]
+
+    layer = _read(path, geometry_field, delimiter, chunk_rows)
+    with _memo_lock:
+        _memo[key] = (signature, layer)
+
+    return layer
+
+
+def clear_cache():
+    """
+    Forget every file we've read.
+
+    :return: None
+    """
+    with _memo_lock:
+        _memo.clear()
+
+
+def load_layer(path, layer=None):
+    """
+    Read a layer to draw.
+
+    :param path: a WKT file (.csv) or anything fiona can open
+    :param layer: layer name, for files that have more than one
+    :return: WKTLayer
+    """
+    if path.lower().endswith(".csv"):
+        return load_wkt_csv(path)
+
+    import fiona
+    with fiona.open(path, layer=layer) as source:
+        records, geometries = [], []
+        for feature in source:
+            records.append(dict(feature["properties"]))
+            geometries.append(shape(feature["geometry"]) if feature["geometry"] else None)
+    return WKTLayer(np.array(geometries, dtype=object), records)
@@ -1,4 +1,17 @@
+"""
+Write features to any spatial data format fiona supports.
+
+Features are written in batches with 'writerecords' rather than one 'write' per feature. Each 'write' call starts and
+commits its own transaction, which for a GeoPackage (an SQLite database) means a trip to the disk for every feature.
+For GeoPackages the whole stream goes to a single 'writerecords' call, so fiona handles it as one long transaction
+(committing in large steps) and SQLite isn't asked to wait for the disk after each commit.
+
+'data' can be any iterable, including a generator, so features don't all have to be in memory at once.
+"""
+
 try:
+    import itertools
+    import time
     import fiona
     from fiona.crs import from_epsg
     import utilities.fiona_supported_drivers as fsd
@@ -7,10 +20,65 @@ except Exception as e:
     print(f"{e}")
     quit(1)
 
+# Number of features handed to fiona at a time
+DEFAULT_BATCH_SIZE = 10000
+
+# Drivers that write to an SQLite database and so benefit from as few transactions as possible
+TRANSACTIONAL_DRIVERS = ("GPKG", "SQLite")
+
+# GDAL settings for opening those files for writing: don't wait for the disk after every commit
+SQLITE_WRITE_OPTIONS = {"OGR_SQLITE_SYNCHRONOUS": "OFF"}
+
+
+def _batches(iterator, batch_size):
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_records(fh, features, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write features to a fiona collection that's open for writing, in batches, or as one stream for GeoPackages. Open
+    GeoPackages inside 'fiona.Env(**SQLITE_WRITE_OPTIONS)' to get the most out of this.
 
-def write_spatial(file=None, directory=None, data=None, **meta):
+    :param fh: fiona collection
+    :param features: any iterable of GeoJSON-like features
+    :param batch_size: number of features written at a time
+    :return: number of features written
+    """
+    count = 0
+    if fh.driver in TRANSACTIONAL_DRIVERS:
+        def counted(iterator):
+            nonlocal count
+            for feature in iterator:
+                count += 1
+                yield feature
+
+        fh.writerecords(counted(features))
+    else:
+        for batch in _batches(iter(features), batch_size):
+            fh.writerecords(batch)
+            count += len(batch)
+
+    return count
+
+
+def write_spatial(file=None, directory=None, data=None, batch_size=DEFAULT_BATCH_SIZE, verbose=False, **meta):
+    """
+    Write features to a new file.
+
+    :param file: file name without an extension. The extension comes from the driver.
+    :param directory: directory to write the file in. It must already exist.
+    :param data: any iterable of GeoJSON-like features, e.g. a list or a generator
+    :param batch_size: number of features written at a time
+    :param verbose: print the number of features written and the rate
+    :param meta: driver, crs (an EPSG code) and schema, as for fiona.open
+    :return: dict of the path written, number of features, seconds taken and features per second
+    """
     try:
-        if not data:
+        if data is None:
             raise ValueError(f"No data to write.")
         if not os.path.exists(directory):
             raise ValueError(f"Target directory doesn't exist.")
@@ -22,6 +90,15 @@ def write_spatial(file=None, directory=None, data=None, **meta):
             raise ValueError(f"Missing schema.")
         if meta["driver"] not in fsd.file_extensions:
             raise ValueError(f"Invalid driver.")
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be at least 1.")
+
+        # Look at the first feature so we can still complain about no data when we're given a generator
+        features = iter(data)
+        first = next(features, None)
+        if first is None:
+            raise ValueError(f"No data to write.")
+        features = itertools.chain([first], features)
 
         target = os.path.join(directory, f"{file}.{fsd.file_extensions[meta['driver']]}")
         meta["crs"] = from_epsg(meta["crs"])
@@ -31,10 +108,16 @@ def write_spatial(file=None, directory=None, data=None, **meta):
             elif v == "double":
                 meta["schema"]["properties"][k] = "float"
 
-        with fiona.open(target, "w", **meta) as fh:
-            for feature in data:
-                fh.write(feature)
+        start = time.perf_counter()
+        with fiona.Env(**SQLITE_WRITE_OPTIONS), fiona.open(target, "w", **meta) as fh:
+            count = write_records(fh, features, batch_size)
+        seconds = time.perf_counter() - start
+
+        rate = count / seconds if seconds else float("inf")
+        if verbose:
+            print(f"Wrote {count} features to {target} in {seconds:.2f}s ({rate:.0f} features/s)")
 
+        return {"path": target, "features": count, "seconds": seconds, "features_per_second": rate}
     except Exception as e:
         print(f"{e}")
         quit(1)
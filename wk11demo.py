@@ -77,6 +77,8 @@ def do_analysis(**defaults):
 
     # Get data from Geoerver. Note that we use the same SRS for both and the we filter based on required polygons and
     # points with population greater than a specified amount. Take note of 'download_from_geoserver' in 'utilities'.
+    # For big datasets 'download_wfs_tiles' gets the data as a grid of tiles in parallel, which is a lot quicker than
+    # one big download.
 
     # return log of results. This can be printed to the console or written to the scrolledtext element in the GUI.
     return result_log